@@ -1,18 +1,47 @@
 import pandas as pd
+import numpy as np
+import argparse
 import glob
 import os
+import sys
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+try:
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # Only the Parquet store needs pyarrow; CSV results don't
+    ds = pq = None
+
 INPUT_DIR = '../attack/results/'
 RESULTS_PATTERN = 'attack_results_mode_*.csv'
 OUTPUT_DIR = 'analyze_results/'
+STORE_DIR = '../attack/results/store/'
+# Per-partition aggregates of the Parquet store, so each partition is read once
+AGGREGATES_DIR = os.path.join(OUTPUT_DIR, 'store_aggregates')
+
+LATENCY_PERCENTILES = [50, 90, 95, 99]
+CLASSIFICATIONS = ['True Positive', 'True Negative', 'False Positive', 'False Negative']
+
+# Log-spaced latency bins from 10us to 10 minutes, each about 2.3% wide
+LATENCY_BIN_EDGES_MS = np.geomspace(0.01, 600_000, 801)
+# Runs above this many latencies are bootstrapped from their histogram
+BOOTSTRAP_EXACT_MAX = 100_000
+# Numbers held per bootstrap batch (about 40 MB of float64)
+BOOTSTRAP_BATCH_CELLS = 5_000_000
+
+SERVER_TIMING_COLUMN = 'Server-Timing'
+# name and dur of each Server-Timing entry; other parameters are skipped
+SERVER_TIMING_ENTRY = r'(?:^|,)\s*([^,;=\s]+)[^,]*?;\s*dur=([0-9.]+)'
 
 if not os.path.exists(OUTPUT_DIR):
     os.makedirs(OUTPUT_DIR)
 
-def load_data():
-    search_path = os.path.join(INPUT_DIR, RESULTS_PATTERN)
+def load_data(input_path=INPUT_DIR):
+    if os.path.isfile(input_path):
+        search_path = input_path
+    else:
+        search_path = os.path.join(input_path, RESULTS_PATTERN)
     files = glob.glob(search_path)
 
     if not files:
@@ -33,40 +62,289 @@ def load_data():
     combined_df = pd.concat(dfs, ignore_index=True)
     return combined_df
 
+def metrics_from_counts(counts, average_latency_ms):
+    """Metrics per mode from a Mode x Classification table of counts."""
+    counts = counts.reindex(columns=CLASSIFICATIONS, fill_value=0)
+    tp, tn, fp, fn = (counts[c] for c in CLASSIFICATIONS)
+
+    precision = (tp / (tp + fp)).fillna(0)
+    recall = (tp / (tp + fn)).fillna(0)
+
+    metrics_df = pd.DataFrame({
+        'Accuracy': ((tp + tn) / (tp + tn + fp + fn)).fillna(0),
+        'Precision': precision,
+        'Recall': recall,
+        'F1 Score': (2 * precision * recall / (precision + recall)).fillna(0),
+        'Average Latency (ms)': average_latency_ms.reindex(counts.index),
+        'TP': tp, 'TN': tn, 'FP': fp, 'FN': fn,
+    })
+    metrics_df.index.name = 'Mode'
+    return metrics_df.reset_index().sort_values(by='Mode')
+
 def calculate_metrics(df):
-    results = []
-    
-    modes = df['Mode'].unique()
+    counts = df.groupby(['Mode', 'Classification']).size().unstack(fill_value=0)
+    average_latency = df.groupby('Mode')['Latency(s)'].mean() * 1000  # Convert to milliseconds
+    return metrics_from_counts(counts, average_latency)
+
+def store_partitions(store_dir):
+    """Parquet files of the store with their run ID, mode and file signature."""
+    partitions = []
+    for path in glob.glob(os.path.join(store_dir, 'run_id=*', 'mode=*', '*.parquet')):
+        mode_dir = os.path.dirname(path)
+        run_dir = os.path.dirname(mode_dir)
+        stat = os.stat(path)
+        partitions.append({
+            'file': os.path.relpath(path, store_dir),
+            'run_id': os.path.basename(run_dir).split('=', 1)[1],
+            'Mode': int(os.path.basename(mode_dir).split('=', 1)[1]),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+        })
+    return pd.DataFrame(partitions, columns=['file', 'run_id', 'Mode', 'size', 'mtime'])
+
+def latency_bins(latencies_ms):
+    """Non-empty LATENCY_BIN_EDGES_MS bins as (bin, count) arrays."""
+    clipped = np.clip(latencies_ms, LATENCY_BIN_EDGES_MS[0], LATENCY_BIN_EDGES_MS[-1])
+    histogram, _ = np.histogram(clipped, bins=LATENCY_BIN_EDGES_MS)
+    bins = np.nonzero(histogram)[0]
+    return bins, histogram[bins]
+
+def stage_durations(modes, server_timing):
+    """(Mode, Stage, Duration (ms)) rows from Server-Timing header values."""
+    values = server_timing.dropna().astype(str)
+    entries = values[values != ''].str.extractall(SERVER_TIMING_ENTRY)
+    rows = entries.index.get_level_values(0)
+    return pd.DataFrame({
+        'Mode': modes.loc[rows].to_numpy(),
+        'Stage': entries[0].to_numpy(),
+        'Duration (ms)': entries[1].astype(float).to_numpy(),
+    })
+
+def aggregate_partition(store_dir, partition):
+    """Counts, latency sums and latency histograms (overall and per stage) for one Parquet file."""
+    path = os.path.join(store_dir, partition['file'])
+    # Parts written before Server-Timing was recorded lack the column
+    columns = ['classification', 'latency_s']
+    if 'server_timing' in pq.read_schema(path).names:
+        columns.append('server_timing')
+    df = pq.read_table(path, columns=columns).to_pandas()
+
+    grouped = df.groupby('classification', observed=True)['latency_s']
+    counts = pd.DataFrame({'count': grouped.size(), 'latency_sum_ms': grouped.sum() * 1000})
+    counts = counts.rename_axis('Classification').reset_index()
+    counts['Classification'] = counts['Classification'].astype(str)
+
+    answered = df.loc[df['classification'] != 'ERROR', 'latency_s'].to_numpy(dtype=float) * 1000
+    bins, bin_counts = latency_bins(answered)
+    histograms = pd.DataFrame({'bin': bins, 'count': bin_counts})
+
+    stage_frames = []
+    if 'server_timing' in df:
+        durations = stage_durations(pd.Series(partition['Mode'], index=df.index), df['server_timing'])
+        for stage, group in durations.groupby('Stage'):
+            bins, bin_counts = latency_bins(group['Duration (ms)'].to_numpy())
+            stage_frames.append(pd.DataFrame({
+                'Stage': stage, 'bin': bins, 'count': bin_counts, 'sum_ms': group['Duration (ms)'].sum(),
+            }))
+    stages = pd.concat(stage_frames, ignore_index=True) if stage_frames else \
+        pd.DataFrame({'Stage': pd.Series(dtype=str), 'bin': pd.Series(dtype=np.int64),
+                      'count': pd.Series(dtype=np.int64), 'sum_ms': pd.Series(dtype=float)})
+    # The stage's total is kept on its first bin only, so sums add up across bins
+    stages.loc[stages['Stage'].duplicated(), 'sum_ms'] = 0.0
+
+    for frame in (counts, histograms, stages):
+        frame['file'] = partition['file']
+        frame['run_id'] = partition['run_id']
+        frame['Mode'] = partition['Mode']
+    return counts, histograms, stages
+
+def update_store_aggregates(store_dir):
+    """Aggregate new or changed partitions only; returns (counts, histograms, stages)."""
+    names = ('partitions', 'counts', 'histograms', 'stages')
+    paths = {name: os.path.join(AGGREGATES_DIR, f'{name}.parquet') for name in names}
+    current = store_partitions(store_dir)
+
+    if all(os.path.exists(path) for path in paths.values()):
+        known = pd.read_parquet(paths['partitions'])
+        counts = pd.read_parquet(paths['counts'])
+        histograms = pd.read_parquet(paths['histograms'])
+        stages = pd.read_parquet(paths['stages'])
+    else:
+        known = current.iloc[0:0]
+        counts = histograms = stages = None
+
+    unchanged = current.merge(known, on=['file', 'run_id', 'Mode', 'size', 'mtime'])['file']
+    pending = current[~current['file'].isin(unchanged)]
+
+    if counts is not None:
+        counts = counts[counts['file'].isin(unchanged)]
+        histograms = histograms[histograms['file'].isin(unchanged)]
+        stages = stages[stages['file'].isin(unchanged)]
+
+    new_counts, new_histograms, new_stages = [], [], []
+    for partition in pending.to_dict('records'):
+        partition_counts, partition_histograms, partition_stages = aggregate_partition(store_dir, partition)
+        new_counts.append(partition_counts)
+        new_histograms.append(partition_histograms)
+        new_stages.append(partition_stages)
+
+    counts = pd.concat([frame for frame in [counts, *new_counts] if frame is not None], ignore_index=True)
+    histograms = pd.concat([frame for frame in [histograms, *new_histograms] if frame is not None], ignore_index=True)
+    stages = pd.concat([frame for frame in [stages, *new_stages] if frame is not None], ignore_index=True)
+
+    os.makedirs(AGGREGATES_DIR, exist_ok=True)
+    current.to_parquet(paths['partitions'], index=False)
+    counts.to_parquet(paths['counts'], index=False)
+    histograms.to_parquet(paths['histograms'], index=False)
+    stages.to_parquet(paths['stages'], index=False)
+
+    print(f"[+] Store: {len(pending)} new partition(s) aggregated, {len(unchanged)} reused")
+    return counts, histograms, stages
+
+def store_metrics(counts):
+    per_class = counts.groupby(['Mode', 'Classification'])[['count', 'latency_sum_ms']].sum()
+    per_mode = per_class.groupby(level='Mode').sum()
+    return metrics_from_counts(per_class['count'].unstack(fill_value=0),
+                               per_mode['latency_sum_ms'] / per_mode['count'])
+
+def histogram_percentiles(histograms, by=('Mode',)):
+    """Latency percentiles per group from binned counts (upper bin edge, about 2% precise)."""
+    bins = len(LATENCY_BIN_EDGES_MS) - 1
+    upper_edges = LATENCY_BIN_EDGES_MS[1:]
+    per_mode = histograms.groupby([*by, 'bin'])['count'].sum().unstack(fill_value=0)
+    per_mode = per_mode.reindex(columns=range(bins), fill_value=0)
+
+    cumulative = per_mode.to_numpy().cumsum(axis=1)
+    totals = cumulative[:, -1]
+    table = pd.DataFrame(index=per_mode.index)
+    for p in LATENCY_PERCENTILES:
+        positions = [np.searchsorted(row, total * p / 100) for row, total in zip(cumulative, totals)]
+        table[f'p{p}'] = upper_edges[positions]
+    table['max'] = [upper_edges[np.flatnonzero(row)[-1]] if total else 0 for row, total in zip(per_mode.to_numpy(), totals)]
+    table['Requests'] = totals
+    return table.reset_index(), per_mode
+
+def plot_histogram_cdf(per_mode):
+    plt.figure(figsize=(10, 6))
+    sns.set_style("whitegrid")
+
+    upper_edges = LATENCY_BIN_EDGES_MS[1:]
+    for mode, row in per_mode.iterrows():
+        counts = row.to_numpy()
+        used = np.flatnonzero(counts)
+        if len(used) == 0:
+            continue
+        cdf = counts.cumsum() / counts.sum()
+        span = slice(used[0], used[-1] + 1)
+        plt.step(upper_edges[span], cdf[span], where='post', label=str(mode))
+
+    plt.xscale('log')
+    plt.xlabel('Latency (ms)')
+    plt.ylabel('Fraction of requests')
+    plt.title('Latency CDF by Mode')
+    plt.legend(title='Mode')
+    plt.tight_layout()
+    plt.savefig(f"{OUTPUT_DIR}/latency_cdf.png")
+    print(f"[+] Latency CDF plot saved to {OUTPUT_DIR}/latency_cdf.png")
+    plt.close()
 
-    for mode in modes:
-        mode_data = df[df['Mode'] == mode]
+def load_store_bypass_candidates(store_dir, run_ids=None):
+    """Malicious rows with only the columns analyze_bypass needs."""
+    dataset = ds.dataset(store_dir, format='parquet', partitioning='hive')
+    condition = ds.field('expected') == 'malicious'
+    if run_ids:
+        condition = condition & ds.field('run_id').isin(run_ids)
+    table = dataset.to_table(columns=['mode', 'payload', 'expected', 'classification'], filter=condition)
+    df = table.to_pandas()
+    return df.rename(columns={'mode': 'Mode', 'payload': 'Payload', 'expected': 'Expected',
+                              'classification': 'Classification'}).astype({'Expected': str, 'Classification': str})
+
+def latency_samples(df):
+    """Latencies in ms of requests that got an answer (errors carry no latency)."""
+    answered = df[df['Classification'] != 'ERROR']
+    return answered.assign(**{'Latency (ms)': answered['Latency(s)'] * 1000})[['Mode', 'Latency (ms)']]
+
+def calculate_latency_percentiles(df):
+    samples = latency_samples(df)
+    grouped = samples.groupby('Mode')['Latency (ms)']
+
+    table = grouped.quantile([p / 100 for p in LATENCY_PERCENTILES]).unstack()
+    table.columns = [f'p{p}' for p in LATENCY_PERCENTILES]
+    table['max'] = grouped.max()
+    table['Requests'] = grouped.size()
+    return table.reset_index().sort_values(by='Mode')
+
+def plot_latency_cdf(df):
+    plt.figure(figsize=(10, 6))
+    sns.set_style("whitegrid")
+
+    ax = sns.ecdfplot(data=latency_samples(df), x='Latency (ms)', hue='Mode', palette='tab10', log_scale=True)
+    ax.set_title('Latency CDF by Mode')
+    for p in LATENCY_PERCENTILES[1:]:
+        ax.axhline(p / 100, color='grey', linestyle=':', linewidth=0.8)
 
-        tp = len(mode_data[mode_data['Classification'] == 'True Positive'])
-        tn = len(mode_data[mode_data['Classification'] == 'True Negative'])
-        fp = len(mode_data[mode_data['Classification'] == 'False Positive'])
-        fn = len(mode_data[mode_data['Classification'] == 'False Negative'])
+    plt.ylabel('Fraction of requests')
+    plt.tight_layout()
+    plt.savefig(f"{OUTPUT_DIR}/latency_cdf.png")
+    print(f"[+] Latency CDF plot saved to {OUTPUT_DIR}/latency_cdf.png")
+    plt.close()
 
-        total = tp + tn + fp + fn
+def calculate_stage_breakdown(df):
+    """Per-stage Server-Timing durations (ms) by mode; None if no response carried the header."""
+    if SERVER_TIMING_COLUMN not in df:
+        return None
+    durations = stage_durations(df['Mode'], df[SERVER_TIMING_COLUMN])
+    if durations.empty:
+        return None
 
-        accuracy = (tp + tn) / total if total > 0 else 0
-        precision = tp / (tp + fp) if (tp + fp) > 0 else 0
-        recall = tp / (tp + fn) if (tp + fn) > 0 else 0
-        f1_score = 2 * (precision * recall) / (precision + recall) if (precision + recall) > 0 else 0
+    grouped = durations.groupby(['Mode', 'Stage'])['Duration (ms)']
+    table = grouped.quantile([p / 100 for p in LATENCY_PERCENTILES]).unstack()
+    table.columns = [f'p{p}' for p in LATENCY_PERCENTILES]
+    table.insert(0, 'mean', grouped.mean())
+    table['max'] = grouped.max()
+    table['Requests'] = grouped.size()
+    return table.reset_index().sort_values(by=['Mode', 'Stage'])
+
+def store_stage_breakdown(stages):
+    """calculate_stage_breakdown from the store's per-stage histograms."""
+    if stages.empty:
+        return None
+    table, _ = histogram_percentiles(stages, by=('Mode', 'Stage'))
+    sums = stages.groupby(['Mode', 'Stage'])['sum_ms'].sum().to_numpy()
+    table.insert(2, 'mean', sums / table['Requests'].to_numpy())
+    return table.sort_values(by=['Mode', 'Stage'])
+
+def save_stage_breakdown(breakdown):
+    print("\n --- Stage Durations by Mode (ms, from Server-Timing) ---")
+    print(breakdown.to_string(index=False, float_format='{:.2f}'.format))
+    breakdown.to_csv(f"{OUTPUT_DIR}/stage_breakdown.csv", index=False)
+    print(f"\n[+] Stage breakdown saved to {OUTPUT_DIR}/stage_breakdown.csv")
+
+    # Stages nest (gw_total holds gw_detect, which holds the detectors' own), so they are not stacked
+    plt.figure(figsize=(10, max(4, breakdown['Stage'].nunique() * 0.5)))
+    sns.set_style("whitegrid")
 
-        average_latency = mode_data['Latency(s)'].mean() * 1000  # Convert to milliseconds
+    ax = sns.barplot(data=breakdown, x='p50', y='Stage', hue='Mode', palette='tab10', orient='h')
+    ax.set_title('Median Stage Duration by Mode')
+    plt.xlabel('Median duration (ms)')
 
-        results.append({
-            'Mode': mode,
-            'Accuracy': accuracy,
-            'Precision': precision,
-            'Recall': recall,
-            'F1 Score': f1_score,
-            'Average Latency (ms)': average_latency,
-            'TP': tp, 'TN': tn, 'FP': fp, 'FN': fn
-        })
+    plt.tight_layout()
+    plt.savefig(f"{OUTPUT_DIR}/stage_breakdown.png")
+    print(f"[+] Stage breakdown plot saved to {OUTPUT_DIR}/stage_breakdown.png")
+    plt.close()
 
-    metrics_df = pd.DataFrame(results).sort_values(by='Mode')
-    return metrics_df
+def plot_latency_histogram(df):
+    plt.figure(figsize=(10, 6))
+    sns.set_style("whitegrid")
+
+    ax = sns.histplot(data=latency_samples(df), x='Latency (ms)', hue='Mode', palette='tab10',
+                      log_scale=True, element='step', fill=False, stat='density', common_norm=False)
+    ax.set_title('Latency Distribution by Mode')
+
+    plt.tight_layout()
+    plt.savefig(f"{OUTPUT_DIR}/latency_histogram.png")
+    print(f"[+] Latency histogram saved to {OUTPUT_DIR}/latency_histogram.png")
+    plt.close()
 
 def save_metrics_table_image(metrics_df):
     fig, ax = plt.subplots(figsize=(14, len(metrics_df) * 0.8 + 1))
@@ -202,12 +480,156 @@ def analyze_bypass(df):
     print("[*] Generating Top 5 Bypasses Image...")
     save_bypass_table_image(high_value_targets)
 
-def main():
+def bootstrap_percentile(values, percentile, resamples, rng, binned=None):
+    """
+    Bootstrap distribution of a percentile. Small samples are resampled exactly;
+    large ones (or binned=True) as a multinomial over their latency histogram,
+    which costs the number of bins rather than the number of values per resample.
+    Batches are sized so each holds about BOOTSTRAP_BATCH_CELLS numbers.
+    """
+    if binned is None:
+        binned = len(values) > BOOTSTRAP_EXACT_MAX
+    if binned:
+        bins, counts = latency_bins(values)
+        upper_edges = LATENCY_BIN_EDGES_MS[1:][bins]
+        probabilities = counts / counts.sum()
+        rank = len(values) * percentile / 100
+        width = len(bins)
+    else:
+        width = len(values)
+
+    batch = max(1, BOOTSTRAP_BATCH_CELLS // width)
+    estimates = []
+    for start in range(0, resamples, batch):
+        size = min(batch, resamples - start)
+        if binned:
+            cumulative = rng.multinomial(len(values), probabilities, size=size).cumsum(axis=1)
+            estimates.append(upper_edges[np.argmax(cumulative >= rank, axis=1)])
+        else:
+            sample = rng.choice(values, size=(size, width), replace=True)
+            estimates.append(np.percentile(sample, percentile, axis=1))
+    return np.concatenate(estimates)
+
+def compare_runs(baseline_df, candidate_df, percentiles, resamples=2000, confidence=0.95, seed=0):
+    """Relative change of each latency percentile per mode, with bootstrap CIs."""
+    rng = np.random.default_rng(seed)
+    baseline = latency_samples(baseline_df)
+    candidate = latency_samples(candidate_df)
+    alpha = (1 - confidence) / 2 * 100
+
+    rows = []
+    for mode in sorted(set(baseline['Mode']) & set(candidate['Mode'])):
+        base_values = baseline.loc[baseline['Mode'] == mode, 'Latency (ms)'].to_numpy()
+        cand_values = candidate.loc[candidate['Mode'] == mode, 'Latency (ms)'].to_numpy()
+        if len(base_values) == 0 or len(cand_values) == 0:
+            continue
+        # Both runs resampled the same way, so the ratio isn't skewed by binning
+        binned = max(len(base_values), len(cand_values)) > BOOTSTRAP_EXACT_MAX
+
+        for p in percentiles:
+            base_p = np.percentile(base_values, p)
+            cand_p = np.percentile(cand_values, p)
+            base_boot = bootstrap_percentile(base_values, p, resamples, rng, binned)
+            cand_boot = bootstrap_percentile(cand_values, p, resamples, rng, binned)
+            change = cand_boot / np.maximum(base_boot, 1e-9) - 1
+            rows.append({
+                'Mode': mode,
+                'Percentile': f'p{p:g}',
+                'Baseline (ms)': base_p,
+                'Candidate (ms)': cand_p,
+                'Change': cand_p / base_p - 1 if base_p > 0 else np.nan,
+                'CI Low': np.percentile(change, alpha),
+                'CI High': np.percentile(change, 100 - alpha),
+            })
+    return pd.DataFrame(rows)
+
+def compare(args):
+    baseline_df = load_data(args.baseline)
+    candidate_df = load_data(args.candidate)
+    if baseline_df is None or candidate_df is None:
+        return 2
+
+    comparison = compare_runs(baseline_df, candidate_df, args.percentiles,
+                              resamples=args.resamples, confidence=args.confidence, seed=args.seed)
+    if comparison.empty:
+        print("No modes in common between the two runs")
+        return 2
+
+    # A regression is only reported when the whole confidence interval is
+    # above the threshold, so noise alone doesn't fail the gate
+    comparison['Regression'] = comparison['CI Low'] > args.threshold
+
+    print(f"\n --- Latency: candidate vs baseline ({args.confidence:.0%} bootstrap CI) ---")
+    display_df = comparison.copy()
+    for column in ['Change', 'CI Low', 'CI High']:
+        display_df[column] = display_df[column].map('{:+.1%}'.format)
+    for column in ['Baseline (ms)', 'Candidate (ms)']:
+        display_df[column] = display_df[column].map('{:.2f}'.format)
+    print(display_df.to_string(index=False))
+
+    comparison.to_csv(f"{OUTPUT_DIR}/latency_comparison.csv", index=False)
+    print(f"\n[+] Comparison saved to {OUTPUT_DIR}/latency_comparison.csv")
+
+    regressions = comparison[comparison['Regression']]
+    if not regressions.empty:
+        print(f"\n[!] {len(regressions)} latency regression(s) beyond {args.threshold:.0%}")
+        return 1
+    print(f"\n[+] No latency regression beyond {args.threshold:.0%}")
+    return 0
+
+def report_store(args):
+    print("Web Application Firewall Attack Results Analyzer (Parquet store)")
+
+    if pq is None:
+        print("pyarrow is not installed; it is needed to read the Parquet store")
+        return 1
+    if not os.path.isdir(args.store):
+        print(f"No store found at {args.store}")
+        return 1
+
+    counts, histograms, stages = update_store_aggregates(args.store)
+    if args.run_id:
+        counts = counts[counts['run_id'].isin(args.run_id)]
+        histograms = histograms[histograms['run_id'].isin(args.run_id)]
+        stages = stages[stages['run_id'].isin(args.run_id)]
+    if counts.empty:
+        print("No results in the store for the selected runs")
+        return 1
+
+    metrics_df = store_metrics(counts)
+    print("\n --- Performance Metrics by Mode ---")
+    print(metrics_df[['Mode', 'Accuracy', 'Precision', 'Recall', 'F1 Score', 'Average Latency (ms)']].to_string(index=False))
+    metrics_df.to_csv(f"{OUTPUT_DIR}/final_metrics.csv", index=False)
+    print(f"\n[+] Final metrics saved to {OUTPUT_DIR}/final_metrics.csv")
+
+    percentiles_df, per_mode = histogram_percentiles(histograms)
+    print("\n --- Latency Percentiles by Mode (ms) ---")
+    print(percentiles_df.to_string(index=False, float_format='{:.2f}'.format))
+    percentiles_df.to_csv(f"{OUTPUT_DIR}/latency_percentiles.csv", index=False)
+    print(f"\n[+] Latency percentiles saved to {OUTPUT_DIR}/latency_percentiles.csv")
+
+    save_metrics_table_image(metrics_df)
+    plot_performance(metrics_df)
+    plot_latency(metrics_df)
+    plot_histogram_cdf(per_mode)
+
+    breakdown = store_stage_breakdown(stages)
+    if breakdown is not None:
+        save_stage_breakdown(breakdown)
+
+    if not args.skip_bypass:
+        analyze_bypass(load_store_bypass_candidates(args.store, args.run_id))
+    return 0
+
+def report(args):
+    if args.store:
+        return report_store(args)
+
     print("Web Application Firewall Attack Results Analyzer")
     
-    df = load_data()
+    df = load_data(args.input)
     if df is None: 
-        return
+        return 1
     
     metrics_df = calculate_metrics(df)
 
@@ -217,12 +639,52 @@ def main():
     metrics_df.to_csv(f"{OUTPUT_DIR}/final_metrics.csv", index=False)
     print(f"\n[+] Final metrics saved to {OUTPUT_DIR}/final_metrics.csv")
 
+    percentiles_df = calculate_latency_percentiles(df)
+    print("\n --- Latency Percentiles by Mode (ms) ---")
+    print(percentiles_df.to_string(index=False, float_format='{:.2f}'.format))
+    percentiles_df.to_csv(f"{OUTPUT_DIR}/latency_percentiles.csv", index=False)
+    print(f"\n[+] Latency percentiles saved to {OUTPUT_DIR}/latency_percentiles.csv")
+
     save_metrics_table_image(metrics_df)
 
     plot_performance(metrics_df)
     plot_latency(metrics_df)
+    plot_latency_cdf(df)
+    plot_latency_histogram(df)
+
+    breakdown = calculate_stage_breakdown(df)
+    if breakdown is not None:
+        save_stage_breakdown(breakdown)
 
     analyze_bypass(df)
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Web Application Firewall Attack Results Analyzer")
+    subparsers = parser.add_subparsers(dest='command')
+
+    report_parser = subparsers.add_parser('report', help='Metrics, latency percentiles and plots for one run (default)')
+    report_parser.add_argument('--input', default=INPUT_DIR, help='Results directory or CSV file')
+    report_parser.add_argument('--store', nargs='?', const=STORE_DIR, default=None,
+                               help=f'Analyze the Parquet results store instead of CSVs (default: {STORE_DIR})')
+    report_parser.add_argument('--run-id', nargs='+', default=None, help='Only these runs from the store')
+    report_parser.add_argument('--skip-bypass', action='store_true', help='Skip the per-payload bypass analysis')
+
+    compare_parser = subparsers.add_parser('compare', help='Compare latency percentiles of two runs; exits 1 on regression')
+    compare_parser.add_argument('baseline', help='Baseline results directory or CSV file')
+    compare_parser.add_argument('candidate', help='Candidate results directory or CSV file')
+    compare_parser.add_argument('--percentiles', type=float, nargs='+', default=[99], help='Percentiles to gate on')
+    compare_parser.add_argument('--threshold', type=float, default=0.10, help='Allowed relative increase, e.g. 0.10 for 10%%')
+    compare_parser.add_argument('--resamples', type=int, default=2000, help='Bootstrap resamples')
+    compare_parser.add_argument('--confidence', type=float, default=0.95)
+    compare_parser.add_argument('--seed', type=int, default=0)
+
+    args = parser.parse_args()
+    if args.command == 'compare':
+        return compare(args)
+    if args.command is None:
+        args = report_parser.parse_args([])
+    return report(args)
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
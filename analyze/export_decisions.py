@@ -0,0 +1,144 @@
+"""
+Export the guardrail decision log from its Redis Stream to Parquet.
+
+The gateway, guardrail and guardrailv2 add one entry per decision to the
+guardrail:decisions stream. Entries after the last exported ID are read in
+pages and written to analyze_results/decisions/part-<first id>.parquet; the
+last ID is kept in a checkpoint file, so every run only exports new entries.
+Records of one request share the hash column (the gateway's verdict cache
+key), which joins gateway and detector stages.
+
+Usage:
+    python export_decisions.py
+    python export_decisions.py --follow --interval 30 --trim
+"""
+
+import argparse
+import os
+import time
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import redis
+
+STREAM = 'guardrail:decisions'
+OUTPUT_DIR = 'analyze_results/decisions/'
+CHECKPOINT = '_last_id'
+PAGE_SIZE = 10_000
+
+
+def schema():
+    category = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ('id', pa.string()),
+        ('ts', pa.float64()),
+        ('source', category),
+        ('hash', pa.string()),
+        ('verdict', category),
+        ('stage', category),
+        ('latency_ms', pa.float32()),
+        ('confidence', pa.float32()),
+        ('cache_hit', pa.bool_()),
+        ('input', pa.string()),
+    ])
+
+
+def read_checkpoint(output_dir):
+    try:
+        with open(os.path.join(output_dir, CHECKPOINT), encoding='utf-8') as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def write_checkpoint(output_dir, last_id):
+    path = os.path.join(output_dir, CHECKPOINT)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(last_id)
+    os.replace(path + '.tmp', path)
+
+
+def read_entries(client, stream, after, limit):
+    """Yield (id, fields) after the given ID (exclusive), at most limit of them."""
+    start = f'({after}' if after else '-'
+    exported = 0
+    while limit is None or exported < limit:
+        count = PAGE_SIZE if limit is None else min(PAGE_SIZE, limit - exported)
+        page = client.xrange(stream, min=start, max='+', count=count)
+        if not page:
+            return
+        yield from page
+        exported += len(page)
+        start = f'({page[-1][0]}'
+
+
+def to_table(entries):
+    def number(value):
+        return float(value) if value not in (None, '') else None
+
+    columns = {
+        'id': [entry_id for entry_id, _ in entries],
+        'ts': [number(fields.get('ts')) for _, fields in entries],
+        'source': [fields.get('source') for _, fields in entries],
+        'hash': [fields.get('hash') for _, fields in entries],
+        'verdict': [fields.get('verdict') for _, fields in entries],
+        'stage': [fields.get('stage') for _, fields in entries],
+        'latency_ms': [number(fields.get('latency_ms')) for _, fields in entries],
+        'confidence': [number(fields.get('confidence')) for _, fields in entries],
+        'cache_hit': [fields.get('cache_hit') == '1' for _, fields in entries],
+        'input': [fields.get('input') for _, fields in entries],
+    }
+    return pa.table(columns, schema=schema())
+
+
+def export(client, stream, output_dir, rows_per_file, trim=False):
+    """Export new entries; returns how many were written."""
+    os.makedirs(output_dir, exist_ok=True)
+    last_id = read_checkpoint(output_dir)
+    written = 0
+
+    while True:
+        entries = list(read_entries(client, stream, last_id, rows_per_file))
+        if not entries:
+            break
+
+        name = 'part-' + entries[0][0].replace('-', '_') + '.parquet'
+        path = os.path.join(output_dir, name)
+        pq.write_table(to_table(entries), path + '.tmp', compression='zstd')
+        os.replace(path + '.tmp', path)
+
+        last_id = entries[-1][0]
+        write_checkpoint(output_dir, last_id)
+        written += len(entries)
+        print(f"[+] {len(entries)} decisions written to {path}")
+
+    # Exported entries are only dropped from Redis once they are on disk
+    if trim and last_id:
+        removed = client.xtrim(stream, minid=last_id)
+        print(f"[+] {removed} exported entries trimmed from {stream}")
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--redis-url', default='redis://localhost:6379/0')
+    parser.add_argument('--stream', default=STREAM)
+    parser.add_argument('--output', default=OUTPUT_DIR, help='Directory for the Parquet files and checkpoint')
+    parser.add_argument('--rows-per-file', type=int, default=500_000)
+    parser.add_argument('--trim', action='store_true', help='Remove exported entries from the stream')
+    parser.add_argument('--follow', action='store_true', help='Keep exporting every --interval seconds')
+    parser.add_argument('--interval', type=float, default=30.0)
+    args = parser.parse_args()
+
+    client = redis.Redis.from_url(args.redis_url, decode_responses=True)
+    while True:
+        written = export(client, args.stream, args.output, args.rows_per_file, args.trim)
+        if not args.follow:
+            if not written:
+                print("No new decisions")
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,31 +5,109 @@ import time
 import csv
 import os
 
+from results_store import ResultWriter
+
 class bcolors:
     HEADER = '\033[95m'
     OKGREEN = '\033[92m'
     WARNING = '\033[93m'
     FAIL = '\033[91m'
     ENDC = '\033[0m'
-def attack(url, payload_file, mode, delay=0.05):
-    PARAM = "q"
-
-    mode_names = {
-        1: "No_Security",
-        2: "LLM Only",
-        3: "ML Only",
-        4: "Filter Only",
-        5: "Everything_Enabled"
-    }
 
-    results_dir = "results/"
-    if not os.path.exists(results_dir):
-        os.makedirs(results_dir)
-    filname_only = f"attack_results_mode_{mode}_{mode_names[mode]}.csv"
-    csv_filename = os.path.join(results_dir, filname_only)
+PARAM = "q"
+# Per-stage durations reported by the gateway and the services behind it
+SERVER_TIMING_HEADER = "Server-Timing"
+# The gateway only sends Server-Timing to requests carrying its debug token
+DEBUG_TOKEN_HEADER = "X-Guardrail-Debug"
+RESULTS_DIR = "results/"
+
+MODE_NAMES = {
+    1: "No_Security",
+    2: "LLM Only",
+    3: "ML Only",
+    4: "Filter Only",
+    5: "Everything_Enabled"
+}
+
+BLOCK_MARKERS = (
+    "security alert",
+    "threat type classification",
+    "sql injection blocked",
+    "sql injection detected",
+    "guardrail",
+    "attack detected",
+)
+ERROR_MARKERS = ("database error", "unterminated quoted string", "syntax error")
+
+
+def request_headers():
+    """Headers for every harness request, with the gateway debug token when GUARDRAIL_DEBUG_TOKEN is set."""
+    headers = {"User-Agent": "SQLi-Attack-Script/1.0"}
+    token = os.environ.get("GUARDRAIL_DEBUG_TOKEN")
+    if token:
+        headers[DEBUG_TOKEN_HEADER] = token
+    return headers
+
+
+def iter_payloads(payload_file):
+    """Yield (payload, expected_type) pairs from the payload CSV one row at a time."""
+    with open(payload_file, "r", encoding='utf-8', newline='') as f:
+        reader = csv.reader(f)
+        for row in reader:
+            if len(row) >= 2:
+                yield row[0].strip(), row[1].strip().lower()
+
+
+def load_payloads(payload_file):
+    """Read all (payload, expected_type) pairs from the payload CSV."""
+    return list(iter_payloads(payload_file))
+
+
+def payload_source(args):
+    """Payload pairs for a run: the CSV file, or a generated corpus with --generate."""
+    if args.generate:
+        from corpus import generate
+        return generate(
+            iter_payloads(args.file), args.generate,
+            seed=args.corpus_seed, duplicate_ratio=args.duplicate_ratio,
+        )
+    return iter_payloads(args.file)
+
+
+def response_status(status_code, text):
+    """
+    BLOCKED, VULNERABLE, PASSED or ERROR for a target response.
+    Anything else the gateway answers with (429 when throttled, 5xx) is an ERROR,
+    so it stays out of the confusion matrix.
+    """
+    res_lower = text.lower()
+    if status_code == 403 or any(marker in res_lower for marker in BLOCK_MARKERS):
+        return "BLOCKED"
+    if any(marker in res_lower for marker in ERROR_MARKERS):
+        return "VULNERABLE"
+    if status_code == 200:
+        return "PASSED"
+    return "ERROR"
+
+
+def classify(expected_type, status_text):
+    """Confusion matrix key (TP, FN, FP, TN) and its label; ERROR for unanswered requests."""
+    if status_text == "ERROR":
+        return "ERROR", "ERROR"
+    is_malicious = expected_type == "malicious"
+    is_blocked = status_text == "BLOCKED"
+    if is_malicious:
+        return ("TP", "True Positive") if is_blocked else ("FN", "False Negative")
+    return ("FP", "False Positive") if is_blocked else ("TN", "True Negative")
+
+
+def attack(url, payload_data, mode, delay=0.05, run_id=None):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    filname_only = f"attack_results_mode_{mode}_{MODE_NAMES[mode]}.csv"
+    csv_filename = os.path.join(RESULTS_DIR, filname_only)
 
     print(f"{bcolors.HEADER}[*] Starting attack on target: {url}")
-    print(f"[*] with mode: {mode} ({mode_names[mode]}){bcolors.ENDC}")
+    print(f"[*] with mode: {mode} ({MODE_NAMES[mode]}){bcolors.ENDC}")
     print(f"-" * 55)
 
     state = {
@@ -39,95 +117,62 @@ def attack(url, payload_file, mode, delay=0.05):
         "FP": 0
     }
 
-    payload_data =[]
-
-    # Change from .txt to .csv
-    try:
-        with open(payload_file, "r", encoding='utf-8') as f:
-            reader = csv.reader(f)
-            for row in reader:
-                if len(row) >= 2:
-                    payload_data.append((row[0].strip(), row[1].strip().lower()))
-    except FileNotFoundError:
-        print(f"{bcolors.FAIL}Payload file not found: {payload_file}{bcolors.ENDC}")
-        sys.exit(1)
-    
     session = requests.Session()
-    session.headers.update({"User-Agent": "SQLi-Attack-Script/1.0"})
+    session.headers.update(request_headers())
 
-    with open(csv_filename, "w", newline='', encoding='utf-8') as csvfile:
+    with open(csv_filename, "w", newline='', encoding='utf-8') as csvfile, ResultWriter(mode, run_id) as store:
         writer = csv.writer(csvfile)
-        writer.writerow(["Mode","Payload", "Expected", "Status", "Latency(s)", "Classification"])
+        writer.writerow(["Mode","Payload", "Expected", "Status", "Latency(s)", "Classification", "Server-Timing"])
 
-        for payload, expected_type in payload_data:
+        for payload, expected_type, *_ in payload_data:
             data = {PARAM: payload}
             status_text = "N/A"
             latency = 0.0
             classification = "N/A"
+            server_timing = ""
 
             try:
                 start_time = time.perf_counter()
                 response = session.get(url, params=data, timeout=5)
                 end_time = time.perf_counter()
                 latency = end_time - start_time
-                
-                res_lower = response.text.lower()
-
-                if (response.status_code == 403 or 
-                    "security alert" in res_lower or 
-                    "threat type classification" in res_lower or 
-                    "sql injection blocked" in res_lower or 
-                    "sql injection detected" in res_lower or
-                    "guardrail" in res_lower or        
-                    "attack detected" in res_lower):
-                    status_text = "BLOCKED"
-                    print(f"{bcolors.FAIL}[BLOCKED] {bcolors.ENDC} {payload}")
+                server_timing = response.headers.get(SERVER_TIMING_HEADER, "")
 
-                elif "database error" in res_lower or "unterminated quoted string" in res_lower or "syntax error" in res_lower:
-                    status_text = "VULNERABLE"
+                status_text = response_status(response.status_code, response.text)
+                if status_text == "BLOCKED":
+                    print(f"{bcolors.FAIL}[BLOCKED] {bcolors.ENDC} {payload}")
+                elif status_text == "VULNERABLE":
                     print(f"{bcolors.WARNING}[VULNERABLE] {bcolors.ENDC} {payload}")
-
-                elif response.status_code == 200:
-                    status_text = "PASSED"
+                elif status_text == "PASSED":
                     print(f"{bcolors.OKGREEN}[PASSED] {bcolors.ENDC} {payload}")
                 else:
-                    print(f"{bcolors.HEADER}[UNKNOWN] {bcolors.ENDC} {payload} - Status Code: {response.status_code}")
-
-                is_malicious = expected_type == "malicious"
-                is_blocked = status_text == "BLOCKED"
-
-                if is_malicious:
-                    if is_blocked:
-                        state["TP"] += 1
-                        classification = "True Positive"
-                        color = bcolors.OKGREEN
-                    else:
-                        state["FN"] += 1
-                        classification = "False Negative"
-                        color = bcolors.FAIL
-                else:
-                    if is_blocked:
-                        state["FP"] += 1
-                        classification = "False Positive"
-                        color = bcolors.WARNING
-                    else:
-                        state["TN"] += 1
-                        classification = "True Negative"
-                        color = bcolors.OKGREEN
-
-                print(f"{color}[{classification}] Exp:{expected_type} -> Got:{status_text} | {payload[:40]}...{bcolors.ENDC}")
+                    print(f"{bcolors.HEADER}[ERROR] {bcolors.ENDC} {payload} - Status Code: {response.status_code}")
+
+                key, classification = classify(expected_type, status_text)
+                if key != "ERROR":
+                    state[key] += 1
+                    color = {
+                        "TP": bcolors.OKGREEN,
+                        "FN": bcolors.FAIL,
+                        "FP": bcolors.WARNING,
+                        "TN": bcolors.OKGREEN,
+                    }[key]
+
+                    print(f"{color}[{classification}] Exp:{expected_type} -> Got:{status_text} | {payload[:40]}...{bcolors.ENDC}")
                 
             except requests.RequestException as e:
                 status_text = "ERROR"
                 print(f"{bcolors.FAIL}[ERROR] Connection Refused or Timeout: {e}{bcolors.ENDC}")
                 writer.writerow([mode, payload, expected_type, status_text, 0.0, "ERROR"])
+                store.write(payload, expected_type, status_text, 0.0, "ERROR")
                 break
 
-            writer.writerow([mode, payload, expected_type, status_text, f"{latency:.4f}", classification])
+            writer.writerow([mode, payload, expected_type, status_text, f"{latency:.4f}", classification, server_timing])
+            store.write(payload, expected_type, status_text, latency, classification, server_timing=server_timing)
 
             time.sleep(delay)
     print("-" * 60)
-    print(f"Results saved to {csv_filename}")
+    print(f"Results saved to {csv_filename} (run {store.run_id})")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Perform a brute-force attack on a login page.")
@@ -135,8 +180,68 @@ if __name__ == "__main__":
     parser.add_argument("--file", default="payloads.csv", help="File with payloads")
     parser.add_argument("mode", type=int, choices=[1, 2, 3, 4, 5], help="Select test mode: 1 = No Security, 2 = LLM Only, 3 = ML Only, 4 = Filter Only, 5 = Everything Enabled")
     parser.add_argument("--delay", type=float, default=None, help="Delay between requests in seconds")
+    parser.add_argument("--run-id", default=None, help="Run ID for the Parquet results store (default: generated)")
+
+    corpus_group = parser.add_argument_group("generated corpus")
+    corpus_group.add_argument("--generate", type=int, default=None, metavar="N", help="Send N cases mutated from the payload file (see corpus.py) instead of the file itself")
+    corpus_group.add_argument("--corpus-seed", type=int, default=0, help="Seed for the generated corpus")
+    corpus_group.add_argument("--duplicate-ratio", type=float, default=0.0, help="Share of generated cases that repeat a recent one")
+
+    load_group = parser.add_argument_group("load mode")
+    load_group.add_argument("--load", action="store_true", help="Send payloads concurrently with asyncio/httpx and report throughput and latency percentiles")
+    load_group.add_argument("--concurrency", type=int, default=32, help="Maximum requests in flight")
+    load_group.add_argument("--rate", type=float, default=None, help="Open-loop arrival rate in requests/s (default: closed loop, as fast as possible)")
+    load_group.add_argument("--arrival", choices=["constant", "poisson"], default="constant", help="Inter-arrival distribution for --rate")
+    load_group.add_argument("--duration", type=float, default=30.0, help="Seconds to generate load for")
+    load_group.add_argument("--timeout", type=float, default=5.0, help="Per-request timeout in seconds")
+    load_group.add_argument("--seed", type=int, default=0, help="Seed for Poisson arrivals")
+    load_group.add_argument("--replay", metavar="CAPTURE", default=None, help="Replay a JSONL traffic capture (e.g. capture-sample.jsonl) instead of the payload file")
+    load_group.add_argument("--speed", type=float, default=1.0, help="Replay speed: 1 = original timing, 10 = ten times faster, 0 = as fast as possible")
 
     args = parser.parse_args()
+    if not args.replay and not os.path.exists(args.file):
+        print(f"{bcolors.FAIL}Payload file not found: {args.file}{bcolors.ENDC}")
+        sys.exit(1)
+
+    if args.replay:
+        from load import print_report
+        from replay import run_replay
+
+        if not os.path.exists(args.replay):
+            print(f"{bcolors.FAIL}Capture file not found: {args.replay}{bcolors.ENDC}")
+            sys.exit(1)
+
+        print(f"{bcolors.HEADER}[*] Replaying {args.replay} against {args.url} at speed {args.speed or 'max'}, mode {args.mode} ({MODE_NAMES[args.mode]}){bcolors.ENDC}")
+        result, paths = run_replay(
+            args.url, args.replay, args.mode,
+            speed=args.speed, concurrency=args.concurrency, timeout=args.timeout, run_id=args.run_id,
+        )
+        for endpoint, endpoint_result in sorted(result.endpoints.items()):
+            print_report(endpoint_result, title=endpoint)
+        print_report(result.total, title="all")
+        for path in paths:
+            print(f"Results saved to {path}")
+        sys.exit(0)
+
+    if args.load:
+        import asyncio
+        from load import print_report, run_load, save_results
+
+        # A fixed file is cycled for the whole run, a generated corpus is
+        # consumed as it is produced
+        payload_data = payload_source(args) if args.generate else load_payloads(args.file)
+
+        print(f"{bcolors.HEADER}[*] Load test on {args.url}, mode {args.mode} ({MODE_NAMES[args.mode]}){bcolors.ENDC}")
+        result = asyncio.run(run_load(
+            args.url, payload_data, args.mode,
+            rate=args.rate, duration=args.duration, concurrency=args.concurrency,
+            arrival=args.arrival, timeout=args.timeout, seed=args.seed,
+        ))
+        print_report(result)
+        for path in save_results(result, run_id=args.run_id):
+            print(f"Results saved to {path}")
+        sys.exit(0)
+
     if args.delay is None:
         if args.mode in [2, 5]:
             print(f"{bcolors.WARNING}[!] Heavy processing mode detected (LLM/ML). Auto-setting delay to 2.0s.{bcolors.ENDC}")
@@ -147,5 +252,5 @@ if __name__ == "__main__":
         else:
             args.delay = 0.05
 
-    attack(args.url, args.file, args.mode, args.delay)
+    attack(args.url, payload_source(args), args.mode, args.delay, run_id=args.run_id)
 
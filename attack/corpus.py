@@ -0,0 +1,179 @@
+"""
+Expand seed payloads into a large labeled corpus with evasion mutators.
+
+Cases are produced lazily, so a corpus of any size costs constant memory,
+and are reproducible for a given seed. A share of cases (duplicate_ratio)
+repeats a recently generated one, to study verdict cache hit rates on
+purpose.
+
+Usage:
+    python corpus.py --count 200000 --seed 1 --duplicate-ratio 0.3 -o corpus.csv
+"""
+
+import argparse
+import csv
+import random
+import re
+import sys
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from urllib.parse import quote
+
+from attack import iter_payloads
+
+SQL_KEYWORDS = re.compile(
+    r"\b(select|union|insert|update|delete|drop|from|where|and|or|order|by|sleep|waitfor|null|table|having)\b",
+    re.IGNORECASE,
+)
+
+# Latin letters and their Cyrillic/Greek lookalikes
+HOMOGLYPHS = {
+    "a": "а", "c": "с", "e": "е", "i": "і", "o": "о",
+    "p": "р", "s": "ѕ", "x": "х", "y": "у",
+    "A": "Α", "E": "Ε", "O": "Ο", "T": "Τ",
+}
+
+WHITESPACE_SUBSTITUTES = ("\t", "\n", "\r", "\x0b", "\x0c", "/**/", "  ")
+
+# Seen around payloads in real search boxes and forms
+BENIGN_FILLER = (
+    "harry potter", "clean code", "best books 2024", "python programming",
+    "the great gatsby", "data science handbook", "mystery novels",
+)
+
+# Replays of recent cases are drawn from this many of the latest
+RECENT_WINDOW = 10_000
+
+
+def url_encode(text: str, rng: random.Random) -> str:
+    """Percent-encode a random share of the characters."""
+    share = rng.uniform(0.3, 1.0)
+    return "".join(quote(ch, safe="") if rng.random() < share else ch for ch in text)
+
+
+def double_encode(text: str, rng: random.Random) -> str:
+    return quote(quote(text, safe=""), safe="")
+
+
+def toggle_case(text: str, rng: random.Random) -> str:
+    return SQL_KEYWORDS.sub(
+        lambda m: "".join(ch.upper() if rng.random() < 0.5 else ch.lower() for ch in m.group()),
+        text,
+    )
+
+
+def inline_comments(text: str, rng: random.Random) -> str:
+    """Replace spaces with comments and split keywords with versioned comments."""
+    text = text.replace(" ", "/**/")
+    return SQL_KEYWORDS.sub(
+        lambda m: m.group() if rng.random() < 0.5 else f"/*!{m.group()}*/",
+        text,
+    )
+
+
+def whitespace(text: str, rng: random.Random) -> str:
+    return "".join(rng.choice(WHITESPACE_SUBSTITUTES) if ch == " " else ch for ch in text)
+
+
+def homoglyphs(text: str, rng: random.Random) -> str:
+    return "".join(
+        HOMOGLYPHS[ch] if ch in HOMOGLYPHS and rng.random() < 0.3 else ch for ch in text
+    )
+
+
+def interleave_benign(text: str, rng: random.Random) -> str:
+    """Surround the payload with ordinary search text."""
+    before = rng.choice(BENIGN_FILLER)
+    after = rng.choice(BENIGN_FILLER) if rng.random() < 0.5 else ""
+    return f"{before} {text} {after}".rstrip()
+
+
+MUTATORS: dict[str, Callable[[str, random.Random], str]] = {
+    "url_encode": url_encode,
+    "double_encode": double_encode,
+    "toggle_case": toggle_case,
+    "inline_comments": inline_comments,
+    "whitespace": whitespace,
+    "homoglyphs": homoglyphs,
+    "interleave_benign": interleave_benign,
+}
+
+# Applied last, since they hide the characters other mutators look for
+ENCODERS = ("url_encode", "double_encode")
+
+
+def mutate(text: str, names: Iterable[str], rng: random.Random) -> str:
+    for name in sorted(names, key=lambda name: name in ENCODERS):
+        text = MUTATORS[name](text, rng)
+    return text
+
+
+def generate(
+    seeds: Iterable[tuple[str, str]],
+    count: int | None = None,
+    seed: int = 0,
+    duplicate_ratio: float = 0.0,
+    max_mutations: int = 3,
+    mutators: Iterable[str] = MUTATORS,
+) -> Iterator[tuple[str, str, str]]:
+    """
+    Yield (payload, label, applied mutators) cases, endlessly if count is None.
+
+    Labels carry over from the seed; mutators only change how a payload is
+    written, not whether it is an attack. At most one encoder is applied.
+    """
+    if not 0.0 <= duplicate_ratio < 1.0:
+        raise ValueError("duplicate_ratio must be in [0, 1)")
+
+    rng = random.Random(seed)
+    seeds = list(seeds)
+    if not seeds:
+        return
+    names = list(mutators)
+    recent: deque[tuple[str, str, str]] = deque(maxlen=RECENT_WINDOW)
+
+    produced = 0
+    while count is None or produced < count:
+        if recent and rng.random() < duplicate_ratio:
+            case = rng.choice(recent)
+        else:
+            payload, label = rng.choice(seeds)
+            applied = rng.sample(names, rng.randint(0, min(max_mutations, len(names))))
+            encoders = [name for name in applied if name in ENCODERS]
+            for name in encoders[1:]:
+                applied.remove(name)
+            case = (mutate(payload, applied, rng), label, "+".join(sorted(applied)) or "none")
+            recent.append(case)
+        produced += 1
+        yield case
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--seeds", default="payloads.csv", help="Seed payload CSV (payload,label)")
+    parser.add_argument("--count", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.0)
+    parser.add_argument("--max-mutations", type=int, default=3)
+    parser.add_argument(
+        "--mutators", nargs="+", choices=sorted(MUTATORS), default=list(MUTATORS),
+        help="Mutators to draw from (default: all)",
+    )
+    parser.add_argument("-o", "--output", default="-", help="Output CSV (default: stdout)")
+    args = parser.parse_args()
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+    try:
+        writer = csv.writer(out)
+        for payload, label, _ in generate(
+            iter_payloads(args.seeds), args.count, args.seed,
+            args.duplicate_ratio, args.max_mutations, args.mutators,
+        ):
+            writer.writerow([payload, label])
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+HDR-style latency histogram.
+
+Values are recorded in microseconds into log-linear buckets: every power of
+two is split into 2**(precision_bits - 1) equal sub-buckets, so any recorded
+value is reported within 1 / 2**(precision_bits - 1) of its true value
+(0.8% with the default 8 bits) while memory stays a few KB regardless of
+how many samples are recorded.
+"""
+
+from collections.abc import Iterable
+
+PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+
+class LatencyHistogram:
+    def __init__(self, precision_bits: int = 8):
+        self.precision_bits = precision_bits
+        self.sub_bucket_count = 1 << precision_bits
+        self.half_count = self.sub_bucket_count // 2
+        self.counts: list[int] = []
+        self.total = 0
+        self.sum_us = 0
+        self.min_us: int | None = None
+        self.max_us = 0
+
+    def _index(self, value: int) -> int:
+        if value < self.sub_bucket_count:
+            return value
+        shift = value.bit_length() - self.precision_bits
+        return shift * self.half_count + (value >> shift)
+
+    def _highest_equivalent(self, index: int) -> int:
+        """Largest value that lands in the bucket at index."""
+        if index < self.sub_bucket_count:
+            return index
+        shift = index // self.half_count - 1
+        sub_bucket = index - shift * self.half_count
+        return ((sub_bucket + 1) << shift) - 1
+
+    def record(self, seconds: float) -> None:
+        value = max(0, round(seconds * 1_000_000))
+        index = self._index(value)
+        if index >= len(self.counts):
+            self.counts.extend([0] * (index + 1 - len(self.counts)))
+        self.counts[index] += 1
+        self.total += 1
+        self.sum_us += value
+        self.min_us = value if self.min_us is None else min(self.min_us, value)
+        self.max_us = max(self.max_us, value)
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        if other.precision_bits != self.precision_bits:
+            raise ValueError("Cannot merge histograms with different precision")
+        if len(other.counts) > len(self.counts):
+            self.counts.extend([0] * (len(other.counts) - len(self.counts)))
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.total += other.total
+        self.sum_us += other.sum_us
+        if other.min_us is not None:
+            self.min_us = other.min_us if self.min_us is None else min(self.min_us, other.min_us)
+        self.max_us = max(self.max_us, other.max_us)
+
+    def percentile(self, percentile: float) -> float:
+        """Latency in seconds at or below which `percentile` % of samples fall."""
+        if self.total == 0:
+            return 0.0
+        target = max(1, round(self.total * percentile / 100))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return min(self._highest_equivalent(index), self.max_us) / 1_000_000
+        return self.max_us / 1_000_000
+
+    def mean(self) -> float:
+        return self.sum_us / self.total / 1_000_000 if self.total else 0.0
+
+    def summary(self, percentiles: Iterable[float] = PERCENTILES) -> dict[str, float]:
+        """Mean, max and percentiles in milliseconds."""
+        stats = {"mean_ms": self.mean() * 1000, "max_ms": self.max_us / 1000}
+        for percentile in percentiles:
+            stats[f"p{percentile:g}_ms"] = self.percentile(percentile) * 1000
+        return stats
@@ -0,0 +1,215 @@
+"""
+Async load generator for the attack harness.
+
+With a target rate, requests are started on an open-loop schedule (constant
+or Poisson arrivals) no matter how fast the gateway answers, and latency is
+measured from each request's intended start time. A request that has to
+wait for a free connection therefore counts its queueing delay, which
+corrects for coordinated omission. Without a rate, `concurrency` workers
+send back to back (closed loop) and latency is measured per request.
+"""
+
+import asyncio
+import csv
+import itertools
+import os
+import random
+import time
+from dataclasses import dataclass, field
+
+import httpx
+
+from attack import MODE_NAMES, PARAM, RESULTS_DIR, SERVER_TIMING_HEADER, classify, request_headers, response_status
+from histogram import LatencyHistogram
+from results_store import ResultWriter
+
+OUTCOMES = ("BLOCKED", "VULNERABLE", "PASSED", "ERROR", "TIMEOUT")
+
+
+@dataclass
+class LoadResult:
+    mode: int
+    rows: list[tuple] = field(default_factory=list)
+    # Response time from the intended start, and time on the wire
+    response_times: LatencyHistogram = field(default_factory=LatencyHistogram)
+    service_times: LatencyHistogram = field(default_factory=LatencyHistogram)
+    outcomes: dict[str, int] = field(default_factory=lambda: dict.fromkeys(OUTCOMES, 0))
+    state: dict[str, int] = field(default_factory=lambda: dict.fromkeys(("TP", "FN", "TN", "FP"), 0))
+    elapsed: float = 0.0
+    # Largest delay between a scheduled start and the scheduler getting to it
+    max_lag: float = 0.0
+
+    @property
+    def completed(self) -> int:
+        return sum(self.outcomes.values())
+
+    def summary(self) -> dict[str, float | int | str]:
+        completed = self.completed
+        summary = {
+            "Mode": MODE_NAMES[self.mode],
+            "Requests": completed,
+            "RPS": completed / self.elapsed if self.elapsed else 0.0,
+            "Error Rate": self.outcomes["ERROR"] / completed if completed else 0.0,
+            "Timeout Rate": self.outcomes["TIMEOUT"] / completed if completed else 0.0,
+            "Max Scheduler Lag (ms)": self.max_lag * 1000,
+        }
+        summary.update(self.state)
+        for name, value in self.response_times.summary().items():
+            summary[f"Response {name}"] = value
+        for name, value in self.service_times.summary().items():
+            summary[f"Service {name}"] = value
+        return summary
+
+
+async def timed_request(client, method, url, expected_type, intended, results, **kwargs):
+    """
+    Send one request and record its outcome in every LoadResult of results.
+    Returns (status, latency, classification, Server-Timing header).
+    """
+    server_timing = ""
+    start = time.perf_counter()
+    try:
+        response = await client.request(method, url, **kwargs)
+    except httpx.TimeoutException:
+        status_text, classification = "TIMEOUT", "ERROR"
+    except httpx.HTTPError:
+        status_text, classification = "ERROR", "ERROR"
+    else:
+        status_text = response_status(response.status_code, response.text)
+        key, classification = classify(expected_type, status_text)
+        server_timing = response.headers.get(SERVER_TIMING_HEADER, "")
+    end = time.perf_counter()
+
+    latency = end - intended
+    for result in results:
+        if classification != "ERROR":
+            result.state[key] += 1
+        result.outcomes[status_text] += 1
+        result.response_times.record(latency)
+        result.service_times.record(end - start)
+    return status_text, latency, classification, server_timing
+
+
+async def send(client, url, payload, expected_type, intended, result):
+    status_text, latency, classification, server_timing = await timed_request(
+        client, "GET", url, expected_type, intended, (result,), params={PARAM: payload}
+    )
+    result.rows.append((
+        result.mode, payload, expected_type, status_text, f"{latency:.4f}", classification, server_timing,
+    ))
+
+
+def payload_stream(payloads):
+    """Cycle a payload list; consume any other iterable (e.g. a generated corpus) once."""
+    if isinstance(payloads, list):
+        return itertools.cycle(payloads)
+    return iter(payloads)
+
+
+def arrival_offsets(rate, arrival, rng):
+    """Seconds after the start at which each request is due."""
+    offset = 0.0
+    while True:
+        yield offset
+        offset += rng.expovariate(rate) if arrival == "poisson" else 1.0 / rate
+
+
+async def open_loop(client, url, payloads, result, rate, duration, concurrency, arrival, seed):
+    rng = random.Random(seed)
+    slots = asyncio.Semaphore(concurrency)
+    tasks = set()
+
+    async def scheduled(payload, expected_type, intended):
+        async with slots:
+            await send(client, url, payload, expected_type, intended, result)
+
+    start = time.perf_counter()
+    for offset, (payload, expected_type, *_) in zip(arrival_offsets(rate, arrival, rng), payload_stream(payloads)):
+        if offset >= duration:
+            break
+        intended = start + offset
+        delay = intended - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            result.max_lag = max(result.max_lag, -delay)
+
+        task = asyncio.create_task(scheduled(payload, expected_type, intended))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    await asyncio.gather(*tasks)
+    result.elapsed = time.perf_counter() - start
+
+
+async def closed_loop(client, url, payloads, result, duration, concurrency):
+    source = payload_stream(payloads)
+    start = time.perf_counter()
+    deadline = start + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            case = next(source, None)
+            if case is None:
+                return
+            payload, expected_type, *_ = case
+            await send(client, url, payload, expected_type, time.perf_counter(), result)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result.elapsed = time.perf_counter() - start
+
+
+async def run_load(url, payloads, mode, rate=None, duration=30.0, concurrency=32,
+                   arrival="constant", timeout=5.0, seed=0):
+    result = LoadResult(mode)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, timeout=timeout, headers=request_headers()) as client:
+        if rate:
+            await open_loop(client, url, payloads, result, rate, duration, concurrency, arrival, seed)
+        else:
+            await closed_loop(client, url, payloads, result, duration, concurrency)
+    return result
+
+
+def print_report(result, title=None):
+    summary = result.summary()
+    print("-" * 60)
+    print(f"Mode:        {summary['Mode']}")
+    if title:
+        print(f"Endpoint:    {title}")
+    print(f"Requests:    {summary['Requests']} in {result.elapsed:.1f}s ({summary['RPS']:.1f} req/s)")
+    print(f"Errors:      {summary['Error Rate']:.2%}   Timeouts: {summary['Timeout Rate']:.2%}")
+    print(f"Confusion:   TP={summary['TP']} FN={summary['FN']} TN={summary['TN']} FP={summary['FP']}")
+    for kind in ("Response", "Service"):
+        percentiles = "  ".join(
+            f"{name.removesuffix('_ms')}={summary[f'{kind} {name}']:.1f}"
+            for name in ("p50_ms", "p90_ms", "p99_ms", "p99.9_ms", "max_ms")
+        )
+        print(f"{kind + ' ms:':<13}{percentiles}")
+    if result.max_lag > 0.01:
+        print(f"[!] Scheduler fell up to {result.max_lag * 1000:.0f} ms behind; the client may be saturated")
+
+
+def save_results(result, run_id=None):
+    """Write per-request rows, the Parquet store and the summary; returns the CSV paths."""
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    name = MODE_NAMES[result.mode]
+    rows_path = os.path.join(RESULTS_DIR, f"load_results_mode_{result.mode}_{name}.csv")
+    summary_path = os.path.join(RESULTS_DIR, f"load_summary_mode_{result.mode}_{name}.csv")
+
+    with open(rows_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Mode", "Payload", "Expected", "Status", "Latency(s)", "Classification", "Server-Timing"])
+        writer.writerows(result.rows)
+
+    with ResultWriter(result.mode, run_id) as store:
+        for _, payload, expected_type, status_text, latency, classification, server_timing in result.rows:
+            store.write(payload, expected_type, status_text, latency, classification, server_timing=server_timing)
+
+    summary = result.summary()
+    with open(summary_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(summary))
+        writer.writeheader()
+        writer.writerow(summary)
+
+    return rows_path, summary_path
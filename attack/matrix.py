@@ -0,0 +1,172 @@
+"""
+Run the load test across security modes and concurrency levels.
+
+For every mode the components are switched through their /activate and
+/deactivate endpoints and the gateway's verdict cache is purged. Then, for
+every concurrency level, a warm-up phase is run and discarded before a
+fixed steady-state window is measured. All summaries go into one CSV,
+with a JSON file next to it recording the environment and settings.
+
+Usage:
+    python matrix.py --modes 1 2 3 4 5 --concurrency 1 8 32 --warmup 10 --duration 60
+"""
+
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+import httpx
+
+from attack import MODE_NAMES, RESULTS_DIR, load_payloads
+from load import run_load
+
+# Component -> control URL; the gateway reads the same Redis keys
+COMPONENTS = {
+    "guardrail": "http://localhost:5000",
+    "guardrailv2": "http://localhost:5001",
+    "sql_error_filter": "http://localhost:5002",
+}
+
+MODE_COMPONENTS = {
+    1: set(),
+    2: {"guardrail"},
+    3: {"guardrailv2"},
+    4: {"sql_error_filter"},
+    5: {"guardrail", "guardrailv2", "sql_error_filter"},
+}
+
+CACHE_PURGE_PATH = "/_guardrail/cache/purge"
+
+
+def set_mode(mode, gateway_url, purge_cache=True):
+    """Switch components for a mode and verify them through /status."""
+    enabled = MODE_COMPONENTS[mode]
+    with httpx.Client(timeout=5.0) as client:
+        for component, base_url in COMPONENTS.items():
+            action = "activate" if component in enabled else "deactivate"
+            client.get(f"{base_url}/{action}").raise_for_status()
+            status = client.get(f"{base_url}/status").json()
+            if status.get("active") is not (component in enabled):
+                print(f"[!] {component} did not {action}: {status}")
+
+        if purge_cache:
+            # The gateway's admin endpoints need the same token as the services'
+            headers = {"X-Admin-Token": os.environ.get("ADMIN_TOKEN", "")}
+            response = client.post(gateway_url.rstrip("/") + CACHE_PURGE_PATH, headers=headers)
+            if response.status_code != 200:
+                print(f"[!] Verdict cache purge failed with {response.status_code}")
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def file_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def environment(args, run_id):
+    return {
+        "run_id": run_id,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        "python": sys.version,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "hostname": platform.node(),
+        "httpx": httpx.__version__,
+        "payload_file": args.file,
+        "payload_sha256": file_digest(args.file),
+        "settings": vars(args),
+    }
+
+
+def run_matrix(args, payloads, run_id):
+    for mode in args.modes:
+        print(f"[*] Mode {mode} ({MODE_NAMES[mode]})")
+        set_mode(mode, args.url, purge_cache=not args.keep_cache)
+        time.sleep(args.settle)
+
+        for concurrency in args.concurrency:
+            load_args = dict(
+                rate=args.rate, concurrency=concurrency, arrival=args.arrival,
+                timeout=args.timeout, seed=args.seed,
+            )
+            if args.warmup > 0:
+                asyncio.run(run_load(args.url, payloads, mode, duration=args.warmup, **load_args))
+
+            result = asyncio.run(run_load(args.url, payloads, mode, duration=args.duration, **load_args))
+            summary = result.summary()
+            print(
+                f"    concurrency {concurrency:>4}: {summary['RPS']:8.1f} req/s  "
+                f"p50 {summary['Response p50_ms']:8.1f} ms  p99 {summary['Response p99_ms']:8.1f} ms  "
+                f"errors {summary['Error Rate']:.2%}"
+            )
+            yield {
+                "Run ID": run_id,
+                "Mode ID": mode,
+                "Concurrency": concurrency,
+                "Target RPS": args.rate or "",
+                **summary,
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8080/", help="Gateway URL")
+    parser.add_argument("--file", default="payloads.csv", help="File with payloads")
+    parser.add_argument("--modes", type=int, nargs="+", choices=sorted(MODE_NAMES), default=sorted(MODE_NAMES))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--rate", type=float, default=None, help="Open-loop arrival rate (default: closed loop)")
+    parser.add_argument("--arrival", choices=["constant", "poisson"], default="constant")
+    parser.add_argument("--warmup", type=float, default=10.0, help="Discarded warm-up seconds per cell")
+    parser.add_argument("--duration", type=float, default=60.0, help="Measured steady-state seconds per cell")
+    parser.add_argument("--settle", type=float, default=1.0, help="Seconds to wait after switching modes")
+    parser.add_argument("--timeout", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep-cache", action="store_true", help="Don't purge the gateway verdict cache between modes")
+    args = parser.parse_args()
+
+    payloads = load_payloads(args.file)
+    run_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ") + "-" + uuid.uuid4().hex[:6]
+    env = environment(args, run_id)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    csv_path = os.path.join(RESULTS_DIR, f"matrix_{run_id}.csv")
+    env_path = os.path.join(RESULTS_DIR, f"matrix_{run_id}.json")
+
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = None
+        for row in run_matrix(args, payloads, run_id):
+            if writer is None:
+                writer = csv.DictWriter(f, fieldnames=list(row))
+                writer.writeheader()
+            writer.writerow(row)
+            f.flush()
+
+    env["finished_at"] = datetime.now(timezone.utc).isoformat()
+    with open(env_path, "w", encoding="utf-8") as f:
+        json.dump(env, f, indent=2)
+
+    print(f"Results saved to {csv_path}")
+    print(f"Environment saved to {env_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Replay a JSONL traffic capture against the gateway.
+
+Each line of the capture is one request:
+
+    {"ts": 1718000000.25, "method": "POST", "path": "/login/",
+     "headers": {"Content-Type": "application/x-www-form-urlencoded"},
+     "body": "username=admin%27--&password=x", "expected": "malicious"}
+
+Only `path` is required; `method` defaults to GET, `expected` to benign and
+`body` may also be an object of form fields. The file is read one line at a
+time, so captures of any size replay in constant memory. Requests keep
+their original spacing divided by `speed`; speed 0 sends as fast as
+`concurrency` allows. POSTs get Django's CSRF token in X-CSRFToken.
+"""
+
+import asyncio
+import csv
+import json
+import os
+import re
+import time
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+import httpx
+
+from attack import MODE_NAMES, RESULTS_DIR, request_headers
+from load import LoadResult, timed_request
+from results_store import ResultWriter
+
+BOOK_PATH = re.compile(r"^/book/\d+/?$")
+
+# Replaying these would clash with the client's own connection and session
+SKIPPED_HEADERS = {"host", "content-length", "connection", "cookie", "transfer-encoding"}
+
+# Page fetched once to obtain the csrftoken cookie
+CSRF_PAGE = "/login/"
+
+
+@dataclass
+class CapturedRequest:
+    path: str
+    method: str = "GET"
+    headers: dict[str, str] = field(default_factory=dict)
+    body: str | dict | None = None
+    ts: float | None = None
+    expected: str = "benign"
+
+    @property
+    def endpoint(self) -> str:
+        parts = urlsplit(self.path)
+        if parts.path == "/":
+            return "search" if "q=" in parts.query else "home"
+        if BOOK_PATH.match(parts.path):
+            return "book"
+        if parts.path.rstrip("/") in ("/login", "/register"):
+            return parts.path.strip("/")
+        return "other"
+
+
+def read_capture(path: str) -> Iterator[CapturedRequest]:
+    """Yield captured requests one line at a time, skipping malformed lines."""
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                data = json.loads(line)
+                yield CapturedRequest(
+                    path=data["path"],
+                    method=data.get("method", "GET").upper(),
+                    headers=data.get("headers") or {},
+                    body=data.get("body"),
+                    ts=data.get("ts"),
+                    expected=data.get("expected", "benign").lower(),
+                )
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                print(f"[!] Skipping capture line {number}: {e}")
+
+
+def request_kwargs(client, captured: CapturedRequest) -> dict:
+    headers = {
+        name: value for name, value in captured.headers.items()
+        if name.lower() not in SKIPPED_HEADERS
+    }
+    if captured.method not in ("GET", "HEAD") and "x-csrftoken" not in {h.lower() for h in headers}:
+        token = client.cookies.get("csrftoken")
+        if token:
+            headers["X-CSRFToken"] = token
+
+    kwargs = {"headers": headers}
+    if isinstance(captured.body, dict):
+        kwargs["data"] = captured.body
+    elif captured.body is not None:
+        kwargs["content"] = captured.body
+    return kwargs
+
+
+@dataclass
+class ReplayResult:
+    mode: int
+    endpoints: dict[str, LoadResult] = field(default_factory=dict)
+    total: LoadResult = field(init=False)
+    elapsed: float = 0.0
+
+    def __post_init__(self):
+        self.total = LoadResult(self.mode)
+
+    def endpoint(self, name: str) -> LoadResult:
+        if name not in self.endpoints:
+            self.endpoints[name] = LoadResult(self.mode)
+        return self.endpoints[name]
+
+
+async def replay(url, capture_path, mode, writer, store, speed=1.0, concurrency=32, timeout=5.0):
+    result = ReplayResult(mode)
+    slots = asyncio.Semaphore(concurrency)
+    tasks = set()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=timeout, headers=request_headers()) as client:
+        try:
+            await client.get(CSRF_PAGE)
+        except httpx.HTTPError as e:
+            print(f"[!] Could not fetch a CSRF token: {e}")
+
+        async def run(captured, intended):
+            try:
+                endpoint = captured.endpoint
+                status_text, latency, classification, server_timing = await timed_request(
+                    client, captured.method, captured.path, captured.expected, intended,
+                    (result.endpoint(endpoint), result.total), **request_kwargs(client, captured),
+                )
+                writer.writerow([
+                    mode, endpoint, captured.method, captured.path, captured.expected,
+                    status_text, f"{latency:.4f}", classification, server_timing,
+                ])
+                store.write(
+                    captured.path, captured.expected, status_text, latency, classification,
+                    endpoint=endpoint, method=captured.method, server_timing=server_timing,
+                )
+            finally:
+                slots.release()
+
+        start = time.perf_counter()
+        first_ts = None
+        for captured in read_capture(capture_path):
+            intended = time.perf_counter()
+            if speed > 0 and captured.ts is not None:
+                first_ts = captured.ts if first_ts is None else first_ts
+                intended = start + (captured.ts - first_ts) / speed
+                delay = intended - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    result.total.max_lag = max(result.total.max_lag, -delay)
+
+            # Waiting for a slot here keeps memory bounded; the wait still
+            # counts towards latency since `intended` is already fixed
+            await slots.acquire()
+            task = asyncio.create_task(run(captured, intended))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        await asyncio.gather(*tasks)
+        result.elapsed = time.perf_counter() - start
+
+    for target in (*result.endpoints.values(), result.total):
+        target.elapsed = result.elapsed
+    return result
+
+
+def run_replay(url, capture_path, mode, speed=1.0, concurrency=32, timeout=5.0, run_id=None):
+    """Replay a capture, streaming per-request rows to CSV; returns (result, paths)."""
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    name = MODE_NAMES[mode]
+    rows_path = os.path.join(RESULTS_DIR, f"replay_results_mode_{mode}_{name}.csv")
+    summary_path = os.path.join(RESULTS_DIR, f"replay_summary_mode_{mode}_{name}.csv")
+
+    with open(rows_path, "w", newline="", encoding="utf-8") as f, ResultWriter(mode, run_id) as store:
+        writer = csv.writer(f)
+        writer.writerow([
+            "Mode", "Endpoint", "Method", "Path", "Expected", "Status", "Latency(s)", "Classification",
+            "Server-Timing",
+        ])
+        result = asyncio.run(replay(url, capture_path, mode, writer, store, speed, concurrency, timeout))
+
+    summaries = [{"Endpoint": "all", **result.total.summary()}]
+    for endpoint, endpoint_result in sorted(result.endpoints.items()):
+        summaries.append({"Endpoint": endpoint, **endpoint_result.summary()})
+    with open(summary_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(summaries[0]))
+        writer.writeheader()
+        writer.writerows(summaries)
+
+    return result, (rows_path, summary_path)
@@ -0,0 +1,97 @@
+"""
+Partitioned Parquet store for attack results.
+
+Every run gets a run ID and its rows are written in typed, compressed
+Parquet files partitioned by run and mode:
+
+    results/store/run_id=<run id>/mode=<mode>/part-00000.parquet
+
+Rows are buffered and flushed every ROWS_PER_PART rows, so memory stays
+bounded however large the run. Files are never rewritten, which lets the
+analyzer process only partitions it hasn't seen yet.
+"""
+
+import os
+import uuid
+from datetime import datetime, timezone
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # The CSV results still work without pyarrow
+    pa = pq = None
+
+STORE_DIR = "results/store"
+ROWS_PER_PART = 100_000
+
+COLUMNS = ("endpoint", "method", "payload", "expected", "status", "latency_s", "classification", "server_timing")
+
+
+def _schema():
+    category = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ("endpoint", category),
+        ("method", category),
+        ("payload", pa.string()),
+        ("expected", category),
+        ("status", category),
+        ("latency_s", pa.float32()),
+        ("classification", category),
+        ("server_timing", pa.string()),
+    ])
+
+
+def new_run_id():
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ") + "-" + uuid.uuid4().hex[:6]
+
+
+class ResultWriter:
+    """Append rows for one run and mode; use as a context manager."""
+
+    def __init__(self, mode, run_id=None, root=STORE_DIR, rows_per_part=ROWS_PER_PART):
+        self.mode = mode
+        self.run_id = run_id or new_run_id()
+        self.directory = os.path.join(root, f"run_id={self.run_id}", f"mode={mode}")
+        self.rows_per_part = rows_per_part
+        self.enabled = pa is not None
+        self.parts = 0
+        self._columns = {name: [] for name in COLUMNS}
+        if not self.enabled:
+            print("[!] pyarrow is not installed; results are not written to the Parquet store")
+
+    def write(self, payload, expected, status, latency, classification, endpoint="search", method="GET",
+              server_timing=None):
+        if not self.enabled:
+            return
+        columns = self._columns
+        columns["endpoint"].append(endpoint)
+        columns["method"].append(method)
+        columns["payload"].append(payload)
+        columns["expected"].append(expected)
+        columns["status"].append(status)
+        columns["latency_s"].append(float(latency))
+        columns["classification"].append(classification)
+        columns["server_timing"].append(server_timing or None)
+        if len(columns["payload"]) >= self.rows_per_part:
+            self.flush()
+
+    def flush(self):
+        if not self.enabled or not self._columns["payload"]:
+            return
+        table = pa.table(self._columns, schema=_schema())
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"part-{self.parts:05d}.parquet")
+        # Written under a temporary name so readers never see half a file
+        pq.write_table(table, path + ".tmp", compression="zstd")
+        os.replace(path + ".tmp", path)
+        self.parts += 1
+        self._columns = {name: [] for name in COLUMNS}
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
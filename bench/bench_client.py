@@ -0,0 +1,65 @@
+"""
+Django client: GuardrailClient.check_query against a stub guardrailv2.
+"""
+
+import os
+import sys
+from contextlib import ExitStack
+from typing import Iterator
+
+from harness import ROOT, Benchmark, event_loop
+from stubs import BLOCK_MARKER, StubGuardrail
+
+GROUP = "client"
+
+QUERY = 'SELECT "core_book"."id", "core_book"."title" FROM "core_book" WHERE "core_book"."title" LIKE %s'
+
+
+def benchmarks(stack: ExitStack) -> Iterator[Benchmark]:
+    import django
+    from django.conf import settings
+
+    stub = stack.enter_context(StubGuardrail())
+    if not settings.configured:
+        settings.configure(
+            GUARDRAIL_SERVICE_URL=stub.url,
+            GUARDRAIL_TIMEOUT=5.0,
+            GUARDRAIL_ENABLED=True,
+            GUARDRAIL_FAIL_OPEN=False,
+        )
+        django.setup()
+    sys.path.insert(0, os.path.join(ROOT, "test-app"))
+    from django_guardrail import memo
+    from django_guardrail.client import GuardrailClient
+    from django_guardrail.exceptions import SQLInjectionDetected
+
+    client = GuardrailClient()
+    stack.callback(lambda: client._client and client._client.close())
+
+    yield Benchmark(GROUP, "check_query", lambda: client.check_query(QUERY, ("%history%",)), {"verdict": "allow"})
+
+    def blocked() -> None:
+        try:
+            client.check_query(QUERY, (f"%{BLOCK_MARKER}%",))
+        except SQLInjectionDetected:
+            pass
+
+    yield Benchmark(GROUP, "check_query", blocked, {"verdict": "block"})
+
+    # A repeated query within one request, answered from the request memo;
+    # benchmarks run while the generator is suspended at the yield
+    token = memo.begin()
+    try:
+        client.check_query(QUERY, ("%memo%",))
+        yield Benchmark(GROUP, "check_query", lambda: client.check_query(QUERY, ("%memo%",)), {"verdict": "memo"})
+    finally:
+        memo.end(token)
+
+    loop = stack.enter_context(event_loop())
+    stack.callback(lambda: loop.run_until_complete(client.aclose()))
+    yield Benchmark(
+        GROUP,
+        "acheck_query",
+        lambda: loop.run_until_complete(client.acheck_query(QUERY, ("%history%",))),
+        {"verdict": "allow"},
+    )
@@ -0,0 +1,59 @@
+"""
+guardrail: LLM reply parsing, and a whole check against a fake OpenAI endpoint.
+"""
+
+from contextlib import ExitStack
+from typing import Iterator
+
+import httpx
+from fakeredis import aioredis
+from openai import AsyncOpenAI
+
+from harness import Benchmark, event_loop, load_service
+from stubs import FakeOpenAI
+
+GROUP = "guardrail"
+
+REPLIES = {
+    "clean": "DETECTED: false\nTHREAT: none\nPAYLOAD: none",
+    "detected": (
+        "DETECTED: true\nTHREAT: UNION-based SQL injection\n"
+        "PAYLOAD: ' UNION SELECT username, password FROM auth_user--"
+    ),
+    # Models sometimes explain themselves before the verdict
+    "verbose": (
+        "The input contains a quote followed by a boolean tautology, which is a "
+        "classic way to bypass a WHERE clause. " * 8
+        + "\nDETECTED: true\nTHREAT: Boolean-based SQL injection\nPAYLOAD: ' OR 1=1--"
+    ),
+}
+
+CHECK_HEADERS = {
+    "X-Original-URI": "/?q=%27+UNION+SELECT+username%2C+password+FROM+auth_user--",
+    "X-Original-Method": "GET",
+}
+
+
+def benchmarks(stack: ExitStack) -> Iterator[Benchmark]:
+    main = load_service("guardrail")
+
+    for reply, text in REPLIES.items():
+        yield Benchmark(GROUP, "parse_llm_response", lambda text=text: main.parse_llm_response(text), {"reply": reply})
+
+    fake = stack.enter_context(FakeOpenAI(REPLIES["detected"]))
+    loop = stack.enter_context(event_loop())
+
+    main.redis_client = aioredis.FakeRedis(decode_responses=True)
+    main.openai_client = AsyncOpenAI(api_key="bench", base_url=f"{fake.url}/v1")
+    # Never flushed; a full buffer drops the oldest records at the same cost
+    main.decision_log = main.DecisionLog(main.redis_client, "guardrail")
+    # No budget, so every check runs at the full level
+    main.token_budget = main.TokenBudget(main.redis_client, budget=0)
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://guardrail")
+    stack.callback(lambda: loop.run_until_complete(client.aclose()))
+    stack.callback(lambda: loop.run_until_complete(main.openai_client.close()))
+
+    def check() -> httpx.Response:
+        return loop.run_until_complete(client.post("/", headers=CHECK_HEADERS))
+
+    yield Benchmark(GROUP, "check_request", check, {"openai": "fake"})
@@ -0,0 +1,63 @@
+"""
+guardrailv2: predict() by input length, and the model by batch size and length.
+
+Needs torch, transformers and the model in the Hugging Face cache.
+"""
+
+from contextlib import ExitStack
+from typing import Iterator
+
+import torch
+from transformers import MobileBertForSequenceClassification, MobileBertTokenizer
+
+from harness import Benchmark, load_service
+
+GROUP = "guardrailv2"
+
+SEQUENCE_LENGTHS = (16, 64, 256, 512)
+BATCH_SIZES = (1, 8, 32)
+BATCH_LENGTHS = (32, 128, 512)
+
+FILLER = (
+    "/?q=%27+UNION+SELECT+username%2C+password+FROM+auth_user+WHERE+id%3D1+OR+1%3D1-- "
+    "/books/?q=the+history+of+databases+and+query+languages&page=2 "
+)
+
+
+def text_of_length(tokenizer: MobileBertTokenizer, tokens: int) -> str:
+    """Input that tokenizes to about `tokens` tokens, [CLS] and [SEP] included."""
+    pieces = tokenizer.tokenize(FILLER * (tokens // 8 + 1))[: tokens - 2]
+    return tokenizer.convert_tokens_to_string(pieces)
+
+
+def benchmarks(stack: ExitStack) -> Iterator[Benchmark]:
+    main = load_service("guardrailv2")
+    main.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    main.tokenizer = MobileBertTokenizer.from_pretrained(main.TOKENIZER_NAME)
+    main.model = MobileBertForSequenceClassification.from_pretrained(main.MODEL_NAME)
+    main.model.to(main.device)
+    main.model.eval()
+    device = main.device.type
+
+    for length in SEQUENCE_LENGTHS:
+        text = text_of_length(main.tokenizer, length)
+        yield Benchmark(GROUP, "predict", lambda text=text: main.predict(text), {"tokens": length, "device": device})
+
+    for batch_size in BATCH_SIZES:
+        for length in BATCH_LENGTHS:
+            inputs = main.tokenizer(
+                [text_of_length(main.tokenizer, length)] * batch_size,
+                padding="max_length",
+                truncation=True,
+                max_length=length,
+                return_tensors="pt",
+            ).to(main.device)
+
+            def forward(inputs=inputs) -> float:
+                with torch.inference_mode():
+                    logits = main.model(input_ids=inputs["input_ids"], attention_mask=inputs["attention_mask"]).logits
+                    return logits[0][1].item()
+
+            yield Benchmark(
+                GROUP, "model", forward, {"batch": batch_size, "tokens": length, "device": device}
+            )
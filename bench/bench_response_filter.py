@@ -0,0 +1,26 @@
+"""
+response-filter: contains_sql_error on synthetic pages of increasing size.
+"""
+
+from contextlib import ExitStack
+from typing import Iterator
+
+from harness import Benchmark, load_service
+
+GROUP = "response_filter"
+
+PAGE_SIZES = (10_000, 100_000, 1_000_000)
+PAGE_KINDS = ("clean", "error", "adversarial")
+
+
+def benchmarks(stack: ExitStack) -> Iterator[Benchmark]:
+    main = load_service("response-filter")
+    # Same pages as response-filter/benchmark.py
+    build_page = load_service("response-filter", "benchmark").build_page
+
+    for kind in PAGE_KINDS:
+        for size in PAGE_SIZES:
+            page = build_page(size, kind)
+            yield Benchmark(
+                GROUP, "contains_sql_error", lambda page=page: main.contains_sql_error(page), {"page": kind, "size": size}
+            )
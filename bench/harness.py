@@ -0,0 +1,134 @@
+"""
+Timing, service loading and baseline bookkeeping for the benchmark suite.
+"""
+
+import asyncio
+import importlib.util
+import json
+import os
+import platform
+import statistics
+import sys
+import timeit
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from types import ModuleType
+from typing import Any, Callable, Iterator
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPEAT = 5
+
+
+@dataclass
+class Benchmark:
+    group: str
+    name: str
+    func: Callable[[], Any]
+    params: dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def key(self) -> str:
+        return result_key(self.group, self.name, self.params)
+
+
+@dataclass
+class Result:
+    key: str
+    # Seconds per call: median and fastest of REPEAT timed batches
+    median: float
+    best: float
+    calls: int
+
+    def to_json(self) -> dict[str, float | int]:
+        return {"median_us": round(self.median * 1e6, 3), "best_us": round(self.best * 1e6, 3), "calls": self.calls}
+
+
+def result_key(group: str, name: str, params: dict[str, Any]) -> str:
+    if not params:
+        return f"{group}.{name}"
+    return f"{group}.{name}[{','.join(f'{k}={v}' for k, v in params.items())}]"
+
+
+def measure(benchmark: Benchmark, repeat: int = REPEAT) -> Result:
+    """Time batches of calls long enough to be measured, like python -m timeit."""
+    # Lazy imports, connection setup and caches are not what is measured
+    benchmark.func()
+    timer = timeit.Timer(benchmark.func)
+    number, _ = timer.autorange()
+    per_call = [total / number for total in timer.repeat(repeat=repeat, number=number)]
+    return Result(benchmark.key, statistics.median(per_call), min(per_call), number * repeat)
+
+
+def load_service(directory: str, module: str = "main") -> ModuleType:
+    """
+    Import a service's module under a unique name; every service has a
+    main.py, and their helpers import each other by bare name.
+    """
+    path = os.path.join(ROOT, directory)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    name = f"{directory.replace('-', '_')}_{module}"
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, os.path.join(path, f"{module}.py"))
+    service = importlib.util.module_from_spec(spec)
+    sys.modules[name] = service
+    spec.loader.exec_module(service)
+    return service
+
+
+@contextmanager
+def event_loop() -> Iterator[asyncio.AbstractEventLoop]:
+    loop = asyncio.new_event_loop()
+    try:
+        yield loop
+    finally:
+        loop.close()
+
+
+def machine() -> dict[str, str | int]:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count() or 0,
+    }
+
+
+def save_baseline(path: str, results: list[Result], skipped: dict[str, str]) -> None:
+    data = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "machine": machine(),
+        "skipped": skipped,
+        "results": {result.key: result.to_json() for result in results},
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+        f.write("\n")
+
+
+def compare(path: str, results: list[Result], threshold: float) -> list[str]:
+    """Print each benchmark against the baseline; returns the regressed keys."""
+    with open(path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline["machine"] != machine():
+        print(f"[!] Baseline was recorded on another machine: {baseline['machine']}")
+
+    regressions = []
+    print(f"\n{'benchmark':<60}{'baseline us':>14}{'current us':>14}{'change':>9}")
+    for result in results:
+        before = baseline["results"].get(result.key)
+        if before is None:
+            print(f"{result.key:<60}{'-':>14}{result.median * 1e6:>14.2f}{'new':>9}")
+            continue
+        change = result.median * 1e6 / before["median_us"] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(result.key)
+            flag = "  <- slower"
+        print(
+            f"{result.key:<60}{before['median_us']:>14.2f}"
+            f"{result.median * 1e6:>14.2f}{change:>+9.1%}{flag}"
+        )
+    return regressions
@@ -0,0 +1,104 @@
+-- Benchmarks for gateway/sql_error_scanner.lua, run by bench/run.py through
+--   resty -I gateway bench/lua/scanner.lua
+-- Prints one JSON result per line, timed in CPU seconds like the Python
+-- harness: the median and best of REPEAT batches of calls.
+
+local cjson = require "cjson"
+local scanner = require "sql_error_scanner"
+
+local GROUP = "gateway"
+local REPEAT = 5
+local MIN_BATCH_SECONDS = 0.2
+local CHUNK_SIZE = 8192
+local PAGE_SIZES = { 10000, 100000, 1000000 }
+local PAGE_KINDS = { "clean", "error", "adversarial" }
+
+-- Same pages as response-filter/benchmark.py
+local BOOK_CARD = [[<div class="col-md-4"><div class="card h-100 shadow-sm">
+<img src="https://covers.example/%d.jpg" class="card-img-top" alt="Book %d">
+<div class="card-body"><h5 class="card-title">Book title %d</h5>
+<p class="card-text">A description of book %d, its relation to other books and why it matters.</p>
+<a href="/book/%d/" class="btn btn-gold">Details</a></div></div></div>
+]]
+local SQL_ERROR = "<pre>Exception Value: relation &quot;core_books&quot; does not exist</pre>"
+
+local function build_page(size, kind)
+    if kind == "adversarial" then
+        local unit = 'relation column table near " '
+        return string.rep(unit, math.floor(size / #unit) + 1):sub(1, size)
+    end
+
+    local parts = { '<html><body><div class="row">' }
+    local length = #parts[1]
+    local i = 0
+    while length < size do
+        local card = string.format(BOOK_CARD, i, i, i, i, i)
+        parts[#parts + 1] = card
+        length = length + #card
+        i = i + 1
+    end
+    if kind == "error" then
+        parts[#parts + 1] = SQL_ERROR
+    end
+    parts[#parts + 1] = "</div></body></html>"
+    return table.concat(parts)
+end
+
+local function chunks_of(page)
+    local chunks = {}
+    for first = 1, #page, CHUNK_SIZE do
+        chunks[#chunks + 1] = page:sub(first, first + CHUNK_SIZE - 1)
+    end
+    return chunks
+end
+
+local function run_batch(func, number)
+    local started = os.clock()
+    for _ = 1, number do
+        func()
+    end
+    return os.clock() - started
+end
+
+local function measure(name, params, func)
+    local number = 1
+    while run_batch(func, number) < MIN_BATCH_SECONDS do
+        number = number * 2
+    end
+
+    local per_call = {}
+    for i = 1, REPEAT do
+        per_call[i] = run_batch(func, number) / number
+    end
+    table.sort(per_call)
+
+    print(cjson.encode({
+        group = GROUP,
+        name = name,
+        params = params,
+        median = per_call[math.ceil(REPEAT / 2)],
+        best = per_call[1],
+        calls = number * REPEAT,
+    }))
+end
+
+for _, kind in ipairs(PAGE_KINDS) do
+    for _, size in ipairs(PAGE_SIZES) do
+        local page = build_page(size, kind)
+        local chunks = chunks_of(page)
+
+        measure("find", { page = kind, size = size }, function()
+            return scanner.find(page)
+        end)
+
+        measure("stream", { page = kind, size = size, chunk = CHUNK_SIZE }, function()
+            local s = scanner.new()
+            for i = 1, #chunks do
+                local _, matched = s:feed(chunks[i], i == #chunks)
+                if matched then
+                    return matched
+                end
+            end
+        end)
+    end
+end
@@ -0,0 +1,116 @@
+"""
+Microbenchmarks for the detector hot paths, offline.
+
+Redis is replaced by fakeredis, OpenAI and guardrailv2 by in-process stub
+servers (stubs.py). Groups whose dependencies are missing are skipped:
+guardrailv2 needs torch and the cached model, gateway needs resty
+(OpenResty's CLI) on PATH.
+
+Usage:
+    python bench/run.py                                  # all groups
+    python bench/run.py --groups response_filter gateway
+    python bench/run.py --save-baseline                  # write bench/baseline.json
+    python bench/run.py --compare --threshold 0.10       # exit 1 on regressions
+"""
+
+import argparse
+import importlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+from contextlib import ExitStack
+
+from harness import ROOT, Result, compare, measure, result_key, save_baseline
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+LUA_SCANNER = os.path.join(ROOT, "bench", "lua", "scanner.lua")
+
+# Group name -> module with a benchmarks(stack) generator
+PYTHON_GROUPS = {
+    "guardrail": "bench_guardrail",
+    "guardrailv2": "bench_guardrailv2",
+    "response_filter": "bench_response_filter",
+    "client": "bench_client",
+}
+GROUPS = [*PYTHON_GROUPS, "gateway"]
+
+
+def report(result: Result) -> None:
+    print(f"{result.key:<60}{result.median * 1e6:>14.2f}{result.best * 1e6:>14.2f}{result.calls:>10}", flush=True)
+
+
+def run_python_group(group: str, results: list[Result], skipped: dict[str, str]) -> None:
+    with ExitStack() as stack:
+        try:
+            module = importlib.import_module(PYTHON_GROUPS[group])
+            for benchmark in module.benchmarks(stack):
+                result = measure(benchmark)
+                report(result)
+                results.append(result)
+        except (ImportError, OSError) as e:
+            # OSError: e.g. the model is neither cached nor downloadable
+            skipped[group] = f"{type(e).__name__}: {e}"
+
+
+def run_lua_group(results: list[Result], skipped: dict[str, str]) -> None:
+    resty = shutil.which("resty")
+    if resty is None:
+        skipped["gateway"] = "resty not found on PATH"
+        return
+
+    process = subprocess.run(
+        [resty, "-I", os.path.join(ROOT, "gateway"), LUA_SCANNER],
+        capture_output=True,
+        text=True,
+    )
+    if process.returncode != 0:
+        skipped["gateway"] = process.stderr.strip().splitlines()[-1]
+        return
+    for line in process.stdout.splitlines():
+        data = json.loads(line)
+        key = result_key(data["group"], data["name"], dict(sorted(data["params"].items())))
+        result = Result(key, data["median"], data["best"], data["calls"])
+        report(result)
+        results.append(result)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--groups", nargs="+", choices=GROUPS, default=GROUPS)
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help=f"Store the results in {BASELINE_PATH}")
+    parser.add_argument("--compare", action="store_true", help="Compare the results with the baseline")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed relative slowdown of the median, e.g. 0.10 for 10%%")
+    args = parser.parse_args()
+
+    results: list[Result] = []
+    skipped: dict[str, str] = {}
+
+    print(f"{'benchmark':<60}{'median us':>14}{'best us':>14}{'calls':>10}")
+    for group in args.groups:
+        if group == "gateway":
+            run_lua_group(results, skipped)
+        else:
+            run_python_group(group, results, skipped)
+
+    for group, reason in skipped.items():
+        print(f"[!] Skipped {group}: {reason}")
+
+    if args.output:
+        save_baseline(args.output, results, skipped)
+    if args.save_baseline:
+        save_baseline(args.baseline, results, skipped)
+        print(f"Baseline saved to {args.baseline}")
+    if args.compare:
+        regressions = compare(args.baseline, results, args.threshold)
+        if regressions:
+            print(f"\n[!] {len(regressions)} benchmarks more than {args.threshold:.0%} slower than the baseline")
+            sys.exit(1)
+        print(f"\nNo benchmark more than {args.threshold:.0%} slower than the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+In-process HTTP stand-ins, so the benchmarks run offline.
+
+FakeOpenAI answers the Responses API with a canned detector reply and
+StubGuardrail answers like guardrailv2. Both serve on a random loopback
+port from a background thread, with keep-alive like the real services.
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Queries containing this are blocked by StubGuardrail
+BLOCK_MARKER = "' OR '1'='1"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes; with Nagle on, every response
+    # would wait for the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def reply(self, status: int, data: dict) -> None:
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+class StubServer:
+    handler: type[StubHandler] = StubHandler
+
+    def __enter__(self) -> "StubServer":
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self.handler)
+        self.server.daemon_threads = True
+        self.server.stub = self
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class OpenAIHandler(StubHandler):
+    def do_POST(self) -> None:
+        request = json.loads(self.read_body() or b"{}")
+        if self.path != "/v1/responses":
+            self.reply(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+            return
+        self.reply(200, {
+            "id": "resp_bench",
+            "object": "response",
+            "created_at": 0,
+            "status": "completed",
+            "model": request.get("model", "gpt-4.1-nano"),
+            "output": [{
+                "type": "message",
+                "id": "msg_bench",
+                "status": "completed",
+                "role": "assistant",
+                "content": [{"type": "output_text", "text": self.server.stub.output, "annotations": []}],
+            }],
+            "parallel_tool_calls": True,
+            "tool_choice": "auto",
+            "tools": [],
+            "usage": {"input_tokens": 120, "output_tokens": 12, "total_tokens": 132},
+        })
+
+
+class FakeOpenAI(StubServer):
+    handler = OpenAIHandler
+
+    def __init__(self, output: str):
+        self.output = output
+
+
+class GuardrailHandler(StubHandler):
+    def do_POST(self) -> None:
+        query = self.read_body().decode("utf-8", errors="replace")
+        # Case-insensitive: clients send canonical forms with keywords folded
+        if BLOCK_MARKER.lower() in query.lower():
+            self.reply(403, {
+                "blocked": True,
+                "threat_type": "SQL Injection Detected (ML)",
+                "payload": query[:500],
+                "confidence": 0.99,
+            })
+            return
+        self.reply(200, {"allowed": True})
+
+
+class StubGuardrail(StubServer):
+    handler = GuardrailHandler
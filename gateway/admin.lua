@@ -0,0 +1,105 @@
+-- Admin - Internal gateway endpoints under /_guardrail/
+--   GET  /_guardrail/cache/stats     verdict cache counters
+--   POST /_guardrail/cache/purge     drop all cached verdicts
+--   POST /_guardrail/policy/reload   reload route_policy.json on all workers
+--   GET  /_guardrail/shadow/stats    shadow inspection counters (this worker's queue)
+--   GET  /_guardrail/blocklist/stats blocklist and detector throttle counters
+--   GET  /_guardrail/response/stats  response scan count and time
+--   GET  /_guardrail/decisions/stats decision log buffer (this worker) and drops
+--   GET  /_guardrail/metrics         all of the above and more, as Prometheus text
+--
+-- Every request needs ADMIN_TOKEN in the X-Admin-Token header, like the
+-- services' /profile endpoints; without ADMIN_TOKEN the endpoints don't
+-- exist. The network allow list alone isn't enough: traffic through the
+-- published port arrives from the Docker bridge, which it allows.
+
+local cjson = require "cjson.safe"
+
+local blocklist = require "blocklist"
+local decision_log = require "decision_log"
+local metrics = require "metrics"
+local response_policy = require "response_policy"
+local route_policy = require "route_policy"
+local shadow = require "shadow"
+local verdict_cache = require "verdict_cache"
+
+local ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+if ADMIN_TOKEN == "" then
+    ADMIN_TOKEN = nil
+end
+
+local function cache_stats()
+    return ngx.HTTP_OK, verdict_cache.stats()
+end
+
+local function cache_purge()
+    verdict_cache.purge()
+    return ngx.HTTP_OK, { purged = true }
+end
+
+local function policy_reload()
+    local version, err = route_policy.load()
+    if not version then
+        return ngx.HTTP_BAD_REQUEST, { error = err }
+    end
+    return ngx.HTTP_OK, { version = version }
+end
+
+local function shadow_stats()
+    return ngx.HTTP_OK, shadow.stats()
+end
+
+local function blocklist_stats()
+    return ngx.HTTP_OK, blocklist.stats()
+end
+
+local function response_stats()
+    return ngx.HTTP_OK, response_policy.stats()
+end
+
+local function decisions_stats()
+    return ngx.HTTP_OK, decision_log.stats()
+end
+
+local function prometheus_metrics()
+    return ngx.HTTP_OK, metrics.render(), "text/plain; version=0.0.4; charset=utf-8"
+end
+
+local ROUTES = {
+    ["/_guardrail/cache/stats"] = { method = "GET", handler = cache_stats },
+    ["/_guardrail/cache/purge"] = { method = "POST", handler = cache_purge },
+    ["/_guardrail/policy/reload"] = { method = "POST", handler = policy_reload },
+    ["/_guardrail/shadow/stats"] = { method = "GET", handler = shadow_stats },
+    ["/_guardrail/blocklist/stats"] = { method = "GET", handler = blocklist_stats },
+    ["/_guardrail/response/stats"] = { method = "GET", handler = response_stats },
+    ["/_guardrail/decisions/stats"] = { method = "GET", handler = decisions_stats },
+    ["/_guardrail/metrics"] = { method = "GET", handler = prometheus_metrics },
+}
+
+if not ADMIN_TOKEN then
+    return ngx.exit(ngx.HTTP_NOT_FOUND)
+end
+-- Digests compared, so the comparison time doesn't depend on the token
+local token = ngx.var.http_x_admin_token or ""
+if ngx.md5(token) ~= ngx.md5(ADMIN_TOKEN) then
+    return ngx.exit(ngx.HTTP_FORBIDDEN)
+end
+
+local route = ROUTES[ngx.var.uri]
+if not route then
+    return ngx.exit(ngx.HTTP_NOT_FOUND)
+end
+if ngx.req.get_method() ~= route.method then
+    return ngx.exit(ngx.HTTP_NOT_ALLOWED)
+end
+
+-- Handlers return a table to send as JSON, or a body and its content type
+local status, data, content_type = route.handler()
+ngx.status = status
+if content_type then
+    ngx.header["Content-Type"] = content_type
+    ngx.print(data)
+    return
+end
+ngx.header["Content-Type"] = "application/json"
+ngx.say(cjson.encode(data))
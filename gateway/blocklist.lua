@@ -0,0 +1,112 @@
+-- Blocklist - Client IPs answered locally with the 403 page
+--
+-- A client goes on the blocklist after route.block_after confirmed
+-- detections within route.block_window seconds. Entries live in the
+-- guardrail_blocklist shared dict and expire on their own, so a blocked
+-- client costs no detector call until its TTL runs out. New entries are
+-- published to Redis, and guardrail.lua reads the client's Redis key along
+-- with the component toggles, so every gateway node honours them.
+
+local redis = require "resty.redis"
+
+local BLOCKLIST = ngx.shared.guardrail_blocklist
+local STATS = ngx.shared.guardrail_stats
+
+local REDIS_PREFIX = "guardrail_blocklist:"
+
+local _M = {}
+
+_M.DEFAULT_TTL = 300
+
+-- Redis key holding the client's block expiry (unix seconds)
+function _M.redis_key(ip)
+    return REDIS_PREFIX .. ip
+end
+
+local function publish(premature, ip, ttl, expires)
+    if premature then
+        return
+    end
+
+    local red = redis:new()
+    red:set_timeout(100)
+
+    local ok, err = red:connect("cache", 6379)
+    if not ok then
+        ngx.log(ngx.WARN, "Blocklist publish failed: ", err)
+        return
+    end
+
+    ok, err = red:set(_M.redis_key(ip), expires, "EX", ttl)
+    if not ok then
+        ngx.log(ngx.WARN, "Blocklist publish failed: ", err)
+    end
+    red:set_keepalive(10000, 100)
+end
+
+local function block_locally(ip, ttl)
+    local ok, err = BLOCKLIST:set("blocked:" .. ip, true, ttl)
+    if not ok then
+        ngx.log(ngx.WARN, "Blocklist add failed: ", err)
+    end
+    return ok
+end
+
+function _M.add(ip, ttl)
+    ttl = ttl or _M.DEFAULT_TTL
+    if not block_locally(ip, ttl) then
+        return
+    end
+    STATS:incr("blocklist_adds", 1, 0)
+    ngx.log(ngx.WARN, "Client blocklisted for ", ttl, "s: ", ip)
+
+    local ok, err = ngx.timer.at(0, publish, ip, ttl, ngx.time() + ttl)
+    if not ok then
+        ngx.log(ngx.WARN, "Blocklist publish failed: ", err)
+    end
+end
+
+-- Adopt an entry another node published; expires is the Redis value
+function _M.remember(ip, expires)
+    local ttl = (tonumber(expires) or 0) - ngx.time()
+    if ttl > 0 then
+        block_locally(ip, ttl)
+    end
+end
+
+function _M.is_blocked(ip)
+    if BLOCKLIST:get("blocked:" .. ip) then
+        STATS:incr("blocklist_hits", 1, 0)
+        return true
+    end
+    return false
+end
+
+-- Count a confirmed detection against the client
+function _M.record_detection(ip, route)
+    if route.block_after <= 0 then
+        return
+    end
+
+    local key = "detections:" .. ip
+    local count, err = BLOCKLIST:incr(key, 1, 0, route.block_window)
+    if not count then
+        ngx.log(ngx.WARN, "Detection count failed: ", err)
+        return
+    end
+
+    if count >= route.block_after then
+        BLOCKLIST:delete(key)
+        _M.add(ip, route.block_ttl)
+    end
+end
+
+function _M.stats()
+    return {
+        adds = STATS:get("blocklist_adds") or 0,
+        hits = STATS:get("blocklist_hits") or 0,
+        throttled = STATS:get("throttle_rejected") or 0,
+    }
+end
+
+return _M
@@ -0,0 +1,127 @@
+-- Canonical - Detector input canonicalization, ASCII fast path
+--
+-- Mirrors canonicalize() in the services' canonical.py for input that
+-- stays ASCII, where NFKC changes nothing: bounded rounds of plus, percent
+-- and HTML entity decoding, inline comments and whitespace collapsed,
+-- SQL keywords lower-cased. As soon as a byte outside ASCII shows up it
+-- gives up and the detectors canonicalize the raw request themselves.
+-- Keep the two in step: the detectors trust the hash header.
+
+local byte = string.byte
+local char = string.char
+local find = string.find
+local gsub = string.gsub
+local lower = string.lower
+
+local _M = {}
+
+_M.HASH_HEADER = "X-Guardrail-Canonical-Hash"
+_M.MAX_DECODE_ROUNDS = 4
+
+local NON_ASCII = "[\128-\255]"
+
+local NAMED_ENTITIES = {
+    lt = "<",
+    gt = ">",
+    amp = "&",
+    quot = '"',
+    apos = "'",
+}
+
+local KEYWORDS = {}
+for _, word in ipairs({
+    "select", "union", "all", "from", "where", "and", "or", "not", "null",
+    "insert", "into", "values", "update", "set", "delete", "drop", "table",
+    "create", "alter", "exec", "execute", "declare", "cast", "convert",
+    "char", "concat", "having", "group", "order", "by", "limit", "offset",
+    "like", "between", "case", "when", "then", "else", "end", "true", "false",
+    "sleep", "benchmark", "waitfor", "delay", "information_schema",
+}) do
+    KEYWORDS[word] = true
+end
+
+local function percent(hex)
+    return char(tonumber(hex, 16))
+end
+
+-- Numeric references beyond ASCII decode to a stand-in non-ASCII byte, so
+-- the round's ASCII check gives up on them
+local function entity(name)
+    if byte(name, 1) ~= 35 then -- "#"
+        return NAMED_ENTITIES[name]
+    end
+    -- tonumber alone would also take "0x" prefixes
+    local code
+    local second = byte(name, 2)
+    if second == 120 or second == 88 then -- "x", "X"
+        local digits = name:sub(3)
+        code = find(digits, "^%x+$") and tonumber(digits, 16)
+    else
+        local digits = name:sub(2)
+        code = find(digits, "^%d+$") and tonumber(digits, 10)
+    end
+    if not code then
+        return nil
+    end
+    if code > 127 then
+        return "\128"
+    end
+    return char(code)
+end
+
+local function comment(inner)
+    -- MySQL runs the content of /*!50000 ... */
+    local versioned = inner:match("^![0-9]*(.*)$")
+    if versioned then
+        return " " .. versioned .. " "
+    end
+    return " "
+end
+
+local function keyword(word)
+    local folded = lower(word)
+    if KEYWORDS[folded] then
+        return folded
+    end
+end
+
+-- Canonical form of one ASCII string, or nil when it isn't ASCII
+function _M.canonicalize(text)
+    if find(text, NON_ASCII) then
+        return nil
+    end
+
+    for _ = 1, _M.MAX_DECODE_ROUNDS do
+        local decoded = gsub(gsub(text, "%+", " "), "%%(%x%x)", percent)
+        decoded = gsub(decoded, "&(#?%w+);", entity)
+        if find(decoded, NON_ASCII) then
+            return nil
+        end
+        if decoded == text then
+            break
+        end
+        text = decoded
+    end
+
+    text = gsub(text, "/%*(.-)%*/", comment)
+    text = gsub(text, "[%z\1-\32\127]+", " ")
+    text = text:match("^ ?(.-) ?$")
+    return (gsub(text, "[%a_]+", keyword))
+end
+
+-- Canonical URL and body on two lines plus its hash, like
+-- canonical_request() in canonical.py; nil unless both are ASCII
+function _M.request(uri, body)
+    local canonical_uri = _M.canonicalize(uri)
+    if not canonical_uri then
+        return nil
+    end
+    local canonical_body = _M.canonicalize(body or "")
+    if not canonical_body then
+        return nil
+    end
+    local text = canonical_uri .. "\n" .. canonical_body
+    return text, ngx.md5(text)
+end
+
+return _M
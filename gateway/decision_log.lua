@@ -0,0 +1,103 @@
+-- Decision Log - Gateway verdicts batched into the guardrail:decisions stream
+--
+-- Requests only append a record to this worker's buffer; a timer started in
+-- init_worker sends it to Redis every FLUSH_INTERVAL seconds in one pipeline.
+-- When the buffer is full, or Redis is down, records are dropped and counted
+-- rather than slowing requests down. The detectors log to the same stream,
+-- under the verdict cache key the gateway sends them as the request hash.
+
+local redis = require "resty.redis"
+
+local metrics = require "metrics"
+
+local STATS = ngx.shared.guardrail_stats
+
+local STREAM = "guardrail:decisions"
+local STREAM_MAXLEN = 1000000
+local CAPACITY = 10000
+local BATCH_SIZE = 500
+local FLUSH_INTERVAL = 1
+
+local _M = {}
+
+_M.REQUEST_HASH_HEADER = "X-Guardrail-Request-Hash"
+
+local buffer = {}
+
+local function dropped(count)
+    STATS:incr("decision_log_dropped", count, 0)
+end
+
+-- verdict is allow, block or error; latency in seconds
+function _M.record(hash, verdict, stage, latency, cache_hit)
+    if #buffer >= CAPACITY then
+        dropped(1)
+        return
+    end
+    buffer[#buffer + 1] = { ngx.now(), hash, verdict, stage, latency, cache_hit }
+end
+
+local function send(red, batch, first, last)
+    red:init_pipeline(last - first + 1)
+    for i = first, last do
+        local entry = batch[i]
+        red:xadd(STREAM, "MAXLEN", "~", STREAM_MAXLEN, "*",
+            "ts", string.format("%.3f", entry[1]),
+            "source", "gateway",
+            "hash", entry[2],
+            "verdict", entry[3],
+            "stage", entry[4],
+            "latency_ms", string.format("%.2f", entry[5] * 1000),
+            "confidence", "",
+            "cache_hit", entry[6] and "1" or "0")
+    end
+    return red:commit_pipeline()
+end
+
+local function flush()
+    metrics.set("gateway_decision_log_queue_depth", metrics.worker_label(), #buffer)
+    if #buffer == 0 then
+        return
+    end
+    -- Swapped out first, so requests keep appending while this yields
+    local batch = buffer
+    buffer = {}
+
+    local red = redis:new()
+    red:set_timeout(1000)
+
+    local ok, err = red:connect("cache", 6379)
+    if not ok then
+        ngx.log(ngx.WARN, "Decision log flush failed: ", err)
+        dropped(#batch)
+        return
+    end
+
+    for first = 1, #batch, BATCH_SIZE do
+        local last = math.min(first + BATCH_SIZE - 1, #batch)
+        ok, err = send(red, batch, first, last)
+        if not ok then
+            ngx.log(ngx.WARN, "Decision log flush failed: ", err)
+            dropped(#batch - first + 1)
+            return
+        end
+    end
+    red:set_keepalive(10000, 100)
+end
+
+-- Called from init_worker; the last run on shutdown flushes what is left
+function _M.start()
+    local ok, err = ngx.timer.every(FLUSH_INTERVAL, flush)
+    if not ok then
+        ngx.log(ngx.ERR, "Decision log timer failed: ", err)
+    end
+end
+
+function _M.stats()
+    return {
+        buffered = #buffer,
+        dropped = STATS:get("decision_log_dropped") or 0,
+    }
+end
+
+return _M
@@ -0,0 +1,188 @@
+-- Detectors - Fan-out to the LLM and ML guardrails
+--
+-- Enabled detectors are queried concurrently in light threads and their
+-- answers combined by policy:
+--   any       block if any detector blocks (first block wins)
+--   both      block only if every detector blocks (first allow wins)
+--   ml_first  ask the ML model, and the LLM only when the ML score is unsure;
+--             if the LLM then fails, the ML verdict stands
+-- As soon as the outcome is certain the slower request is killed.
+
+local http = require "resty.http"
+
+local server_timing = require "server_timing"
+
+local spawn = ngx.thread.spawn
+local wait = ngx.thread.wait
+local kill = ngx.thread.kill
+local unpack = unpack
+
+local _M = {}
+
+_M.DETECTORS = {
+    llm = {
+        url = "http://guardrail:5000/",
+        status_key = "guardrail_status",
+        timeout = 10000,
+    },
+    ml = {
+        url = "http://guardrailv2:5001/",
+        status_key = "guardrailv2_status",
+        timeout = 5000,
+    },
+}
+
+-- Query order, also used to build cache scopes
+_M.ORDER = { "llm", "ml" }
+
+_M.DEFAULT_POLICY = "any"
+
+local CACHE_TTL_HEADER = "X-Guardrail-Cache-TTL"
+-- Log-odds distance of the ML score from guardrailv2's calibrated threshold
+local MARGIN_HEADER = "X-Guardrail-Margin"
+
+-- ml_first trusts the ML model this far from its threshold in log-odds;
+-- at a 0.5 threshold that is outside 0.1-0.9
+local ML_SURE_MARGIN = 2.2
+
+local function query(name, req)
+    local detector = _M.DETECTORS[name]
+    local httpc = http.new()
+    httpc:set_timeout(detector.timeout)
+
+    -- Spooled bodies come as an iterator factory, streamed chunked
+    local body = req.body
+    if type(body) == "function" then
+        body = body()
+    end
+
+    local started = server_timing.clock()
+    local res, err = httpc:request_uri(detector.url, {
+        method = "POST",
+        body = body,
+        headers = req.headers,
+        keepalive_timeout = 60000,
+        keepalive_pool = 10,
+    })
+    -- Round trip as seen by the gateway, next to the detector's own stages
+    server_timing.since("gw_" .. name, started)
+
+    if not res then
+        ngx.log(ngx.ERR, "Guardrail error (", name, "): ", err)
+        return { name = name, blocked = false, failed = true }
+    end
+
+    server_timing.forward(res.headers["Server-Timing"])
+
+    local answered = res.status == ngx.HTTP_OK or res.status == ngx.HTTP_FORBIDDEN
+    return {
+        name = name,
+        blocked = res.status == ngx.HTTP_FORBIDDEN,
+        failed = not answered,
+        body = res.body,
+        -- Errors are never cached
+        ttl = answered and tonumber(res.headers[CACHE_TTL_HEADER]) or nil,
+        margin = tonumber(res.headers[MARGIN_HEADER]),
+    }
+end
+
+-- Shortest TTL of all results, nil if any of them is uncacheable
+local function min_ttl(results)
+    local ttl
+    for _, result in ipairs(results) do
+        if not result.ttl or result.ttl <= 0 then
+            return nil
+        end
+        ttl = ttl and math.min(ttl, result.ttl) or result.ttl
+    end
+    return ttl
+end
+
+-- An allow is marked failed when a detector it relied on didn't answer
+local function decision(blocked, body, results)
+    local failed = false
+    if not blocked then
+        for _, result in ipairs(results) do
+            failed = failed or result.failed
+        end
+    end
+    return { blocked = blocked, failed = failed, body = body, ttl = min_ttl(results) }
+end
+
+-- Run all detectors at once; stop at the first result whose blocked flag
+-- equals `decisive`
+local function race(names, req, decisive)
+    local threads = {}
+    for i, name in ipairs(names) do
+        threads[i] = spawn(query, name, req)
+    end
+
+    local results = {}
+    local first_block
+    while #threads > 0 do
+        local ok, result = wait(unpack(threads))
+        if not ok then
+            ngx.log(ngx.ERR, "Guardrail thread failed: ", result)
+            for _, thread in ipairs(threads) do
+                kill(thread)
+            end
+            return { blocked = false, failed = true }
+        end
+
+        for i, name in ipairs(names) do
+            if name == result.name then
+                table.remove(threads, i)
+                table.remove(names, i)
+                break
+            end
+        end
+        results[#results + 1] = result
+        first_block = first_block or (result.blocked and result)
+
+        if result.blocked == decisive then
+            for _, thread in ipairs(threads) do
+                kill(thread)
+            end
+            return decision(result.blocked, result.body, { result })
+        end
+    end
+
+    -- Nothing decisive: every detector agreed on the other outcome
+    return decision(first_block ~= nil, first_block and first_block.body, results)
+end
+
+local function ml_first(req)
+    local ml = query("ml", req)
+    if ml.margin and math.abs(ml.margin) >= ML_SURE_MARGIN then
+        return decision(ml.blocked, ml.body, { ml })
+    end
+
+    local llm = query("llm", req)
+    if llm.failed then
+        -- An unsure ML block still beats no answer at all
+        return decision(ml.blocked, ml.body, { ml, llm })
+    end
+    return decision(llm.blocked, llm.body, { ml, llm })
+end
+
+-- Combine the verdicts of the enabled detectors for one request.
+-- req has body (string, or a function returning a chunk iterator) and
+-- headers for the detector call. Returns
+-- { blocked = bool, failed = bool, body = guardrail JSON or nil,
+--   ttl = seconds or nil }
+function _M.check(names, policy, req)
+    if #names == 1 then
+        local result = query(names[1], req)
+        return decision(result.blocked, result.body, { result })
+    end
+
+    if policy == "ml_first" then
+        return ml_first(req)
+    end
+
+    -- race() consumes its list
+    local pending = { unpack(names) }
+    return race(pending, req, policy ~= "both")
+end
+
+return _M
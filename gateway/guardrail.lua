@@ -1,28 +1,62 @@
-local http = require "resty.http"
 local cjson = require "cjson.safe"
 local redis = require "resty.redis"
 
-local GUARDRAIL_URL = "http://guardrail:5000/"
-local TIMEOUT_MS = 10000
+local blocklist = require "blocklist"
+local canonical = require "canonical"
+local decision_log = require "decision_log"
+local detectors = require "detectors"
+local metrics = require "metrics"
+local request_body = require "request_body"
+local route_policy = require "route_policy"
+local server_timing = require "server_timing"
+local shadow = require "shadow"
+local throttle = require "throttle"
+local verdict_cache = require "verdict_cache"
+
 local SQL_ERROR_FILTER_KEY = "sql_error_filter_status"
 
--- Check SQL error filter status from Redis
-local function check_sql_filter_status()
+-- Block reason for fail-closed routes when a detector didn't answer
+local UNAVAILABLE_BODY = '{"threat_type":"Inspection Unavailable"}'
+local BLOCKLISTED_BODY = '{"threat_type":"Blocked Client","payload":"Repeated attack attempts"}'
+
+-- Read component toggles and the client's blocklist entry from Redis in
+-- one round trip. Missing keys or Redis errors count as enabled
+local function load_security_status(client)
+    local status = {
+        detectors = {},
+        sql_filter_disabled = false,
+    }
+
+    local keys = { SQL_ERROR_FILTER_KEY }
+    for i, name in ipairs(detectors.ORDER) do
+        keys[i + 1] = detectors.DETECTORS[name].status_key
+    end
+    local blocklist_index = #keys + 1
+    keys[blocklist_index] = blocklist.redis_key(client)
+
+    local res
     local red = redis:new()
     red:set_timeout(100)
 
     local ok, err = red:connect("cache", 6379)
-    if not ok then
-        return false  -- Default to enabled
+    if ok then
+        res, err = red:mget(unpack(keys))
+        red:set_keepalive(10000, 100)
+    end
+    if type(res) ~= "table" then
+        res = {}
     end
 
-    local res, err = red:get(SQL_ERROR_FILTER_KEY)
-    red:set_keepalive(10000, 100)
-
-    if res and res ~= ngx.null and res == "0" then
-        return true  -- Disabled
+    status.sql_filter_disabled = res[1] == "0"
+    for i, name in ipairs(detectors.ORDER) do
+        if res[i + 1] ~= "0" then
+            status.detectors[#status.detectors + 1] = name
+        end
     end
-    return false  -- Enabled
+    if res[blocklist_index] and res[blocklist_index] ~= ngx.null then
+        status.blocked_until = res[blocklist_index]
+    end
+    return status
 end
 
 local HTML_ESCAPE_MAP = {
@@ -98,54 +132,192 @@ local function render_403(threat_type, payload, url, method)
 </html>]]
 end
 
+local function block(guardrail_body, uri, method)
+    local data = cjson.decode(guardrail_body) or {}
+    ngx.status = ngx.HTTP_FORBIDDEN
+    ngx.header["Content-Type"] = "text/html; charset=utf-8"
+    ngx.say(render_403(
+        data.threat_type or "SQL Injection Attempt",
+        data.payload or "Not identified",
+        data.target_url or uri,
+        data.method or method
+    ))
+    return ngx.exit(ngx.HTTP_OK)
+end
+
+-- Detectors enabled both in Redis and for the route
+local function route_detectors(route, enabled)
+    local names = {}
+    for _, name in ipairs(enabled) do
+        for _, wanted in ipairs(route.detectors) do
+            if name == wanted then
+                names[#names + 1] = name
+                break
+            end
+        end
+    end
+    return names
+end
+
 -- Main logic
+local ctx = ngx.ctx
 local uri = ngx.var.request_uri
+local method = ngx.var.request_method
+local client = ngx.var.remote_addr
 
--- Check SQL error filter status and store in context for body_filter
-ngx.ctx.sql_filter_disabled = check_sql_filter_status()
+-- Released by request_metrics.lua in the log phase
+ctx.in_flight = true
+metrics.inc("gateway_in_flight_requests")
 
--- Skip static files early
-if uri:sub(1, 8) == "/static/" then
+local route = route_policy.lookup(method, ngx.var.uri)
+ctx.route = route
+ctx.has_user_input = route_policy.has_user_input()
+
+local function count_decision(verdict, stage)
+    metrics.inc("gateway_decisions_total", 'verdict="' .. verdict .. '",stage="' .. stage .. '"')
+end
+
+-- Known attackers are answered without asking any detector
+if blocklist.is_blocked(client) then
+    count_decision("block", "blocklist")
+    return block(BLOCKLISTED_BODY, uri, method)
+end
+
+-- Check component status and store SQL filter state in context for body_filter
+local started = server_timing.clock()
+local status = load_security_status(client)
+server_timing.since("gw_redis", started)
+ctx.sql_filter_disabled = status.sql_filter_disabled
+
+-- Blocklisted by another gateway node
+if status.blocked_until then
+    blocklist.remember(client, status.blocked_until)
+    count_decision("block", "blocklist")
+    return block(BLOCKLISTED_BODY, uri, method)
+end
+
+-- Nothing a detector could flag
+if route.skip_without_input and not ctx.has_user_input then
     return
 end
 
-ngx.req.read_body()
+-- Route opts out, or every detector would allow everything anyway
+local names = route_detectors(route, status.detectors)
+if #names == 0 then
+    return
+end
 
-local method = ngx.var.request_method
-local body = ngx.req.get_body_data()
-local content_type = ngx.req.get_headers()["content-type"]
+-- Bodies beyond the inspection window: reject before reading them when
+-- the client announced the length, forward uninspected, or inspect the prefix
+local content_length = tonumber(ngx.var.content_length)
+if content_length and content_length > route.max_inspect_bytes then
+    if route.oversize == "reject" then
+        return ngx.exit(ngx.HTTP_REQUEST_ENTITY_TOO_LARGE)
+    end
+    if route.oversize == "skip" then
+        return
+    end
+end
 
-local httpc = http.new()
-httpc:set_timeout(TIMEOUT_MS)
+started = server_timing.clock()
+local body = request_body.open(route.max_inspect_bytes)
+server_timing.since("gw_body", started)
+if body.truncated then
+    if route.oversize == "reject" then
+        return ngx.exit(ngx.HTTP_REQUEST_ENTITY_TOO_LARGE)
+    end
+    if route.oversize == "skip" then
+        return
+    end
+end
+
+local content_type = ngx.req.get_headers()["content-type"]
 
-local res, err = httpc:request_uri(GUARDRAIL_URL, {
-    method = "POST",
-    body = body,
+local req = {
+    body = body:source(),
     headers = {
         ["Content-Type"] = content_type,
         ["X-Original-URI"] = uri,
         ["X-Original-Method"] = method,
     },
-    keepalive_timeout = 60000,
-    keepalive_pool = 10,
-})
+}
+
+-- Canonicalize buffered ASCII requests once here; the detectors take the
+-- canonical text as it is. Anything else they canonicalize themselves
+local canonical_text, canonical_hash
+if not body.path then
+    started = server_timing.clock()
+    canonical_text, canonical_hash = canonical.request(uri, body.data)
+    server_timing.since("gw_canonical", started)
+end
+if canonical_text then
+    req.body = canonical_text
+    req.headers["Content-Type"] = "text/plain; charset=utf-8"
+    req.headers[canonical.HASH_HEADER] = canonical_hash
+end
+
+-- Forward now, inspect in the background
+if route.mode == "shadow" then
+    if not canonical_text then
+        req.body = body:read()
+    end
+    shadow.submit(names, route, req, {
+        uri = uri,
+        method = method,
+        client = client,
+    })
+    return
+end
 
-if not res then
-    ngx.log(ngx.ERR, "Guardrail error: ", err)
+local scope = route.policy .. ":" .. table.concat(names, ",")
+
+started = server_timing.clock()
+-- Spellings of the same request share a verdict when canonicalized
+local input_hash = canonical_hash or ngx.md5(uri .. "\n" .. body:digest())
+local cache_key = verdict_cache.key(scope, method, input_hash)
+ctx.request_hash = cache_key
+local cached = verdict_cache.get(cache_key)
+local lookup_time = server_timing.since("gw_cache", started)
+if cached == true then
+    count_decision("allow", "cache")
+    decision_log.record(cache_key, "allow", "cache", lookup_time, true)
     return
 end
+if cached then
+    count_decision("block", "cache")
+    decision_log.record(cache_key, "block", "cache", lookup_time, true)
+    blocklist.record_detection(client, route)
+    return block(cached, uri, method)
+end
+
+-- Out of detector budget: refuse, or let the request through uninspected
+if not throttle.take(client, route) then
+    if route.on_throttle == "allow" then
+        return
+    end
+    return ngx.exit(ngx.HTTP_TOO_MANY_REQUESTS)
+end
+
+-- Detectors log their decisions under the same hash
+req.headers[decision_log.REQUEST_HASH_HEADER] = cache_key
+
+started = server_timing.clock()
+local decision = detectors.check(names, route.policy, req)
+local detect_time = server_timing.since("gw_detect", started)
+
+local verdict = decision.blocked and "block" or (decision.failed and "error" or "allow")
+count_decision(verdict, "detect")
+decision_log.record(cache_key, verdict, "detect", detect_time, false)
+
+verdict_cache.store(cache_key, decision)
+
+if decision.failed and not route.fail_open then
+    return block(UNAVAILABLE_BODY, uri, method)
+end
 
-if res.status ~= 403 then
+if not decision.blocked then
     return
 end
 
-local data = cjson.decode(res.body) or {}
-ngx.status = ngx.HTTP_FORBIDDEN
-ngx.header["Content-Type"] = "text/html; charset=utf-8"
-ngx.say(render_403(
-    data.threat_type or "SQL Injection Attempt",
-    data.payload or "Not identified",
-    data.target_url or uri,
-    data.method or method
-))
-return ngx.exit(ngx.HTTP_OK)
+blocklist.record_detection(client, route)
+return block(decision.body or "{}", uri, method)
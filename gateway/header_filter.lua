@@ -0,0 +1,52 @@
+-- Header Filter - Selects responses for SQL error scanning
+-- Redis status check happens in access phase (set by guardrail.lua)
+
+local response_policy = require "response_policy"
+local server_timing = require "server_timing"
+
+local ctx = ngx.ctx
+
+-- Gateway stages first, then the application's own (its guardrail checks)
+local send_timing = server_timing.requested()
+if send_timing then
+    server_timing.forward(ngx.header["Server-Timing"])
+end
+
+-- Recorded either way, for the stage metrics
+-- A list like "0.012, 0.004" when nginx retried; the last one answered
+local upstream = (ngx.var.upstream_header_time or ""):match("([%d.]+)$")
+if upstream then
+    server_timing.add("gw_upstream", tonumber(upstream))
+end
+server_timing.since("gw_total", ngx.req.start_time())
+
+if send_timing then
+    ngx.header["Server-Timing"] = server_timing.header()
+else
+    ngx.header["Server-Timing"] = nil
+end
+
+if ctx.sql_filter_disabled then
+    return
+end
+
+-- Only process HTML responses
+local content_type = ngx.header["Content-Type"] or ""
+if not content_type:find("text/html", 1, true) then
+    return
+end
+
+if not response_policy.should_scan(ctx.route, ctx.has_user_input) then
+    return
+end
+
+local etag = ngx.header["ETag"]
+if response_policy.is_known_clean(etag) then
+    return
+end
+
+ctx.scan_response = true
+ctx.response_etag = ngx.status == ngx.HTTP_OK and etag or nil
+
+-- Body may be swapped for the error page, so the upstream length can't be kept
+ngx.header["Content-Length"] = nil
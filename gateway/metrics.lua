@@ -0,0 +1,142 @@
+-- Metrics - Prometheus counters, gauges and histograms for the gateway
+--
+-- Values live in the guardrail_metrics shared dict, so all workers update
+-- the same series with one atomic incr each. Series are keyed by name and
+-- label string; histograms keep a count per bucket (not cumulative) and a
+-- sum, which render() adds up. The older guardrail_stats counters are
+-- exported alongside as gateway_<name>_total. Served by admin.lua at
+-- /_guardrail/metrics.
+
+local METRICS = ngx.shared.guardrail_metrics
+local STATS = ngx.shared.guardrail_stats
+
+local concat = table.concat
+local format = string.format
+
+local BUCKETS = { 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10 }
+local SUM = #BUCKETS + 2
+
+local METRIC_TYPES = {
+    { "gateway_requests_total", "counter", "Requests answered, by status class" },
+    { "gateway_request_seconds", "histogram", "Time from reading the request to sending the response" },
+    { "gateway_in_flight_requests", "gauge", "Requests being handled" },
+    { "gateway_decisions_total", "counter", "Verdicts by stage: blocklist, cache, detect, response or response_truncated" },
+    { "gateway_stage_seconds", "histogram", "Time spent per Server-Timing stage" },
+    { "gateway_decision_log_queue_depth", "gauge", "Decisions waiting to be logged, per worker" },
+    { "gateway_shadow_pending", "gauge", "Shadow checks running, per worker" },
+}
+
+local _M = {}
+
+local function key(name, labels)
+    return name .. "\t" .. (labels or "")
+end
+
+local function warn_on_error(ok, err)
+    if not ok then
+        ngx.log(ngx.WARN, "Metric update failed: ", err)
+    end
+end
+
+-- labels is a preformatted string like 'verdict="block",stage="cache"'
+function _M.inc(name, labels, amount)
+    warn_on_error(METRICS:incr(key(name, labels), amount or 1, 0))
+end
+
+function _M.set(name, labels, value)
+    warn_on_error(METRICS:set(key(name, labels), value))
+end
+
+function _M.observe(name, labels, value)
+    local bucket = #BUCKETS + 1
+    for i = 1, #BUCKETS do
+        if value <= BUCKETS[i] then
+            bucket = i
+            break
+        end
+    end
+    local prefix = key(name, labels) .. "\t"
+    warn_on_error(METRICS:incr(prefix .. bucket, 1, 0))
+    warn_on_error(METRICS:incr(prefix .. SUM, value, 0))
+end
+
+-- Label string for this worker, for per-worker gauges
+function _M.worker_label()
+    return format('worker="%d"', ngx.worker.id() or 0)
+end
+
+local function series(name, labels, extra)
+    if labels == "" then
+        labels = extra
+    elseif extra then
+        labels = labels .. "," .. extra
+    end
+    if not labels or labels == "" then
+        return name
+    end
+    return name .. "{" .. labels .. "}"
+end
+
+local function render_histogram(lines, name, values)
+    for labels, slots in pairs(values) do
+        local cumulative = 0
+        for i = 1, #BUCKETS + 1 do
+            cumulative = cumulative + (slots[i] or 0)
+            local le = i <= #BUCKETS and BUCKETS[i] or "+Inf"
+            lines[#lines + 1] = series(name .. "_bucket", labels, 'le="' .. le .. '"') .. " " .. cumulative
+        end
+        lines[#lines + 1] = series(name .. "_sum", labels) .. " " .. (slots[SUM] or 0)
+        lines[#lines + 1] = series(name .. "_count", labels) .. " " .. cumulative
+    end
+end
+
+-- Prometheus text exposition of every series
+function _M.render()
+    local values = {}
+    for _, k in ipairs(METRICS:get_keys(0)) do
+        local value = METRICS:get(k)
+        if value then
+            local name, labels, slot = k:match("^([^\t]*)\t([^\t]*)\t?(.*)$")
+            if name then
+                local metric = values[name] or {}
+                values[name] = metric
+                if slot == "" then
+                    metric[labels] = value
+                else
+                    metric[labels] = metric[labels] or {}
+                    metric[labels][tonumber(slot)] = value
+                end
+            end
+        end
+    end
+
+    local lines = {}
+    for _, metric in ipairs(METRIC_TYPES) do
+        local name, kind, help = metric[1], metric[2], metric[3]
+        lines[#lines + 1] = "# HELP " .. name .. " " .. help
+        lines[#lines + 1] = "# TYPE " .. name .. " " .. kind
+        if kind == "histogram" then
+            render_histogram(lines, name, values[name] or {})
+        else
+            for labels, value in pairs(values[name] or {}) do
+                lines[#lines + 1] = series(name, labels) .. " " .. value
+            end
+        end
+    end
+
+    local stats = STATS:get_keys(0)
+    table.sort(stats)
+    for _, name in ipairs(stats) do
+        local value = STATS:get(name)
+        if value then
+            local metric = "gateway_" .. name .. "_total"
+            lines[#lines + 1] = "# TYPE " .. metric .. " counter"
+            lines[#lines + 1] = metric .. " " .. value
+        end
+    end
+
+    lines[#lines + 1] = ""
+    return concat(lines, "\n")
+end
+
+return _M
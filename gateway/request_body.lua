@@ -0,0 +1,125 @@
+-- Request Body - Bounded view of the client body for the detectors
+--
+-- Only the first `limit` bytes of a body are ever inspected. Small bodies
+-- sit in nginx's buffer (client_body_buffer_size) and are sliced directly;
+-- larger ones are spooled to a temp file, which is read CHUNK_SIZE bytes at
+-- a time and streamed to each detector with chunked transfer encoding, so a
+-- request never holds more than one chunk per detector in Lua memory.
+
+local resty_md5 = require "resty.md5"
+local str = require "resty.string"
+
+local _M = {}
+
+_M.CHUNK_SIZE = 8192
+
+local Body = {}
+Body.__index = Body
+
+local function file_size(path)
+    local file = io.open(path, "rb")
+    if not file then
+        return 0
+    end
+    local size = file:seek("end")
+    file:close()
+    return size
+end
+
+-- Read the request body and describe its inspection window:
+--   size       bytes sent to the detectors
+--   total      full body length
+--   truncated  true when the body is longer than the window
+function _M.open(limit)
+    ngx.req.read_body()
+
+    local body = setmetatable({ limit = limit }, Body)
+
+    local data = ngx.req.get_body_data()
+    if data then
+        body.total = #data
+        body.data = data:sub(1, limit)
+    else
+        local path = ngx.req.get_body_file()
+        body.path = path
+        body.total = path and file_size(path) or 0
+    end
+
+    body.size = math.min(body.total, limit)
+    body.truncated = body.total > limit
+    return body
+end
+
+-- Iterator over the window in CHUNK_SIZE pieces; nil once exhausted
+function Body:chunks()
+    if self.data then
+        local sent = false
+        return function()
+            if sent then
+                return nil
+            end
+            sent = true
+            return self.data
+        end
+    end
+
+    local file = self.path and io.open(self.path, "rb")
+    local remaining = self.size
+    return function()
+        if not file then
+            return nil
+        end
+        if remaining <= 0 then
+            file:close()
+            file = nil
+            return nil
+        end
+        local chunk = file:read(math.min(_M.CHUNK_SIZE, remaining))
+        if not chunk then
+            file:close()
+            file = nil
+            return nil
+        end
+        remaining = remaining - #chunk
+        return chunk
+    end
+end
+
+-- Request body for the detector call: the buffered string, or a fresh
+-- chunk iterator per call for spooled bodies
+function Body:source()
+    if self.data or self.size == 0 then
+        return self.data
+    end
+    return function()
+        return self:chunks()
+    end
+end
+
+-- The whole window as one string, for work that outlives the request
+-- (the temp file is removed when it finishes)
+function Body:read()
+    if self.data or self.size == 0 then
+        return self.data
+    end
+    local parts = {}
+    for chunk in self:chunks() do
+        parts[#parts + 1] = chunk
+    end
+    return table.concat(parts)
+end
+
+-- Hex MD5 of the window, computed a chunk at a time
+function Body:digest()
+    if self.digest_hex then
+        return self.digest_hex
+    end
+    local md5 = resty_md5:new()
+    for chunk in self:chunks() do
+        md5:update(chunk)
+    end
+    self.digest_hex = str.to_hex(md5:final())
+    return self.digest_hex
+end
+
+return _M
@@ -0,0 +1,17 @@
+-- Request Metrics - Counted in the log phase, once the response is sent
+
+local metrics = require "metrics"
+
+local ctx = ngx.ctx
+
+-- Set by guardrail.lua when the request entered the access phase
+if ctx.in_flight then
+    metrics.inc("gateway_in_flight_requests", nil, -1)
+end
+
+metrics.inc("gateway_requests_total", 'status="' .. math.floor(ngx.status / 100) .. 'xx"')
+
+local request_time = tonumber(ngx.var.request_time)
+if request_time then
+    metrics.observe("gateway_request_seconds", nil, request_time)
+end
@@ -1,25 +1,9 @@
 -- Response Filter - Checks response for SQL error patterns
 -- Redis status check happens in access phase (set by access_filter.lua)
 
-local SQL_ERROR_PATTERNS = {
-    "programmingerror",
-    "psycopg2",
-    "syntax error at or near",
-    "relation .* does not exist",
-    "column .* does not exist",
-    "unterminated quoted string",
-    "invalid input syntax",
-    "operationalerror",
-    "databaseerror",
-    "dataerror",
-    "integrityerror",
-    "exception value:",
-    "exception type:",
-    "you have an error in your sql syntax",
-    "unknown column",
-    "no such table",
-    "no such column",
-}
+local response_policy = require "response_policy"
+local server_timing = require "server_timing"
+local sql_error_scanner = require "sql_error_scanner"
 
 local function render_error_page(pattern)
     return [[<!DOCTYPE html>
@@ -81,57 +65,54 @@ local function render_error_page(pattern)
 </html>]]
 end
 
-local function find_sql_error(content)
-    if not content or content == "" then
-        return nil
-    end
-    local lower = content:lower()
-    for _, pattern in ipairs(SQL_ERROR_PATTERNS) do
-        if lower:find(pattern, 1, true) or lower:match(pattern) then
-            return pattern
-        end
-    end
-    return nil
-end
-
 -- Main body filter logic
 local chunk = ngx.arg[1]
 local eof = ngx.arg[2]
 local ctx = ngx.ctx
 
--- Skip if filter is disabled (checked in access phase)
-if ctx.sql_filter_disabled then
+-- Only scan responses selected in the header filter
+if not ctx.scan_response then
     return
 end
 
--- Only process HTML responses
-local content_type = ngx.header["Content-Type"] or ""
-if not content_type:find("text/html") then
+-- Response was already cut short after a late detection
+if ctx.sql_error_blocked then
+    ngx.arg[1] = nil
     return
 end
 
--- Initialize buffer
-if not ctx.response_body then
-    ctx.response_body = ""
+local scanner = ctx.sql_error_scanner
+if not scanner then
+    scanner = sql_error_scanner.new(response_policy.hold_back(ctx.route))
+    ctx.sql_error_scanner = scanner
 end
 
--- Accumulate chunks
-if chunk then
-    ctx.response_body = ctx.response_body .. chunk
-end
+local started = server_timing.clock()
+local out, matched_pattern = scanner:feed(chunk, eof)
+local elapsed = server_timing.clock() - started
+ctx.response_scan_seconds = (ctx.response_scan_seconds or 0) + elapsed
+response_policy.record_scan(elapsed, eof or matched_pattern ~= nil)
 
--- On final chunk, check for SQL errors
-if eof then
-    local matched_pattern = find_sql_error(ctx.response_body)
-    if ctx.response_body ~= "" and matched_pattern then
-        -- Replace with error page showing the matched pattern
-        ngx.arg[1] = render_error_page(matched_pattern)
-        ngx.header["Content-Length"] = nil
-    else
-        -- Pass through original
-        ngx.arg[1] = ctx.response_body
+if not matched_pattern then
+    ngx.arg[1] = out
+    if eof then
+        response_policy.remember_clean(ctx.response_etag)
     end
+    return
+end
+
+ctx.sql_error_blocked = true
+ngx.arg[2] = true
+
+local truncated = scanner.released > 0
+response_policy.record_block(ctx.request_hash or "", truncated, ctx.response_scan_seconds)
+
+if not truncated then
+    -- Nothing sent yet, replace with error page showing the matched pattern
+    ngx.arg[1] = render_error_page(matched_pattern)
 else
-    -- Buffer chunks, don't output yet
+    -- Part of the page already went out with a 200, cut it off before the
+    -- error; routes that must never do this set response_hold_back = "all"
+    ngx.log(ngx.WARN, "SQL error after ", scanner.released, " bytes sent, truncating: ", matched_pattern)
     ngx.arg[1] = nil
 end
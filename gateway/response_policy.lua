@@ -0,0 +1,89 @@
+-- Response Policy - Which responses need SQL error scanning
+--
+-- Routes whose policy sets scan_response = false (or "with_input" for
+-- requests without user input) render without user-controlled SQL, so their
+-- bodies stream straight through without being held back. Clean verdicts
+-- are also remembered per strong ETag so identical pages are not rescanned.
+--
+-- A scanned page is held back up to the route's response_hold_back bytes
+-- ("all" holds the whole page). An SQL error found after that can only cut
+-- the page short, so those blocks are counted and logged on their own.
+
+local decision_log = require "decision_log"
+local metrics = require "metrics"
+
+local _M = {}
+
+local VERDICTS = ngx.shared.response_verdicts
+local STATS = ngx.shared.guardrail_stats
+local VERDICT_TTL = 300
+
+function _M.should_scan(route, has_input)
+    if not route then
+        return true
+    end
+    if route.scan_response == "with_input" then
+        return has_input
+    end
+    return route.scan_response
+end
+
+-- Bytes to hold back before streaming; nil leaves the scanner's default
+function _M.hold_back(route)
+    if route and route.response_hold_back == "all" then
+        return math.huge
+    end
+    return route and route.response_hold_back
+end
+
+-- Strong ETags only; weak ones don't promise identical bytes
+local function etag_key(etag)
+    if not etag or etag == "" or etag:sub(1, 2) == "W/" then
+        return nil
+    end
+    return "etag:" .. etag
+end
+
+function _M.is_known_clean(etag)
+    local key = etag_key(etag)
+    return key ~= nil and VERDICTS:get(key) == true
+end
+
+function _M.remember_clean(etag)
+    local key = etag_key(etag)
+    if key then
+        VERDICTS:set(key, true, VERDICT_TTL)
+    end
+end
+
+-- Scanning runs after the headers went out, so its time can't go in
+-- Server-Timing; it is totalled here instead
+function _M.record_scan(seconds, finished)
+    STATS:incr("response_scan_seconds", seconds, 0)
+    if finished then
+        STATS:incr("response_scans", 1, 0)
+    end
+end
+
+-- truncated when part of the page had already gone out; hash is the
+-- request's verdict cache key, "" when it skipped the detectors
+function _M.record_block(hash, truncated, seconds)
+    local stage = truncated and "response_truncated" or "response"
+    STATS:incr(truncated and "response_truncations" or "response_blocks", 1, 0)
+    metrics.inc("gateway_decisions_total", 'verdict="block",stage="' .. stage .. '"')
+    decision_log.record(hash, "block", stage, seconds, false)
+end
+
+function _M.stats()
+    local scans = STATS:get("response_scans") or 0
+    local seconds = STATS:get("response_scan_seconds") or 0
+    return {
+        scans = scans,
+        blocks = STATS:get("response_blocks") or 0,
+        truncations = STATS:get("response_truncations") or 0,
+        scan_seconds = seconds,
+        mean_scan_ms = scans > 0 and seconds * 1000 / scans or 0,
+    }
+end
+
+return _M
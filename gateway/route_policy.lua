@@ -0,0 +1,302 @@
+-- Route Policy - Per-route inspection settings
+--
+-- route_policy.json is validated and compiled into a segment trie when
+-- nginx starts. The policy source lives in the route_policy shared dict
+-- with a version number; each worker recompiles its trie only when the
+-- version changes, so POST /_guardrail/policy/reload takes effect on all
+-- workers without a restart.
+--
+-- Path patterns:
+--   /login/        exact path (leading and trailing slashes are ignored)
+--   /book/*/       "*" matches one segment
+--   /static/**     "**" matches the path and everything below it
+
+local cjson = require "cjson.safe"
+
+local detectors = require "detectors"
+
+local SHM = ngx.shared.route_policy
+
+local _M = {}
+
+_M.PATH = "/usr/local/openresty/nginx/route_policy.json"
+
+local POLICIES = { any = true, both = true, ml_first = true }
+local MODES = { inline = true, shadow = true }
+local ON_THROTTLE = { reject = true, allow = true }
+local OVERSIZE = { inspect_prefix = true, reject = true, skip = true }
+local SCAN_RESPONSE = { [true] = true, [false] = true, with_input = true }
+
+local BUILTIN_DEFAULTS = {
+    detectors = detectors.ORDER,
+    policy = detectors.DEFAULT_POLICY,
+    max_inspect_bytes = 16384,
+    oversize = "inspect_prefix",
+    fail_open = true,
+    scan_response = true,
+    response_hold_back = 65536,
+    skip_without_input = true,
+    mode = "inline",
+    shadow_sample_rate = 1,
+    shadow_blocklist = false,
+    detector_rate = 0,
+    detector_burst = 1,
+    on_throttle = "reject",
+    block_after = 0,
+    block_window = 60,
+    block_ttl = 300,
+}
+
+local compiled
+local compiled_version
+
+local function split(path)
+    local segments = {}
+    for segment in path:gmatch("[^/]+") do
+        segments[#segments + 1] = segment
+    end
+    return segments
+end
+
+local function validate(rule, where)
+    for _, name in ipairs(rule.detectors) do
+        if not detectors.DETECTORS[name] then
+            return nil, where .. ": unknown detector " .. tostring(name)
+        end
+    end
+    if not POLICIES[rule.policy] then
+        return nil, where .. ": unknown policy " .. tostring(rule.policy)
+    end
+    if not SCAN_RESPONSE[rule.scan_response] then
+        return nil, where .. ": scan_response must be true, false or \"with_input\""
+    end
+    local hold_back = rule.response_hold_back
+    if hold_back ~= "all" and (type(hold_back) ~= "number" or hold_back < 0) then
+        return nil, where .. ": response_hold_back must be a non-negative number or \"all\""
+    end
+    if type(rule.max_inspect_bytes) ~= "number" or rule.max_inspect_bytes < 0 then
+        return nil, where .. ": max_inspect_bytes must be a non-negative number"
+    end
+    if not OVERSIZE[rule.oversize] then
+        return nil, where .. ": oversize must be \"inspect_prefix\", \"reject\" or \"skip\""
+    end
+    if not MODES[rule.mode] then
+        return nil, where .. ": mode must be \"inline\" or \"shadow\""
+    end
+    local rate = rule.shadow_sample_rate
+    if type(rate) ~= "number" or rate < 0 or rate > 1 then
+        return nil, where .. ": shadow_sample_rate must be between 0 and 1"
+    end
+    if not ON_THROTTLE[rule.on_throttle] then
+        return nil, where .. ": on_throttle must be \"reject\" or \"allow\""
+    end
+    for _, field in ipairs({ "detector_rate", "block_after", "block_window", "block_ttl" }) do
+        if type(rule[field]) ~= "number" or rule[field] < 0 then
+            return nil, where .. ": " .. field .. " must be a non-negative number"
+        end
+    end
+    if type(rule.detector_burst) ~= "number" or rule.detector_burst < 1 then
+        return nil, where .. ": detector_burst must be at least 1"
+    end
+    return true
+end
+
+local function build_rule(spec, defaults, where)
+    local rule = {}
+    for key, value in pairs(defaults) do
+        rule[key] = value
+    end
+    for key, value in pairs(spec) do
+        if key ~= "path" and key ~= "methods" then
+            rule[key] = value
+        end
+    end
+
+    if spec.methods then
+        rule.methods = {}
+        for _, method in ipairs(spec.methods) do
+            rule.methods[method:upper()] = true
+        end
+    end
+
+    local ok, err = validate(rule, where)
+    if not ok then
+        return nil, err
+    end
+    return rule
+end
+
+local function new_node()
+    return { children = {}, exact = {}, prefix = {} }
+end
+
+local function insert(root, pattern, rule)
+    local node = root
+    local segments = split(pattern)
+    local last = #segments
+
+    if segments[last] == "**" then
+        last = last - 1
+    end
+
+    for i = 1, last do
+        local segment = segments[i]
+        if segment == "**" then
+            return nil, pattern .. ": \"**\" is only allowed at the end"
+        end
+        local children = node.children
+        if segment == "*" then
+            node.wildcard = node.wildcard or new_node()
+            node = node.wildcard
+        else
+            children[segment] = children[segment] or new_node()
+            node = children[segment]
+        end
+    end
+
+    local list = last < #segments and node.prefix or node.exact
+    list[#list + 1] = rule
+    return true
+end
+
+-- Compile policy JSON into { defaults = rule, trie = node }
+function _M.compile(source)
+    local spec, err = cjson.decode(source)
+    if type(spec) ~= "table" then
+        return nil, "invalid JSON: " .. tostring(err)
+    end
+
+    local base = {}
+    for key, value in pairs(BUILTIN_DEFAULTS) do
+        base[key] = value
+    end
+    local defaults, err = build_rule(spec.defaults or {}, base, "defaults")
+    if not defaults then
+        return nil, err
+    end
+
+    local trie = new_node()
+    for i, route in ipairs(spec.routes or {}) do
+        if type(route.path) ~= "string" then
+            return nil, "routes[" .. i .. "]: path is required"
+        end
+        local rule, err = build_rule(route, defaults, route.path)
+        if not rule then
+            return nil, err
+        end
+        rule.path = route.path
+        local ok, err = insert(trie, route.path, rule)
+        if not ok then
+            return nil, err
+        end
+    end
+
+    return { defaults = defaults, trie = trie }
+end
+
+local function pick(rules, method)
+    for _, rule in ipairs(rules) do
+        if not rule.methods or rule.methods[method] then
+            return rule
+        end
+    end
+    return nil
+end
+
+-- Most specific rule wins: exact, then one-segment wildcards, then the
+-- deepest "**" prefix
+local function match(node, segments, i, method)
+    if i > #segments then
+        local rule = pick(node.exact, method)
+        if rule then
+            return rule
+        end
+        return pick(node.prefix, method)
+    end
+
+    local child = node.children[segments[i]]
+    if child then
+        local rule = match(child, segments, i + 1, method)
+        if rule then
+            return rule
+        end
+    end
+
+    if node.wildcard then
+        local rule = match(node.wildcard, segments, i + 1, method)
+        if rule then
+            return rule
+        end
+    end
+
+    return pick(node.prefix, method)
+end
+
+-- Read, compile and publish the policy file to all workers
+function _M.load(path)
+    path = path or _M.PATH
+    local file, err = io.open(path, "r")
+    if not file then
+        return nil, err
+    end
+    local source = file:read("*a")
+    file:close()
+
+    local policy, err = _M.compile(source)
+    if not policy then
+        return nil, err
+    end
+
+    local version = (SHM:get("version") or 0) + 1
+    SHM:set("source", source)
+    SHM:set("version", version)
+
+    compiled = policy
+    compiled_version = version
+    return version
+end
+
+-- Called from init_by_lua; a broken file leaves the built-in defaults
+function _M.init(path)
+    local version, err = _M.load(path)
+    if not version then
+        ngx.log(ngx.ERR, "Route policy not loaded, using defaults: ", err)
+    end
+end
+
+local function current()
+    local version = SHM:get("version")
+    if version and version ~= compiled_version then
+        local policy, err = _M.compile(SHM:get("source"))
+        if policy then
+            compiled = policy
+        else
+            ngx.log(ngx.ERR, "Route policy compile failed: ", err)
+        end
+        compiled_version = version
+    end
+    return compiled
+end
+
+function _M.lookup(method, uri)
+    local policy = current()
+    if not policy then
+        return BUILTIN_DEFAULTS
+    end
+    return match(policy.trie, split(uri), 1, method) or policy.defaults
+end
+
+-- True if the request carries anything a detector could inspect: query
+-- arguments, a body, or path characters beyond plain segment names
+function _M.has_user_input()
+    local args = ngx.var.args
+    if args and args ~= "" then
+        return true
+    end
+    if (tonumber(ngx.var.content_length) or 0) > 0 or ngx.var.http_transfer_encoding then
+        return true
+    end
+    return ngx.re.find(ngx.var.request_uri, "[^A-Za-z0-9/_.~?-]", "jo") ~= nil
+end
+
+return _M
@@ -0,0 +1,81 @@
+-- Server Timing - Per-request stage durations for the Server-Timing header
+--
+-- The access phase and detector calls add entries to ngx.ctx; detectors'
+-- own Server-Timing headers are forwarded as they are. The header filter
+-- merges everything with the upstream's header into the final response.
+-- Every stage is also observed in the gateway_stage_seconds histogram.
+
+local metrics = require "metrics"
+
+local _M = {}
+
+local concat = table.concat
+
+-- Clients sending this token in X-Guardrail-Debug get the header even when
+-- $guardrail_server_timing is 0; unset, nobody does
+local DEBUG_TOKEN = os.getenv("GUARDRAIL_DEBUG_TOKEN")
+if DEBUG_TOKEN == "" then
+    DEBUG_TOKEN = nil
+end
+
+-- Fresh clock; ngx.now() alone is cached for the whole event loop iteration
+function _M.clock()
+    ngx.update_time()
+    return ngx.now()
+end
+
+local function entries()
+    local ctx = ngx.ctx
+    local list = ctx.server_timing
+    if not list then
+        list = {}
+        ctx.server_timing = list
+    end
+    return list
+end
+
+-- Record a stage that took `seconds`
+function _M.add(name, seconds)
+    metrics.observe("gateway_stage_seconds", 'stage="' .. name .. '"', seconds)
+    local list = entries()
+    list[#list + 1] = string.format("%s;dur=%.2f", name, seconds * 1000)
+end
+
+-- Record a stage that started at `started` (from clock()) and ends now;
+-- returns its duration in seconds
+function _M.since(name, started)
+    local seconds = _M.clock() - started
+    _M.add(name, seconds)
+    return seconds
+end
+
+-- Append another component's Server-Timing value
+function _M.forward(value)
+    if type(value) == "table" then
+        value = concat(value, ", ")
+    end
+    if value and value ~= "" then
+        local list = entries()
+        list[#list + 1] = value
+    end
+end
+
+-- Whether this response may carry the stage timings; they tell a client
+-- which detectors saw its request and whether it was a cache hit
+function _M.requested()
+    if ngx.var.guardrail_server_timing == "1" then
+        return true
+    end
+    return DEBUG_TOKEN ~= nil and ngx.var.http_x_guardrail_debug == DEBUG_TOKEN
+end
+
+-- The combined header value, or nil if nothing was recorded
+function _M.header()
+    local list = ngx.ctx.server_timing
+    if not list or #list == 0 then
+        return nil
+    end
+    return concat(list, ", ")
+end
+
+return _M
@@ -0,0 +1,95 @@
+-- Shadow - Non-blocking inspection for latency-critical routes
+--
+-- The request goes upstream right away while a sampled copy is checked in
+-- an ngx.timer. Shadow verdicts are only logged and counted, and can feed
+-- the blocklist. Each worker runs at most MAX_PENDING shadow checks; the
+-- rest are dropped so shadow traffic can't overwhelm the detectors.
+
+local blocklist = require "blocklist"
+local detectors = require "detectors"
+local metrics = require "metrics"
+
+local STATS = ngx.shared.guardrail_stats
+
+local MAX_PENDING = 32
+
+local _M = {}
+
+local pending = 0
+
+local function count(name)
+    STATS:incr("shadow_" .. name, 1, 0)
+end
+
+local function set_pending(value)
+    pending = value
+    metrics.set("gateway_shadow_pending", metrics.worker_label(), pending)
+end
+
+local function run(premature, names, route, req, meta)
+    if premature then
+        set_pending(pending - 1)
+        return
+    end
+
+    local ok, decision = pcall(detectors.check, names, route.policy, req)
+    set_pending(pending - 1)
+
+    if not ok then
+        ngx.log(ngx.ERR, "Shadow check failed: ", decision)
+        count("failed")
+        return
+    end
+
+    if decision.failed then
+        count("failed")
+        return
+    end
+
+    if not decision.blocked then
+        count("allowed")
+        return
+    end
+
+    count("blocked")
+    ngx.log(ngx.WARN, "Shadow verdict: block ", meta.method, " ", meta.uri,
+        " client=", meta.client, " detail=", decision.body)
+
+    if route.shadow_blocklist then
+        blocklist.record_detection(meta.client, route)
+    end
+end
+
+-- Queue a background check; returns immediately
+function _M.submit(names, route, req, meta)
+    if math.random() >= route.shadow_sample_rate then
+        count("sampled_out")
+        return
+    end
+
+    if pending >= MAX_PENDING then
+        count("dropped")
+        return
+    end
+
+    local ok, err = ngx.timer.at(0, run, names, route, req, meta)
+    if not ok then
+        ngx.log(ngx.WARN, "Shadow timer failed: ", err)
+        count("dropped")
+        return
+    end
+
+    set_pending(pending + 1)
+    count("queued")
+end
+
+function _M.stats()
+    local stats = {}
+    for _, name in ipairs({ "queued", "sampled_out", "dropped", "allowed", "blocked", "failed" }) do
+        stats[name] = STATS:get("shadow_" .. name) or 0
+    end
+    stats.pending = pending
+    return stats
+end
+
+return _M
@@ -0,0 +1,134 @@
+-- Streaming SQL error scanner for response bodies
+--
+-- Each chunk is scanned together with the tail of the previous one, so a
+-- match that straddles a chunk boundary is still found without keeping the
+-- whole body around. Clean bytes are released downstream once they can no
+-- longer be part of a match and the hold-back budget has been exceeded.
+
+local re_find = ngx.re.find
+local re_match = ngx.re.match
+local concat = table.concat
+
+local _M = {}
+
+local SQL_ERROR_PATTERNS = {
+    "programmingerror",
+    "psycopg2",
+    "syntax error at or near",
+    "relation .* does not exist",
+    "column .* does not exist",
+    "unterminated quoted string",
+    "invalid input syntax",
+    "operationalerror",
+    "databaseerror",
+    "dataerror",
+    "integrityerror",
+    "exception value:",
+    "exception type:",
+    "you have an error in your sql syntax",
+    "unknown column",
+    "no such table",
+    "no such column",
+}
+
+-- Longest gap ".*" may span; keeps every match shorter than the overlap window
+local MAX_GAP = 128
+local DEFAULT_OVERLAP = 256
+local DEFAULT_HOLD_BACK = 65536
+
+-- "i" caseless, "j" PCRE JIT, "o" compile once per worker
+local REGEX_OPTIONS = "ijo"
+
+local function compile(patterns)
+    local groups = {}
+    for i, pattern in ipairs(patterns) do
+        groups[i] = "(" .. pattern:gsub("%.%*", "[^\\n]{0," .. MAX_GAP .. "}") .. ")"
+    end
+    return concat(groups, "|")
+end
+
+local SQL_ERROR_REGEX = compile(SQL_ERROR_PATTERNS)
+
+_M.PATTERNS = SQL_ERROR_PATTERNS
+
+-- Return the original pattern for a match in text, or nil
+local function identify(text)
+    local m = re_match(text, SQL_ERROR_REGEX, REGEX_OPTIONS)
+    if not m then
+        return nil
+    end
+    for i, pattern in ipairs(SQL_ERROR_PATTERNS) do
+        if m[i] then
+            return pattern
+        end
+    end
+    return nil
+end
+
+function _M.find(content)
+    if not content or content == "" then
+        return nil
+    end
+    if not re_find(content, SQL_ERROR_REGEX, REGEX_OPTIONS) then
+        return nil
+    end
+    return identify(content)
+end
+
+local Scanner = {}
+Scanner.__index = Scanner
+
+function _M.new(hold_back, overlap)
+    return setmetatable({
+        hold_back = hold_back or DEFAULT_HOLD_BACK,
+        overlap = overlap or DEFAULT_OVERLAP,
+        tail = "",
+        held = {},
+        held_count = 0,
+        held_bytes = 0,
+        released = 0,
+    }, Scanner)
+end
+
+-- Release everything except the last `keep` held bytes
+function Scanner:release(keep)
+    if self.held_bytes <= keep then
+        return ""
+    end
+    local data = concat(self.held, "", 1, self.held_count)
+    local out = data:sub(1, #data - keep)
+    local rest = data:sub(#data - keep + 1)
+    self.held = { rest }
+    self.held_count = 1
+    self.held_bytes = #rest
+    self.released = self.released + #out
+    return out
+end
+
+-- Feed the next chunk; returns the bytes that are safe to emit now and the
+-- matched pattern if an SQL error was found
+function Scanner:feed(chunk, eof)
+    if chunk and chunk ~= "" then
+        local window = self.tail .. chunk
+        if re_find(window, SQL_ERROR_REGEX, REGEX_OPTIONS) then
+            return nil, identify(window)
+        end
+        self.tail = #window > self.overlap and window:sub(-self.overlap) or window
+
+        self.held_count = self.held_count + 1
+        self.held[self.held_count] = chunk
+        self.held_bytes = self.held_bytes + #chunk
+    end
+
+    if eof then
+        return self:release(0), nil
+    end
+
+    if self.released > 0 or self.held_bytes > self.hold_back then
+        return self:release(self.overlap), nil
+    end
+
+    return "", nil
+end
+
+return _M
@@ -0,0 +1,46 @@
+-- Throttle - Per-client token buckets for detector calls
+--
+-- Each client IP gets a bucket per route holding up to detector_burst
+-- tokens, refilled at detector_rate tokens per second. Buckets live in the
+-- guardrail_throttle shared dict so all workers draw from the same one;
+-- updates are not atomic across workers, which can let a few extra calls
+-- through under contention.
+
+local BUCKETS = ngx.shared.guardrail_throttle
+local STATS = ngx.shared.guardrail_stats
+
+local _M = {}
+
+-- Take one token for a detector call; false when the bucket is empty
+function _M.take(client, route)
+    local rate = route.detector_rate
+    if rate <= 0 then
+        return true
+    end
+
+    local burst = route.detector_burst
+    local key = client .. "|" .. (route.path or "*")
+    local now = ngx.now()
+
+    local tokens = burst
+    local state = BUCKETS:get(key)
+    if state then
+        local left, last = state:match("^(%S+) (%S+)$")
+        tokens = math.min(burst, tonumber(left) + (now - tonumber(last)) * rate)
+    end
+
+    local allowed = tokens >= 1
+    if allowed then
+        tokens = tokens - 1
+    end
+
+    -- An untouched bucket is full again after burst / rate seconds
+    BUCKETS:set(key, string.format("%.4f %.3f", tokens, now), math.ceil(burst / rate) + 1)
+
+    if not allowed then
+        STATS:incr("throttle_rejected", 1, 0)
+    end
+    return allowed
+end
+
+return _M
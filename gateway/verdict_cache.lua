@@ -0,0 +1,78 @@
+-- Verdict Cache - Guardrail verdicts shared by all nginx workers
+--
+-- Verdicts are keyed by method and a hash of the inspected input (its
+-- canonical form when the gateway computed one, else the raw URI and body)
+-- and kept in a lua_shared_dict, which evicts least recently used entries
+-- when full.
+-- Detectors decide what may be cached through X-Guardrail-Cache-TTL.
+
+local VERDICTS = ngx.shared.guardrail_verdicts
+local STATS = ngx.shared.guardrail_stats
+
+local ALLOW = "allow"
+
+local _M = {}
+
+local function count(name)
+    STATS:incr("verdict_cache_" .. name, 1, 0)
+end
+
+-- scope names the detectors and policy that produced the verdict,
+-- input_hash identifies what they inspected
+function _M.key(scope, method, input_hash)
+    return ngx.md5(scope .. "\n" .. method .. "\n" .. input_hash)
+end
+
+-- Returns nil on a miss, true for a cached allow, or the guardrail's 403
+-- JSON body for a cached block
+function _M.get(key)
+    local verdict = VERDICTS:get(key)
+    if not verdict then
+        count("misses")
+        return nil
+    end
+    count("hits")
+    if verdict == ALLOW then
+        return true
+    end
+    return verdict
+end
+
+-- Store a combined detector decision; uncacheable ones carry no ttl
+function _M.store(key, decision)
+    if not decision.ttl then
+        count("uncacheable")
+        return
+    end
+
+    local verdict = ALLOW
+    if decision.blocked then
+        verdict = decision.body or "{}"
+    end
+
+    local ok, err, forcible = VERDICTS:set(key, verdict, decision.ttl)
+    if not ok then
+        ngx.log(ngx.WARN, "Verdict cache store failed: ", err)
+        return
+    end
+    count("stores")
+    if forcible then
+        count("evictions")
+    end
+end
+
+function _M.stats()
+    local stats = {}
+    for _, name in ipairs({ "hits", "misses", "stores", "uncacheable", "evictions" }) do
+        stats[name] = STATS:get("verdict_cache_" .. name) or 0
+    end
+    stats.free_bytes = VERDICTS:free_space()
+    return stats
+end
+
+function _M.purge()
+    VERDICTS:flush_all()
+    VERDICTS:flush_expired()
+end
+
+return _M
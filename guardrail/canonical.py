@@ -0,0 +1,139 @@
+"""
+Canonical form of detector inputs.
+
+Clients encode the same attack in many ways: percent and plus encoding,
+HTML entities (often nested), full-width or other compatibility
+characters, inline comments as whitespace, mixed-case keywords. The
+detectors see one canonical form instead, so verdict caches are keyed on
+what a request means rather than how it was spelled, and the models don't
+spend tokens on encoding noise.
+
+For input that stays ASCII the gateway computes the same form
+(gateway/canonical.lua), sends it as the request body and its hash in
+HASH_HEADER, and the detectors use it as it is. Keep the two in step:
+this file is the reference for the copies in guardrailv2 and the Django
+client, and tools/check_shared.py compares them all, the Lua one included.
+"""
+
+import hashlib
+import re
+import unicodedata
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Final
+from urllib.parse import unquote_plus
+
+# Set when the body already is the canonical form; the value is its hash
+HASH_HEADER: Final[str] = "X-Guardrail-Canonical-Hash"
+# Decoding stops earlier once a round changes nothing
+MAX_DECODE_ROUNDS: Final[int] = 4
+
+ENTITY_PATTERN: Final[re.Pattern[str]] = re.compile(r"&(#?[0-9A-Za-z]+);")
+DECIMAL_PATTERN: Final[re.Pattern[str]] = re.compile(r"[0-9]+")
+HEX_PATTERN: Final[re.Pattern[str]] = re.compile(r"[0-9A-Fa-f]+")
+NAMED_ENTITIES: Final[dict[str, str]] = {
+    "lt": "<", "gt": ">", "amp": "&", "quot": '"', "apos": "'",
+}
+COMMENT_PATTERN: Final[re.Pattern[str]] = re.compile(r"/\*(.*?)\*/", re.DOTALL)
+VERSIONED_COMMENT_PATTERN: Final[re.Pattern[str]] = re.compile(r"![0-9]*(.*)", re.DOTALL)
+SPACE_PATTERN: Final[re.Pattern[str]] = re.compile(r"[\s\x00-\x20\x7f-\x9f]+")
+# Folded to lower case; other words keep theirs
+KEYWORDS: Final[frozenset[str]] = frozenset({
+    "select", "union", "all", "from", "where", "and", "or", "not", "null",
+    "insert", "into", "values", "update", "set", "delete", "drop", "table",
+    "create", "alter", "exec", "execute", "declare", "cast", "convert",
+    "char", "concat", "having", "group", "order", "by", "limit", "offset",
+    "like", "between", "case", "when", "then", "else", "end", "true", "false",
+    "sleep", "benchmark", "waitfor", "delay", "information_schema",
+})
+KEYWORD_PATTERN: Final[re.Pattern[str]] = re.compile(
+    r"(?<![A-Za-z_])(?:" + "|".join(sorted(KEYWORDS, key=len, reverse=True)) + r")(?![A-Za-z_])",
+    re.IGNORECASE | re.ASCII,
+)
+
+
+@dataclass(frozen=True, slots=True)
+class Canonical:
+    text: str
+    hash: str
+
+    @property
+    def parts(self) -> tuple[str, str]:
+        """(url, body) of a canonical_request."""
+        url, _, body = self.text.partition("\n")
+        return url, body
+
+
+def _entity(match: re.Match[str]) -> str:
+    name = match.group(1)
+    if not name.startswith("#"):
+        return NAMED_ENTITIES.get(name, match.group(0))
+    if name[1:2] in ("x", "X"):
+        digits, pattern, base = name[2:], HEX_PATTERN, 16
+    else:
+        digits, pattern, base = name[1:], DECIMAL_PATTERN, 10
+    if not pattern.fullmatch(digits):
+        return match.group(0)
+    code = int(digits, base)
+    if code > 0x10FFFF or 0xD800 <= code <= 0xDFFF:
+        return "\ufffd"
+    return chr(code)
+
+
+def _comment(match: re.Match[str]) -> str:
+    # MySQL runs the content of /*!50000 ... */, everything else is whitespace
+    if versioned := VERSIONED_COMMENT_PATTERN.fullmatch(match.group(1)):
+        return f" {versioned.group(1)} "
+    return " "
+
+
+def decode(text: str) -> str:
+    """Percent, plus and HTML entity decoding and NFKC until nothing changes."""
+    for _ in range(MAX_DECODE_ROUNDS):
+        decoded = ENTITY_PATTERN.sub(_entity, unquote_plus(text, errors="replace"))
+        decoded = unicodedata.normalize("NFKC", decoded)
+        if decoded == text:
+            break
+        text = decoded
+    return text
+
+
+def canonicalize(text: str, decode_input: bool = True) -> str:
+    """
+    One-line canonical form of text.
+
+    decode_input=False skips URL and entity decoding, for input that was
+    never encoded, like SQL from the ORM; NFKC still applies.
+    """
+    if decode_input:
+        text = decode(text)
+    else:
+        text = unicodedata.normalize("NFKC", text)
+    text = COMMENT_PATTERN.sub(_comment, text)
+    text = SPACE_PATTERN.sub(" ", text).strip(" ")
+    return KEYWORD_PATTERN.sub(lambda match: match.group(0).lower(), text)
+
+
+def digest(text: str) -> str:
+    # MD5 because it is what the gateway has at hand; not a security boundary
+    return hashlib.md5(text.encode(), usedforsecurity=False).hexdigest()
+
+
+def canonical_text(text: str, decode_input: bool = True) -> Canonical:
+    """Canonical form of a single input, like a query and its parameters."""
+    text = canonicalize(text, decode_input)
+    return Canonical(text, digest(text))
+
+
+def canonical_request(url: str, body: str) -> Canonical:
+    """URL and body, each canonicalized, on two lines."""
+    text = f"{canonicalize(url)}\n{canonicalize(body)}"
+    return Canonical(text, digest(text))
+
+
+def from_request(headers: Mapping[str, str], url: str, body: bytes) -> Canonical:
+    """The caller's canonical form if it sent one, else computed from url and body."""
+    body_str = body.decode("utf-8", errors="replace") if body else ""
+    if hash_value := headers.get(HASH_HEADER):
+        return Canonical(body_str, hash_value)
+    return canonical_request(url, body_str)
@@ -0,0 +1,138 @@
+"""
+Compact LLM input: only the spans of a request that could be an attack.
+
+Works on canonical input (canonical.py), where keywords are already lower
+case and whitespace is collapsed. Every quote, comment marker, operator,
+parenthesis and SQL keyword is kept with SPAN_CONTEXT characters on either
+side; overlapping windows are merged up to WINDOW_LIMIT characters and the
+rest is dropped.
+
+When the windows don't fit the limit, windows with SQL keywords get the
+budget first and the rest share what is left. Within each group the budget
+is spread evenly, each window trimmed around its heaviest match, so padding
+in front of a payload can't push it out; only when a group has too many
+windows for MIN_SHARE characters each are its highest scoring ones kept.
+"""
+
+import re
+from typing import Final, NamedTuple
+
+SUSPICIOUS_PATTERN: Final[re.Pattern[str]] = re.compile(
+    r"(?P<keyword>\b(?:select|union|insert|update|delete|drop|alter|exec|execute|declare|cast"
+    r"|convert|concat|having|sleep|benchmark|waitfor|information_schema|xor|rlike|regexp)\b)"
+    r"|(?P<marker>--|/\*|;|#|\|\||&&)"
+    r"|(?P<weak>['\"`()]|\b(?:or|and|not|like|null|char|create)\b)",
+    # Canonical input only folds canonical.KEYWORDS
+    re.IGNORECASE,
+)
+# Weights of the pattern's groups; words that ordinary text also has count least
+WEIGHTS: Final[dict[str, int]] = {"keyword": 4, "marker": 2, "weak": 1}
+SPAN_CONTEXT: Final[int] = 32
+SPAN_SEPARATOR: Final[str] = " ... "
+# Merged windows are cut here, so a long run of padding can't swallow a payload
+WINDOW_LIMIT: Final[int] = 160
+# Parts up to this long are one window, sent whole when they have anything suspicious
+SHORT_PART: Final[int] = 200
+# At most this many characters of spans, url and body together
+SPAN_LIMIT: Final[int] = 1200
+# Fewest characters a kept window is trimmed to
+MIN_SHARE: Final[int] = 48
+
+
+class Window(NamedTuple):
+    part: int
+    start: int
+    end: int
+    # Matches of the keyword group, then the weighted sum of all matches
+    keywords: int
+    score: int
+    # Middle of the heaviest match; trimming keeps the text around it
+    focus: int
+
+    @property
+    def length(self) -> int:
+        return self.end - self.start
+
+
+def windows(text: str, part: int = 0, context: int = SPAN_CONTEXT) -> list[Window]:
+    """Windows around suspicious features of text, in order; a short text is one window."""
+    found: list[Window] = []
+    short = len(text) <= SHORT_PART
+    heaviest = previous_end = 0
+    for match in SUSPICIOUS_PATTERN.finditer(text):
+        weight = WEIGHTS[match.lastgroup]
+        is_keyword = match.lastgroup == "keyword"
+        middle = (match.start() + match.end()) // 2
+        if short:
+            start, end = 0, len(text)
+        else:
+            start, end = max(0, match.start() - context), min(len(text), match.end() + context)
+
+        if found and start <= found[-1].end and (short or end - found[-1].start <= WINDOW_LIMIT):
+            last = found[-1]
+            found[-1] = last._replace(
+                end=max(end, last.end),
+                keywords=last.keywords + is_keyword,
+                score=last.score + weight,
+                focus=middle if weight > heaviest else last.focus,
+            )
+            heaviest = max(heaviest, weight)
+        else:
+            if found and start < found[-1].end:
+                # Too long to merge: the context between the two matches is split
+                start = max(start, previous_end)
+                found[-1] = found[-1]._replace(end=start)
+            found.append(Window(part, start, end, int(is_keyword), weight, middle))
+            heaviest = weight
+        previous_end = match.end()
+    return found
+
+
+def shares(kept: list[Window], budget: int) -> dict[Window, int]:
+    """Characters per window out of budget: short windows whole, the rest split evenly."""
+    result = {}
+    by_length = sorted(kept, key=lambda window: window.length)
+    for i, window in enumerate(by_length):
+        share = min(window.length, budget // (len(by_length) - i))
+        result[window] = share
+        budget -= share
+    return result
+
+
+def select(found: list[Window], limit: int) -> list[Window]:
+    """Windows trimmed so that, joined, they fit in limit characters."""
+    cost = len(SPAN_SEPARATOR)
+    if sum(window.length + cost for window in found) - cost <= limit:
+        return found
+
+    budget = limit + cost
+    trimmed: list[Window] = []
+    # Windows with SQL keywords are served first; the rest split what is left
+    for tier in ([w for w in found if w.keywords], [w for w in found if not w.keywords]):
+        most = max(0 if trimmed else 1, budget // (MIN_SHARE + cost))
+        if len(tier) > most:
+            ranked = sorted(tier, key=lambda window: (-window.keywords, -window.score, window.part, window.start))
+            tier = ranked[:most]
+        for window, share in shares(tier, max(0, budget - cost * len(tier))).items():
+            start = min(max(window.start, window.focus - share // 2), window.end - share)
+            trimmed.append(window._replace(start=start, end=start + share))
+            budget -= share + cost
+    return sorted(trimmed, key=lambda window: (window.part, window.start))
+
+
+def truncate(url: str, body: str, limit: int) -> tuple[str, str]:
+    """The first limit characters of url and body together."""
+    url = url[:limit]
+    return url, body[: limit - len(url)]
+
+
+def compact(url: str, body: str, limit: int = SPAN_LIMIT) -> tuple[str, str] | None:
+    """Compacted (url, body), or None when neither has anything suspicious."""
+    texts = (url, body)
+    found = select(windows(url, 0) + windows(body, 1), limit)
+    if not found:
+        return None
+    parts: tuple[list[str], list[str]] = ([], [])
+    for window in found:
+        parts[window.part].append(texts[window.part][window.start : window.end])
+    return SPAN_SEPARATOR.join(parts[0]), SPAN_SEPARATOR.join(parts[1])
@@ -0,0 +1,120 @@
+"""
+Decision log - detector verdicts batched into a Redis Stream.
+
+Requests only append a small record to an in-memory ring buffer; a
+background task flushes it to the stream every FLUSH_INTERVAL seconds in
+one pipelined round trip. When Redis is slow or down the buffer keeps the
+newest CAPACITY records and counts the rest as dropped, so logging never
+holds up a request. The stream is capped at about STREAM_MAXLEN entries.
+"""
+
+import asyncio
+import hashlib
+import os
+import time
+from collections import deque
+from typing import Final
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+from metrics import Gauge
+
+STREAM: Final[str] = os.getenv("DECISION_LOG_STREAM", "guardrail:decisions")
+STREAM_MAXLEN: Final[int] = int(os.getenv("DECISION_LOG_MAXLEN", "1000000"))
+CAPACITY: Final[int] = int(os.getenv("DECISION_LOG_CAPACITY", "10000"))
+FLUSH_INTERVAL: Final[float] = float(os.getenv("DECISION_LOG_FLUSH_INTERVAL", "1.0"))
+BATCH_SIZE: Final[int] = 500
+# Also log the inspected text (truncated), to use the log as a training set
+LOG_INPUTS: Final[bool] = os.getenv("DECISION_LOG_INPUTS", "0") == "1"
+INPUT_LIMIT: Final[int] = 2000
+
+# Set by the gateway to its verdict cache key, so records from every
+# component of one request share a hash
+REQUEST_HASH_HEADER: Final[str] = "X-Guardrail-Request-Hash"
+
+
+def request_hash(method: str, url: str, body: bytes) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{method}\n{url}\n".encode())
+    digest.update(body)
+    return digest.hexdigest()
+
+
+class DecisionLog:
+    def __init__(self, redis: Redis, source: str, depth: Gauge | None = None):
+        self.redis = redis
+        self.source = source
+        # Records waiting for the next flush, sampled before each one
+        self.depth = depth
+        self.buffer: deque[dict[str, str]] = deque(maxlen=CAPACITY)
+        self.dropped = 0
+        self._task: asyncio.Task | None = None
+
+    def record(
+        self,
+        request_hash: str,
+        verdict: str,
+        stage: str,
+        latency: float,
+        confidence: float | None = None,
+        cache_hit: bool = False,
+        text: str | None = None,
+    ) -> None:
+        """
+        Queue one decision; verdict is allow, block or error and confidence
+        the detector's SQLi probability, if it has one.
+        """
+        if len(self.buffer) == CAPACITY:
+            self.dropped += 1
+        entry = {
+            "ts": f"{time.time():.3f}",
+            "source": self.source,
+            "hash": request_hash,
+            "verdict": verdict,
+            "stage": stage,
+            "latency_ms": f"{latency * 1000:.2f}",
+            "confidence": "" if confidence is None else f"{confidence:.4f}",
+            "cache_hit": "1" if cache_hit else "0",
+        }
+        if LOG_INPUTS and text is not None:
+            entry["input"] = text[:INPUT_LIMIT]
+        self.buffer.append(entry)
+
+    async def flush(self) -> None:
+        while self.buffer:
+            count = min(len(self.buffer), BATCH_SIZE)
+            batch = [self.buffer.popleft() for _ in range(count)]
+            pipe = self.redis.pipeline(transaction=False)
+            for entry in batch:
+                pipe.xadd(STREAM, entry, maxlen=STREAM_MAXLEN, approximate=True)
+            try:
+                await pipe.execute()
+            except RedisError as e:
+                # Put the batch back unless newer records filled the buffer
+                room = CAPACITY - len(self.buffer)
+                self.buffer.extendleft(reversed(batch[-room:] if room > 0 else []))
+                self.dropped += max(0, count - max(room, 0))
+                print(f"Decision log flush failed: {e!r}")
+                return
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            if self.depth is not None:
+                self.depth.set(len(self.buffer))
+            await self.flush()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+        if self.dropped:
+            print(f"Decision log dropped {self.dropped} records")
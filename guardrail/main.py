@@ -1,17 +1,49 @@
 import os
 import re
+import time
 from contextlib import asynccontextmanager
 from functools import lru_cache
 from typing import Final
 
-from fastapi import FastAPI, Request
+import httpx
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import JSONResponse, Response
-from openai import AsyncOpenAI
+from openai import (
+    APIConnectionError,
+    APIStatusError,
+    APITimeoutError,
+    AsyncOpenAI,
+    RateLimitError,
+    omit,
+)
 from redis.asyncio import ConnectionPool, Redis
 
+import canonical
+import compaction
+import metrics
+import profiling
+from decision_log import REQUEST_HASH_HEADER, DecisionLog, request_hash
+from token_budget import TokenBudget
+
 EXCLUDE_PATHS: Final[frozenset[str]] = frozenset()
 STATIC_PREFIX: Final[str] = "/static/"
 
+# Seconds the gateway may reuse an LLM verdict for an identical request
+VERDICT_CACHE_TTL: Final[int] = int(os.getenv("VERDICT_CACHE_TTL", "300"))
+CACHE_TTL_HEADER: Final[str] = "X-Guardrail-Cache-TTL"
+
+MODEL: Final[str] = "gpt-4.1-nano"
+# Hard cap on the input of a full check; above it only non-suspicious text is
+# dropped. The default fits the gateway's 16 KiB body window and the URL.
+FULL_INPUT_LIMIT: Final[int] = int(os.getenv("FULL_INPUT_LIMIT", "20000"))
+# The Responses API's minimum
+TERSE_MAX_OUTPUT_TOKENS: Final[int] = 16
+# Decides instead of the LLM once the token budget is spent
+GUARDRAILV2_URL: Final[str] = os.getenv("GUARDRAILV2_URL", "http://guardrailv2:5001/")
+LOCAL_TIMEOUT: Final[float] = 5.0
+# Only verdicts carrying it come from the model
+LOCAL_SCORE_HEADER: Final[str] = "X-Guardrail-Score"
+
 ALLOWED_RESPONSE: Final[Response] = Response(
     content=b'{"allowed":true}',
     media_type="application/json",
@@ -29,15 +61,66 @@ DETECTED: true/false
 THREAT: [type or "none"]
 PAYLOAD: [payload or "none"]"""
 
+TERSE_PROMPT: Final[str] = """Detect SQL injection in the input: SQL keywords, comments,
+quote manipulation, boolean or time-based injection. The input may be
+excerpts joined by "...".
+
+Reply with one character: 1 if detected, 0 if not."""
+
 DETECTED_PATTERN: Final[re.Pattern[str]] = re.compile(
     r"DETECTED:\s*(true|false)", re.IGNORECASE
 )
 THREAT_PATTERN: Final[re.Pattern[str]] = re.compile(r"THREAT:\s*(.+)", re.IGNORECASE)
 PAYLOAD_PATTERN: Final[re.Pattern[str]] = re.compile(r"PAYLOAD:\s*(.+)", re.IGNORECASE)
 
+registry = metrics.Registry("guardrail")
+REQUESTS = metrics.Counter(registry, "guardrail_requests_total", "Requests checked")
+IN_FLIGHT = metrics.Gauge(registry, "guardrail_in_flight_requests", "Requests being checked")
+REQUEST_SECONDS = metrics.Histogram(
+    registry, "guardrail_request_seconds", "Time to answer a check"
+)
+DECISIONS = metrics.Counter(
+    registry,
+    "guardrail_decisions_total",
+    "Verdicts of the LLM; inactive, static and excluded requests are not counted",
+    label=("verdict", ("allow", "block", "error")),
+)
+STAGE_SECONDS = metrics.Histogram(
+    registry,
+    "guardrail_stage_seconds",
+    "Time spent per stage of a check",
+    label=("stage", ("llm_status", "llm_canonical", "llm_local", "llm_call")),
+)
+CHECK_LEVELS = metrics.Counter(
+    registry,
+    "guardrail_check_levels_total",
+    "Checks by token budget level, after falling back to a cheaper one",
+    label=("level", ("full", "spans", "terse", "local")),
+)
+LLM_TOKENS = metrics.Counter(
+    registry,
+    "guardrail_llm_tokens_total",
+    "Tokens of answered OpenAI calls",
+    label=("kind", ("input", "output")),
+)
+OPENAI_ERRORS = metrics.Counter(
+    registry,
+    "guardrail_openai_errors_total",
+    "Failed OpenAI calls by kind",
+    label=("kind", ("rate_limit", "timeout", "connection", "status", "other")),
+)
+DECISION_LOG_DEPTH = metrics.Gauge(
+    registry, "guardrail_decision_log_queue_depth", "Decisions waiting to be logged"
+)
+
+profiler = profiling.Profiler("guardrail")
+
 redis_pool: ConnectionPool | None = None
 redis_client: Redis | None = None
 openai_client: AsyncOpenAI | None = None
+local_client: httpx.AsyncClient | None = None
+decision_log: DecisionLog | None = None
+token_budget: TokenBudget | None = None
 
 
 @lru_cache(maxsize=1)
@@ -47,16 +130,29 @@ def get_openai_api_key() -> str:
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global redis_pool, redis_client, openai_client
+    global redis_pool, redis_client, openai_client, local_client, decision_log, token_budget
     redis_pool = ConnectionPool(host="cache", port=6379, db=0, decode_responses=True)
     redis_client = Redis(connection_pool=redis_pool)
     openai_client = AsyncOpenAI(api_key=get_openai_api_key())
+    local_client = httpx.AsyncClient(timeout=LOCAL_TIMEOUT)
+    registry.open()
+    decision_log = DecisionLog(redis_client, "guardrail", depth=DECISION_LOG_DEPTH)
+    decision_log.start()
+    token_budget = TokenBudget(redis_client)
+    token_budget.start()
+    profiler.start(redis_client)
     yield
+    await profiler.stop()
+    await token_budget.stop()
+    await decision_log.stop()
+    await local_client.aclose()
+    registry.close()
     await redis_client.aclose()
     await redis_pool.disconnect()
 
 
 app = FastAPI(lifespan=lifespan, docs_url=None, redoc_url=None)
+app.include_router(profiling.router(profiler))
 
 
 async def get_guardrail_status() -> bool:
@@ -67,6 +163,24 @@ async def get_guardrail_status() -> bool:
     return value == "1"
 
 
+def server_timing(stages: dict[str, float]) -> str:
+    """Format stage durations in seconds as a Server-Timing header value."""
+    return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in stages.items())
+
+
+def openai_error_kind(error: Exception) -> str:
+    # Subclasses first: RateLimitError is a status error, timeouts are connection errors
+    if isinstance(error, RateLimitError):
+        return "rate_limit"
+    if isinstance(error, APITimeoutError):
+        return "timeout"
+    if isinstance(error, APIConnectionError):
+        return "connection"
+    if isinstance(error, APIStatusError):
+        return "status"
+    return "other"
+
+
 def parse_llm_response(output: str) -> tuple[bool, str, str]:
     detected = False
     threat_type = "SQL Injection Attempt"
@@ -88,10 +202,52 @@ def parse_llm_response(output: str) -> tuple[bool, str, str]:
     return detected, threat_type, payload
 
 
+def parse_terse_response(output: str) -> bool:
+    # Models sometimes answer in the long format anyway
+    if match := DETECTED_PATTERN.search(output):
+        return match.group(1).lower() == "true"
+    return output.strip().startswith("1")
+
+
+async def check_locally(
+    request: Request, url: str, method: str, request_input: canonical.Canonical
+) -> tuple[bool, str, str] | None:
+    """Ask guardrailv2 with the canonical input; None without a scored verdict."""
+    headers = {
+        "Content-Type": "text/plain; charset=utf-8",
+        "X-Original-URI": url,
+        "X-Original-Method": method,
+        canonical.HASH_HEADER: request_input.hash,
+    }
+    if request_hash_value := request.headers.get(REQUEST_HASH_HEADER):
+        headers[REQUEST_HASH_HEADER] = request_hash_value
+
+    try:
+        response = await local_client.post(
+            GUARDRAILV2_URL, content=request_input.text.encode(), headers=headers
+        )
+    except httpx.HTTPError as e:
+        print(f"Local detector failed: {e!r}")
+        return None
+
+    # Deactivated, guardrailv2 allows everything without scoring it
+    if response.status_code == 200 and LOCAL_SCORE_HEADER in response.headers:
+        return False, "none", "none"
+    if response.status_code == 403:
+        data = response.json()
+        return True, data.get("threat_type", "SQL Injection Attempt"), data.get("payload", "Not identified")
+    print(f"Local detector returned {response.status_code} without a verdict")
+    return None
+
+
 @app.post("/", response_model=None)
+@metrics.tracked(REQUESTS, IN_FLIGHT, REQUEST_SECONDS)
+@profiler.counted
 async def check_request(request: Request) -> Response:
+    started = time.perf_counter()
     if not await get_guardrail_status():
         return ALLOWED_RESPONSE
+    stages = {"llm_status": time.perf_counter() - started}
 
     url = request.headers.get("X-Original-URI", "")
 
@@ -104,18 +260,97 @@ async def check_request(request: Request) -> Response:
         return ALLOWED_RESPONSE
 
     body = await request.body()
-    body_str = body.decode("utf-8", errors="replace") if body else ""
 
-    response = await openai_client.responses.create(
-        model="gpt-4.1-nano",
-        instructions=SQLI_PROMPT,
-        input=f"URL: {url}\nBody: {body_str}",
+    started = time.perf_counter()
+    request_input = canonical.from_request(request.headers, url, body)
+    stages["llm_canonical"] = time.perf_counter() - started
+
+    hash_value = request.headers.get(REQUEST_HASH_HEADER) or request_hash(method, url, body)
+
+    # Cheaper levels send only suspicious spans; with none to show, the
+    # request goes to guardrailv2, which always sees the whole input
+    level = token_budget.level()
+    url_part, body_part = request_input.parts
+    if level == "full":
+        if len(url_part) + len(body_part) > FULL_INPUT_LIMIT:
+            compacted = compaction.compact(url_part, body_part, FULL_INPUT_LIMIT)
+            url_part, body_part = compacted or compaction.truncate(
+                url_part, body_part, FULL_INPUT_LIMIT
+            )
+    elif compacted := compaction.compact(url_part, body_part):
+        url_part, body_part = compacted
+    else:
+        level = "local"
+        url_part, body_part = compaction.truncate(url_part, body_part, compaction.SPAN_LIMIT)
+
+    detected, threat_type, payload = False, "none", "none"
+    llm_input = f"URL: {url_part}\nBody: {body_part}"
+
+    if level == "local":
+        started = time.perf_counter()
+        local_verdict = await check_locally(request, url, method, request_input)
+        stages["llm_local"] = time.perf_counter() - started
+        if local_verdict:
+            detected, threat_type, payload = local_verdict
+        else:
+            # guardrailv2 is down or deactivated: the cheapest LLM call instead
+            level = "terse"
+
+    stage = "llm" if level == "full" else f"llm_{level}"
+
+    if level in ("full", "spans", "terse"):
+        terse = level == "terse"
+        started = time.perf_counter()
+        try:
+            response = await openai_client.responses.create(
+                model=MODEL,
+                instructions=TERSE_PROMPT if terse else SQLI_PROMPT,
+                input=llm_input,
+                max_output_tokens=TERSE_MAX_OUTPUT_TOKENS if terse else omit,
+            )
+        except Exception as e:
+            OPENAI_ERRORS.inc(label=openai_error_kind(e))
+            DECISIONS.inc(label="error")
+            decision_log.record(hash_value, "error", stage, time.perf_counter() - started)
+            raise
+        stages["llm_call"] = time.perf_counter() - started
+
+        if usage := response.usage:
+            token_budget.record(usage.input_tokens, usage.output_tokens, level)
+            LLM_TOKENS.inc(usage.input_tokens, label="input")
+            LLM_TOKENS.inc(usage.output_tokens, label="output")
+
+        if terse:
+            detected = parse_terse_response(response.output_text)
+            threat_type, payload = "SQL Injection Attempt", (body_part or url_part)[:500]
+        else:
+            detected, threat_type, payload = parse_llm_response(response.output_text)
+
+    CHECK_LEVELS.inc(label=level)
+    DECISIONS.inc(label="block" if detected else "allow")
+    STAGE_SECONDS.observe_all(stages)
+    decision_log.record(
+        hash_value,
+        "block" if detected else "allow",
+        stage,
+        stages.get("llm_call") or stages.get("llm_local", 0.0),
+        text=llm_input,
     )
 
-    detected, threat_type, payload = parse_llm_response(response.output_text)
+    # Verdicts without the LLM are not cached, so the gateway asks again
+    # once the budget recovers
+    ttl = VERDICT_CACHE_TTL if level in ("full", "spans", "terse") else 0
+    headers = {
+        CACHE_TTL_HEADER: str(ttl),
+        "Server-Timing": server_timing(stages),
+    }
 
     if not detected:
-        return ALLOWED_RESPONSE
+        return Response(
+            content=b'{"allowed":true}',
+            media_type="application/json",
+            headers=headers,
+        )
 
     return JSONResponse(
         status_code=403,
@@ -126,9 +361,28 @@ async def check_request(request: Request) -> Response:
             "target_url": url,
             "method": method,
         },
+        headers=headers,
     )
 
 
+@app.get("/usage")
+async def usage(minutes: int = 10) -> dict:
+    """Token usage per minute across all workers, and the current budget level."""
+    if not 1 <= minutes <= 1440:
+        raise HTTPException(status_code=400, detail="minutes must be between 1 and 1440")
+    return {
+        "budget_per_minute": token_budget.budget,
+        "spent": token_budget.spent(),
+        "level": token_budget.level(),
+        "minutes": await token_budget.history(minutes),
+    }
+
+
+@app.get("/metrics")
+async def get_metrics() -> Response:
+    return Response(registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.get("/status")
 async def status() -> dict[str, bool]:
     return {"active": await get_guardrail_status()}
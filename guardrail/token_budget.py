@@ -0,0 +1,142 @@
+"""
+Token budget - LLM token usage per minute, shared by all guardrail workers.
+
+Each answered OpenAI call adds its usage to local counters. A background
+task adds them to per-minute Redis hashes every FLUSH_INTERVAL seconds in
+one pipelined round trip and reads back the minute's total, so requests
+never wait on Redis to learn how much of the budget is left. Spend counts
+input tokens plus OUTPUT_WEIGHT times output tokens, the price ratio of
+gpt-4.1-nano.
+
+The closer the minute's spend gets to BUDGET_PER_MINUTE, the cheaper the
+level a check runs at:
+    full   the whole input (its most suspicious spans above FULL_INPUT_LIMIT)
+    spans  only the suspicious spans of the input
+    terse  spans, and a one-token verdict instead of threat and payload
+    local  no LLM call; guardrailv2 decides
+Below full, input without suspicious spans goes to guardrailv2 as well.
+"""
+
+import asyncio
+import os
+import time
+from collections import Counter
+from typing import Final
+
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+KEY_PREFIX: Final[str] = "guardrail:tokens:"
+# How long per-minute usage stays in Redis
+KEY_TTL: Final[int] = int(os.getenv("TOKEN_USAGE_TTL", "86400"))
+# Spend per minute across all workers; 0 never compacts
+BUDGET_PER_MINUTE: Final[int] = int(os.getenv("TOKEN_BUDGET_PER_MINUTE", "0"))
+# Fractions of the budget at which checks drop to spans, terse and local
+SPANS_AT: Final[float] = float(os.getenv("TOKEN_BUDGET_SPANS_AT", "0.5"))
+TERSE_AT: Final[float] = float(os.getenv("TOKEN_BUDGET_TERSE_AT", "0.8"))
+LOCAL_AT: Final[float] = 1.0
+OUTPUT_WEIGHT: Final[int] = 4
+FLUSH_INTERVAL: Final[float] = 1.0
+
+LEVELS: Final[tuple[str, ...]] = ("full", "spans", "terse", "local")
+
+
+def current_minute() -> int:
+    return int(time.time() // 60)
+
+
+def spend(input_tokens: int, output_tokens: int) -> int:
+    return input_tokens + OUTPUT_WEIGHT * output_tokens
+
+
+class TokenBudget:
+    def __init__(self, redis: Redis, budget: int = BUDGET_PER_MINUTE):
+        self.redis = redis
+        self.budget = budget
+        # Not yet flushed: minute -> hash field -> count
+        self.pending: dict[int, Counter[str]] = {}
+        # The minute's total in Redis at the last flush
+        self.flushed_minute = 0
+        self.flushed_spend = 0
+        self._task: asyncio.Task | None = None
+
+    def record(self, input_tokens: int, output_tokens: int, level: str) -> None:
+        fields = self.pending.setdefault(current_minute(), Counter())
+        fields["input"] += input_tokens
+        fields["output"] += output_tokens
+        fields["requests"] += 1
+        fields[level] += 1
+
+    def spent(self) -> int:
+        """This minute's spend: all workers up to the last flush, plus ours since."""
+        minute = current_minute()
+        total = self.flushed_spend if self.flushed_minute == minute else 0
+        if fields := self.pending.get(minute):
+            total += spend(fields["input"], fields["output"])
+        return total
+
+    def level(self) -> str:
+        if self.budget <= 0:
+            return "full"
+        pressure = self.spent() / self.budget
+        if pressure >= LOCAL_AT:
+            return "local"
+        if pressure >= TERSE_AT:
+            return "terse"
+        if pressure >= SPANS_AT:
+            return "spans"
+        return "full"
+
+    async def flush(self) -> None:
+        minute = current_minute()
+        pending, self.pending = self.pending, {}
+
+        pipe = self.redis.pipeline(transaction=False)
+        for pending_minute, fields in pending.items():
+            key = f"{KEY_PREFIX}{pending_minute}"
+            for field, count in fields.items():
+                pipe.hincrby(key, field, count)
+            pipe.expire(key, KEY_TTL)
+        pipe.hmget(f"{KEY_PREFIX}{minute}", "input", "output")
+        try:
+            results = await pipe.execute()
+        except RedisError as e:
+            # Counts are small; keep them for the next flush
+            for pending_minute, fields in pending.items():
+                self.pending.setdefault(pending_minute, Counter()).update(fields)
+            print(f"Token usage flush failed: {e!r}")
+            return
+
+        input_tokens, output_tokens = results[-1]
+        self.flushed_minute = minute
+        self.flushed_spend = spend(int(input_tokens or 0), int(output_tokens or 0))
+
+    async def history(self, minutes: int) -> list[dict[str, int]]:
+        """Usage of the last `minutes` minutes, newest first."""
+        minute = current_minute()
+        pipe = self.redis.pipeline(transaction=False)
+        for offset in range(minutes):
+            pipe.hgetall(f"{KEY_PREFIX}{minute - offset}")
+        rows = []
+        for offset, fields in enumerate(await pipe.execute()):
+            row = {"minute": (minute - offset) * 60}
+            row.update((field, int(count)) for field, count in fields.items())
+            rows.append(row)
+        return rows
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            await self.flush()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
@@ -0,0 +1,299 @@
+"""
+Calibrate the SQLi threshold offline from cached model logits.
+
+The labeled corpus is scored through the model once, in length-sorted
+batches, and the raw logits are stored. Every threshold is then evaluated
+in one vectorized pass over the stored scores, so trying operating points
+takes seconds and needs no model.
+
+Usage:
+    uv run python calibrate.py score ../attack/payloads.csv
+    uv run python calibrate.py sweep --max-fpr 0.01
+    uv run python calibrate.py sweep --pick f1 --write
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timezone
+from typing import Final
+from urllib.parse import quote_plus
+
+import numpy as np
+
+import canonical
+from main import DEFAULT_THRESHOLD, MODEL_NAME, THRESHOLD_CONFIG, TOKENIZER_NAME, load_threshold
+
+LOGITS_PATH: Final[str] = "calibration/logits.npz"
+CURVES_PATH: Final[str] = "calibration/curves.csv"
+# What the gateway sends for a search: X-Original-URI with the payload in q
+DEFAULT_TEMPLATE: Final[str] = "/?q={payload}"
+
+
+def read_corpus(path: str) -> tuple[list[str], np.ndarray]:
+    payloads: list[str] = []
+    labels: list[int] = []
+    with open(path, encoding="utf-8", newline="") as f:
+        for row in csv.reader(f):
+            if len(row) >= 2:
+                payloads.append(row[0].strip())
+                labels.append(1 if row[1].strip().lower() == "malicious" else 0)
+    return payloads, np.asarray(labels, dtype=np.int8)
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def model_inputs(payloads: list[str], template: str, raw: bool) -> list[str]:
+    """Payloads in the canonical form the service scores, see canonical.py."""
+    if raw:
+        return [canonical.canonicalize(payload, decode_input=False) for payload in payloads]
+    return [
+        canonical.canonical_request(template.format(payload=quote_plus(payload)), "").text.strip()
+        for payload in payloads
+    ]
+
+
+def score_logits(texts: list[str], batch_size: int) -> np.ndarray:
+    """Raw (N, 2) logits; identical texts are only run once."""
+    import torch
+    from transformers import MobileBertForSequenceClassification, MobileBertTokenizer
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    tokenizer = MobileBertTokenizer.from_pretrained(TOKENIZER_NAME)
+    model = MobileBertForSequenceClassification.from_pretrained(MODEL_NAME)
+    model.to(device)
+    model.eval()
+
+    unique, inverse = np.unique(np.asarray(texts, dtype=object), return_inverse=True)
+    # Similar lengths in a batch keep padding, and wasted compute, small
+    order = sorted(range(len(unique)), key=lambda i: len(unique[i]))
+    logits = np.empty((len(unique), 2), dtype=np.float32)
+
+    started = time.perf_counter()
+    with torch.inference_mode():
+        for start in range(0, len(order), batch_size):
+            indexes = order[start : start + batch_size]
+            inputs = tokenizer(
+                [unique[i] for i in indexes],
+                padding=True,
+                truncation=True,
+                max_length=512,
+                return_tensors="pt",
+            ).to(device)
+            outputs = model(input_ids=inputs["input_ids"], attention_mask=inputs["attention_mask"])
+            logits[indexes] = outputs.logits.float().cpu().numpy()
+            done = min(start + batch_size, len(order))
+            print(f"\rScored {done}/{len(order)} unique inputs", end="", flush=True)
+
+    elapsed = time.perf_counter() - started
+    print(f"\nScored {len(unique)} unique inputs in {elapsed:.1f}s")
+    return logits[inverse]
+
+
+def score(args: argparse.Namespace) -> None:
+    digest = file_digest(args.corpus)
+    if os.path.exists(args.logits) and not args.force:
+        with np.load(args.logits) as cached:
+            meta = json.loads(str(cached["meta"]))
+        if (
+            meta.get("corpus_sha256") == digest
+            and meta.get("template") == args.template
+            and meta.get("raw") == args.raw
+            and meta.get("canonical")
+        ):
+            print(f"{args.logits} is up to date for {args.corpus}; use --force to rescore")
+            return
+
+    payloads, labels = read_corpus(args.corpus)
+    logits = score_logits(model_inputs(payloads, args.template, args.raw), args.batch_size)
+
+    meta = {
+        "model": MODEL_NAME,
+        "tokenizer": TOKENIZER_NAME,
+        "corpus": os.path.abspath(args.corpus),
+        "corpus_sha256": digest,
+        "template": args.template,
+        "raw": args.raw,
+        "canonical": True,
+        "rows": len(labels),
+        "scored_at": datetime.now(timezone.utc).isoformat(),
+    }
+    os.makedirs(os.path.dirname(args.logits) or ".", exist_ok=True)
+    np.savez_compressed(args.logits, logits=logits, labels=labels, meta=json.dumps(meta))
+    print(f"Logits saved to {args.logits}")
+
+
+def sqli_scores(logits: np.ndarray) -> np.ndarray:
+    """Softmax probability of the SQLi class, as main.score computes it."""
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp[:, 1] / exp.sum(axis=1)
+
+
+def threshold_curves(scores: np.ndarray, labels: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Metrics for blocking every score >= threshold, for each distinct score.
+
+    Scores are sorted once; cumulative sums then give TP and FP counts at
+    every cut, so all thresholds cost O(N log N) in total.
+    """
+    order = np.argsort(-scores, kind="stable")
+    sorted_scores = scores[order]
+    sorted_labels = labels[order].astype(np.int64)
+
+    tp = np.cumsum(sorted_labels)
+    fp = np.cumsum(1 - sorted_labels)
+    # Last position of every run of equal scores
+    cuts = np.r_[np.flatnonzero(np.diff(sorted_scores)), len(sorted_scores) - 1]
+    tp, fp = tp[cuts], fp[cuts]
+
+    positives = max(int(sorted_labels.sum()), 1)
+    negatives = max(len(sorted_labels) - int(sorted_labels.sum()), 1)
+    precision = tp / np.maximum(tp + fp, 1)
+    recall = tp / positives
+    denominator = precision + recall
+    f1 = np.divide(2 * precision * recall, denominator, out=np.zeros_like(denominator), where=denominator > 0)
+
+    return {
+        "threshold": sorted_scores[cuts],
+        "precision": precision,
+        "recall": recall,
+        "f1": f1,
+        "fpr": fp / negatives,
+        "tp": tp,
+        "fp": fp,
+    }
+
+
+def operating_point(curves: dict[str, np.ndarray], index: int) -> dict[str, float]:
+    return {name: float(values[index]) for name, values in curves.items()}
+
+
+def at_threshold(curves: dict[str, np.ndarray], threshold: float) -> dict[str, float] | None:
+    """Metrics when blocking scores >= threshold (the lowest distinct score above it)."""
+    eligible = np.flatnonzero(curves["threshold"] >= threshold)
+    if len(eligible) == 0:
+        return None
+    point = operating_point(curves, int(eligible[-1]))
+    point["threshold"] = threshold
+    return point
+
+
+def recommend(curves: dict[str, np.ndarray], max_fpr: float, min_precision: float) -> dict[str, dict[str, float]]:
+    points = {"f1": operating_point(curves, int(np.argmax(curves["f1"])))}
+
+    # Highest recall within the constraint; among ties, the highest threshold
+    for name, allowed in (
+        ("fpr", curves["fpr"] <= max_fpr),
+        ("precision", curves["precision"] >= min_precision),
+    ):
+        if allowed.any():
+            recall = np.where(allowed, curves["recall"], -1.0)
+            points[name] = operating_point(curves, int(np.flatnonzero(recall == recall.max())[0]))
+    return points
+
+
+def write_threshold(point: dict[str, float], picked: str, meta: dict, path: str) -> None:
+    config = {
+        "threshold": round(point["threshold"], 6),
+        "selected_by": picked,
+        "precision": round(point["precision"], 4),
+        "recall": round(point["recall"], 4),
+        "f1": round(point["f1"], 4),
+        "fpr": round(point["fpr"], 4),
+        "corpus_sha256": meta.get("corpus_sha256"),
+        "model": meta.get("model"),
+        "calibrated_at": datetime.now(timezone.utc).isoformat(),
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(config, f, indent=2)
+        f.write("\n")
+    print(f"Threshold {config['threshold']} written to {path}; restart guardrailv2 to apply it")
+
+
+def sweep(args: argparse.Namespace) -> None:
+    with np.load(args.logits) as cached:
+        logits = cached["logits"]
+        labels = cached["labels"]
+        meta = json.loads(str(cached["meta"]))
+
+    started = time.perf_counter()
+    curves = threshold_curves(sqli_scores(logits), labels)
+    points = recommend(curves, args.max_fpr, args.min_precision)
+    elapsed = time.perf_counter() - started
+
+    print(f"{len(labels)} cases ({int(labels.sum())} malicious), {len(curves['threshold'])} thresholds in {elapsed * 1000:.1f} ms")
+    print(f"{'operating point':<28}{'threshold':>10}{'precision':>11}{'recall':>9}{'F1':>8}{'FPR':>8}")
+
+    current = load_threshold()
+    rows = [(f"current ({THRESHOLD_CONFIG if current != DEFAULT_THRESHOLD else 'default'})", at_threshold(curves, current))]
+    rows += [
+        ("f1: best F1", points.get("f1")),
+        (f"fpr: best recall, FPR<={args.max_fpr:g}", points.get("fpr")),
+        (f"precision: best recall, P>={args.min_precision:g}", points.get("precision")),
+    ]
+    for label, point in rows:
+        if point is None:
+            print(f"{label:<28}{'n/a':>10}")
+            continue
+        print(
+            f"{label:<28}{point['threshold']:>10.4f}{point['precision']:>11.3f}"
+            f"{point['recall']:>9.3f}{point['f1']:>8.3f}{point['fpr']:>8.3f}"
+        )
+
+    os.makedirs(os.path.dirname(args.curves) or ".", exist_ok=True)
+    names = ["threshold", "precision", "recall", "f1", "fpr", "tp", "fp"]
+    np.savetxt(
+        args.curves,
+        np.column_stack([curves[name] for name in names]),
+        delimiter=",",
+        header=",".join(names),
+        comments="",
+        fmt=["%.6f", "%.6f", "%.6f", "%.6f", "%.6f", "%d", "%d"],
+    )
+    print(f"Curves saved to {args.curves}")
+
+    if args.write:
+        if args.pick not in points:
+            raise SystemExit(f"No threshold satisfies the {args.pick} constraint")
+        write_threshold(points[args.pick], args.pick, meta, args.config)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--logits", default=LOGITS_PATH, help="Stored logits file")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    score_parser = subparsers.add_parser("score", help="Run the model over a labeled corpus and store the logits")
+    score_parser.add_argument("corpus", help="CSV of payload,label (e.g. attack/payloads.csv or corpus.py output)")
+    score_parser.add_argument("--batch-size", type=int, default=64)
+    score_parser.add_argument("--template", default=DEFAULT_TEMPLATE, help="How a payload reaches the model; {payload} is URL-encoded")
+    score_parser.add_argument("--raw", action="store_true", help="Score payloads as they are, without the template")
+    score_parser.add_argument("--force", action="store_true", help="Rescore even if the logits match the corpus")
+
+    sweep_parser = subparsers.add_parser("sweep", help="Evaluate every threshold and recommend operating points")
+    sweep_parser.add_argument("--max-fpr", type=float, default=0.01)
+    sweep_parser.add_argument("--min-precision", type=float, default=0.99)
+    sweep_parser.add_argument("--curves", default=CURVES_PATH, help="Where to save the full curves as CSV")
+    sweep_parser.add_argument("--pick", choices=["f1", "fpr", "precision"], default="f1", help="Operating point for --write")
+    sweep_parser.add_argument("--write", action="store_true", help="Write the picked threshold for guardrailv2")
+    sweep_parser.add_argument("--config", default=THRESHOLD_CONFIG, help="Threshold config read by main.py")
+
+    args = parser.parse_args()
+    if args.command == "score":
+        score(args)
+    else:
+        sweep(args)
+
+
+if __name__ == "__main__":
+    main()
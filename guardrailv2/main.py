@@ -1,3 +1,7 @@
+import json
+import math
+import os
+import time
 from contextlib import asynccontextmanager
 from typing import Final
 
@@ -7,43 +11,147 @@ from fastapi.responses import JSONResponse, Response
 from redis.asyncio import ConnectionPool, Redis
 from transformers import MobileBertForSequenceClassification, MobileBertTokenizer
 
+import canonical
+import metrics
+import profiling
+from decision_log import REQUEST_HASH_HEADER, DecisionLog, request_hash
+
 STATIC_PREFIX: Final[str] = "/static/"
-CONFIDENCE_THRESHOLD: Final[float] = 0.7
+TOKENIZER_NAME: Final[str] = "google/mobilebert-uncased"
+MODEL_NAME: Final[str] = "cssupport/mobilebert-sql-injection-detect"
+# SQLi probability at or above which a request is blocked, unless
+# calibrate.py has written another one to THRESHOLD_CONFIG
+DEFAULT_THRESHOLD: Final[float] = 0.7
+THRESHOLD_CONFIG: Final[str] = os.getenv("THRESHOLD_CONFIG", "threshold.json")
+# Seconds the gateway may reuse a verdict for an identical request
+VERDICT_CACHE_TTL: Final[int] = int(os.getenv("VERDICT_CACHE_TTL", "300"))
+CACHE_TTL_HEADER: Final[str] = "X-Guardrail-Cache-TTL"
+# SQLi probability, lets the gateway tell confident verdicts from unsure ones
+SCORE_HEADER: Final[str] = "X-Guardrail-Score"
+# Log-odds distance of the score from the (calibrated) threshold, positive
+# when blocked; the gateway's ml_first policy reads confidence from it
+MARGIN_HEADER: Final[str] = "X-Guardrail-Margin"
+# Chrome traces of torch profiling sessions
+PROFILE_DIR: Final[str] = os.getenv("PROFILE_DIR", "/tmp/profiles")
 
 ALLOWED_RESPONSE: Final[Response] = Response(
     content=b'{"allowed":true}',
     media_type="application/json",
 )
 
+registry = metrics.Registry("guardrailv2")
+REQUESTS = metrics.Counter(registry, "guardrailv2_requests_total", "Requests checked")
+IN_FLIGHT = metrics.Gauge(registry, "guardrailv2_in_flight_requests", "Requests being checked")
+REQUEST_SECONDS = metrics.Histogram(
+    registry, "guardrailv2_request_seconds", "Time to answer a check"
+)
+DECISIONS = metrics.Counter(
+    registry,
+    "guardrailv2_decisions_total",
+    "Verdicts of the model; inactive, static and empty requests are not counted",
+    label=("verdict", ("allow", "block")),
+)
+STAGE_SECONDS = metrics.Histogram(
+    registry,
+    "guardrailv2_stage_seconds",
+    "Time spent per stage of a check",
+    label=("stage", ("ml_status", "ml_canonical", "ml_tokenize", "ml_inference")),
+)
+SQLI_SCORE = metrics.Histogram(
+    registry,
+    "guardrailv2_sqli_score",
+    "SQL injection probability of checked requests",
+    buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99),
+)
+DECISION_LOG_DEPTH = metrics.Gauge(
+    registry, "guardrailv2_decision_log_queue_depth", "Decisions waiting to be logged"
+)
+
+
+class TorchCollector:
+    """torch.profiler over everything the model runs, i.e. the predict path."""
+
+    format = "text"
+
+    def __init__(self, session: profiling.Session):
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        self.profile = torch.profiler.profile(activities=activities, record_shapes=True)
+        self.trace_path = os.path.join(PROFILE_DIR, f"guardrailv2-{session.id}-{os.getpid()}.json")
+
+    def start(self) -> None:
+        self.profile.start()
+
+    def stop(self) -> str:
+        self.profile.stop()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        self.profile.export_chrome_trace(self.trace_path)
+        table = self.profile.key_averages(group_by_input_shape=True).table(
+            sort_by="self_cpu_time_total", row_limit=profiling.REPORT_LINES
+        )
+        return f"{table}\nChrome trace: {self.trace_path}\n"
+
+
+profiler = profiling.Profiler("guardrailv2", modes={"torch": TorchCollector})
+
 redis_pool: ConnectionPool | None = None
 redis_client: Redis | None = None
 device: torch.device | None = None
 tokenizer: MobileBertTokenizer | None = None
 model: MobileBertForSequenceClassification | None = None
+decision_log: DecisionLog | None = None
+sqli_threshold: float = DEFAULT_THRESHOLD
+
+
+def load_threshold(path: str = THRESHOLD_CONFIG) -> float:
+    """Read the calibrated threshold, falling back to DEFAULT_THRESHOLD."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            threshold = float(json.load(f)["threshold"])
+    except FileNotFoundError:
+        return DEFAULT_THRESHOLD
+    except (ValueError, KeyError, TypeError) as e:
+        print(f"Ignoring invalid threshold config {path}: {e!r}")
+        return DEFAULT_THRESHOLD
+
+    if not 0.0 < threshold <= 1.0:
+        print(f"Ignoring out of range threshold {threshold} in {path}")
+        return DEFAULT_THRESHOLD
+    return threshold
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global redis_pool, redis_client, device, tokenizer, model
+    global redis_pool, redis_client, device, tokenizer, model, sqli_threshold, decision_log
 
     redis_pool = ConnectionPool(host="cache", port=6379, db=0, decode_responses=True)
     redis_client = Redis(connection_pool=redis_pool)
+    registry.open()
+    decision_log = DecisionLog(redis_client, "guardrailv2", depth=DECISION_LOG_DEPTH)
+    decision_log.start()
+    profiler.start(redis_client)
 
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    tokenizer = MobileBertTokenizer.from_pretrained("google/mobilebert-uncased")
-    model = MobileBertForSequenceClassification.from_pretrained(
-        "cssupport/mobilebert-sql-injection-detect"
-    )
+    tokenizer = MobileBertTokenizer.from_pretrained(TOKENIZER_NAME)
+    model = MobileBertForSequenceClassification.from_pretrained(MODEL_NAME)
     model.to(device)
     model.eval()
 
+    sqli_threshold = load_threshold()
+    print(f"SQLi threshold: {sqli_threshold}")
+
     yield
 
+    await profiler.stop()
+    await decision_log.stop()
+    registry.close()
     await redis_client.aclose()
     await redis_pool.disconnect()
 
 
 app = FastAPI(lifespan=lifespan, docs_url=None, redoc_url=None)
+app.include_router(profiling.router(profiler))
 
 
 async def get_guardrailv2_status() -> bool:
@@ -54,31 +162,68 @@ async def get_guardrailv2_status() -> bool:
     return value == "1"
 
 
-def predict(text: str) -> tuple[bool, float, str]:
+def server_timing(stages: dict[str, float]) -> str:
+    """Format stage durations in seconds as a Server-Timing header value."""
+    return ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in stages.items())
+
+
+def score(text: str, stages: dict[str, float] | None = None) -> float:
+    """
+    Return the model's SQL injection probability for text.
+
+    Tokenization and inference times are added to stages when given.
+    """
+    started = time.perf_counter()
     inputs = tokenizer(
         text, padding=False, truncation=True, return_tensors="pt", max_length=512
     )
     input_ids = inputs["input_ids"].to(device)
     attention_mask = inputs["attention_mask"].to(device)
+    tokenized = time.perf_counter()
 
     with torch.no_grad():
         outputs = model(input_ids=input_ids, attention_mask=attention_mask)
 
-    logits = outputs.logits
-    probabilities = torch.softmax(logits, dim=1)
-    predicted_class = torch.argmax(probabilities, dim=1).item()
-    confidence = probabilities[0][predicted_class].item()
+    probabilities = torch.softmax(outputs.logits, dim=1)
+    sqli_score = probabilities[0][1].item()
 
-    is_sqli = predicted_class == 1 and confidence >= CONFIDENCE_THRESHOLD
+    if stages is not None:
+        stages["ml_tokenize"] = tokenized - started
+        # .item() waits for the device, so this includes all of inference
+        stages["ml_inference"] = time.perf_counter() - tokenized
+    return sqli_score
+
+
+def classify(sqli_score: float) -> tuple[bool, float, str]:
+    is_sqli = sqli_score >= sqli_threshold
+    # Confidence in the decision actually taken, not in a fixed 0.5 cut
+    confidence = sqli_score if is_sqli else 1 - sqli_score
     threat_type = "SQL Injection Detected (ML)" if is_sqli else "none"
 
     return is_sqli, confidence, threat_type
 
 
+def log_odds(probability: float) -> float:
+    probability = min(max(probability, 1e-6), 1 - 1e-6)
+    return math.log(probability / (1 - probability))
+
+
+def margin(sqli_score: float) -> float:
+    return log_odds(sqli_score) - log_odds(sqli_threshold)
+
+
+def predict(text: str) -> tuple[bool, float, str]:
+    return classify(score(text))
+
+
 @app.post("/", response_model=None)
+@metrics.tracked(REQUESTS, IN_FLIGHT, REQUEST_SECONDS)
+@profiler.counted
 async def check_request(request: Request) -> Response:
+    started = time.perf_counter()
     if not await get_guardrailv2_status():
         return ALLOWED_RESPONSE
+    stages = {"ml_status": time.perf_counter() - started}
 
     url = request.headers.get("X-Original-URI", "")
 
@@ -88,18 +233,43 @@ async def check_request(request: Request) -> Response:
     method = request.headers.get("X-Original-Method", "GET")
 
     body = await request.body()
-    body_str = body.decode("utf-8", errors="replace") if body else ""
 
-    combined_input = f"{url} {body_str}".strip()
+    canonical_started = time.perf_counter()
+    # The model only needs the text; a canonical URL and body are two lines
+    combined_input = canonical.from_request(request.headers, url, body).text.strip()
+    stages["ml_canonical"] = time.perf_counter() - canonical_started
 
     if not combined_input:
         return ALLOWED_RESPONSE
 
-    print(combined_input)
-    is_sqli, confidence, threat_type = predict(combined_input)
+    sqli_score = score(combined_input, stages)
+    is_sqli, confidence, threat_type = classify(sqli_score)
+
+    DECISIONS.inc(label="block" if is_sqli else "allow")
+    STAGE_SECONDS.observe_all(stages)
+    SQLI_SCORE.observe(sqli_score)
+    decision_log.record(
+        request.headers.get(REQUEST_HASH_HEADER) or request_hash(method, url, body),
+        "block" if is_sqli else "allow",
+        "ml",
+        time.perf_counter() - started,
+        confidence=sqli_score,
+        text=combined_input,
+    )
+
+    headers = {
+        CACHE_TTL_HEADER: str(VERDICT_CACHE_TTL),
+        SCORE_HEADER: f"{sqli_score:.4f}",
+        MARGIN_HEADER: f"{margin(sqli_score):.4f}",
+        "Server-Timing": server_timing(stages),
+    }
 
     if not is_sqli:
-        return ALLOWED_RESPONSE
+        return Response(
+            content=b'{"allowed":true}',
+            media_type="application/json",
+            headers=headers,
+        )
 
     return JSONResponse(
         status_code=403,
@@ -111,9 +281,15 @@ async def check_request(request: Request) -> Response:
             "target_url": url,
             "method": method,
         },
+        headers=headers,
     )
 
 
+@app.get("/metrics")
+async def get_metrics() -> Response:
+    return Response(registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.get("/status")
 async def status() -> dict[str, bool]:
     return {"active": await get_guardrailv2_status()}
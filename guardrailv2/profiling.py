@@ -0,0 +1,295 @@
+"""
+Profiling on demand, switched on through Redis like /activate.
+
+POST /profile/start stores a session under the <service>:profile key.
+Every worker polls that key once a second from a background task, runs the
+requested profiler on its event loop thread for the session's seconds (or
+until it has served the session's number of requests) and stores the output
+in the <service>:profile:<session> hash. GET /profile/result merges the
+output of all workers. While no session runs, requests pay one attribute
+check and nothing else.
+
+Modes:
+    sample    samples the event loop thread's stack every interval seconds;
+              collapsed stacks for flamegraph.pl, inferno or speedscope
+    cprofile  deterministic profile of the event loop thread; pstats report
+
+Services can add their own, e.g. guardrailv2's torch profiler. The endpoints
+need ADMIN_TOKEN in the X-Admin-Token header and don't exist without it.
+"""
+
+import asyncio
+import cProfile
+import hmac
+import io
+import json
+import math
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import asdict, dataclass
+from functools import wraps
+from typing import Callable, Final, Protocol
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+
+ADMIN_TOKEN: Final[str] = os.getenv("ADMIN_TOKEN", "")
+POLL_INTERVAL: Final[float] = 1.0
+MAX_SECONDS: Final[float] = 300.0
+DEFAULT_SAMPLE_INTERVAL: Final[float] = 0.005
+RESULT_TTL: Final[int] = 3600
+REPORT_LINES: Final[int] = 60
+
+
+@dataclass
+class Session:
+    id: str
+    mode: str
+    seconds: float
+    # Per worker; None profiles for the full duration
+    requests: int | None = None
+    interval: float = DEFAULT_SAMPLE_INTERVAL
+
+
+class Collector(Protocol):
+    # "collapsed" output from all workers is summed, "text" is concatenated
+    format: str
+
+    def start(self) -> None: ...
+
+    def stop(self) -> str: ...
+
+
+class StackSampler:
+    """Samples one thread's stack from a background thread."""
+
+    format = "collapsed"
+
+    def __init__(self, session: Session):
+        self.interval = session.interval
+        self.thread_id = threading.get_ident()
+        self.counts: Counter[str] = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(
+                    f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                )
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> str:
+        self._stopped.set()
+        self._thread.join()
+        return "\n".join(f"{stack} {count}" for stack, count in self.counts.most_common())
+
+
+class CProfileCollector:
+    format = "text"
+
+    def __init__(self, session: Session):
+        self.profile = cProfile.Profile()
+
+    def start(self) -> None:
+        self.profile.enable()
+
+    def stop(self) -> str:
+        self.profile.disable()
+        report = io.StringIO()
+        stats = pstats.Stats(self.profile, stream=report)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(REPORT_LINES)
+        return report.getvalue()
+
+
+MODES: Final[dict[str, Callable[[Session], Collector]]] = {
+    "sample": StackSampler,
+    "cprofile": CProfileCollector,
+}
+
+
+class Profiler:
+    def __init__(self, service: str, modes: dict[str, Callable[[Session], Collector]] | None = None):
+        self.key = f"{service}:profile"
+        self.modes = {**MODES, **(modes or {})}
+        self.redis: Redis | None = None
+        # The only thing requests look at while profiling is off
+        self.active = False
+        self._session: Session | None = None
+        self._collector: Collector | None = None
+        self._last_session_id: str | None = None
+        self._deadline = 0.0
+        self._requests_left: int | None = None
+        self._results: list[tuple[Session, str, str]] = []
+        self._task: asyncio.Task | None = None
+
+    def counted(self, handler):
+        """Count a handler's requests against the session's request limit."""
+
+        @wraps(handler)
+        async def wrapper(*args, **kwargs):
+            try:
+                return await handler(*args, **kwargs)
+            finally:
+                if self.active:
+                    self._request_finished()
+
+        return wrapper
+
+    def _request_finished(self) -> None:
+        if self._requests_left is None:
+            return
+        self._requests_left -= 1
+        if self._requests_left <= 0:
+            self._finish()
+
+    def _begin(self, session: Session) -> None:
+        self._last_session_id = session.id
+        try:
+            collector = self.modes[session.mode](session)
+            collector.start()
+        except Exception as e:
+            print(f"Profiling session {session.id} failed to start: {e!r}")
+            return
+        self._session = session
+        self._collector = collector
+        self._deadline = time.monotonic() + session.seconds
+        self._requests_left = session.requests
+        self.active = True
+        print(f"Profiling session {session.id} started ({session.mode})")
+
+    def _finish(self) -> None:
+        # Called on the event loop thread, where the collectors started
+        self.active = False
+        output = self._collector.stop()
+        self._results.append((self._session, self._collector.format, output))
+        print(f"Profiling session {self._session.id} finished")
+        self._session = None
+        self._collector = None
+
+    async def _publish(self) -> None:
+        while self._results:
+            session, output_format, output = self._results.pop(0)
+            key = f"{self.key}:{session.id}"
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hset(key, str(os.getpid()), json.dumps({"format": output_format, "output": output}))
+            pipe.expire(key, RESULT_TTL)
+            await pipe.execute()
+
+    async def poll(self) -> None:
+        value = await self.redis.get(self.key)
+        session = Session(**json.loads(value)) if value else None
+
+        if self.active and (session is None or session.id != self._session.id):
+            self._finish()
+        elif self.active and time.monotonic() >= self._deadline:
+            self._finish()
+
+        await self._publish()
+
+        if not self.active and session is not None and session.id != self._last_session_id:
+            self._begin(session)
+
+    async def _run(self) -> None:
+        while True:
+            delay = POLL_INTERVAL
+            if self.active:
+                delay = max(0.0, min(delay, self._deadline - time.monotonic()))
+            await asyncio.sleep(delay)
+            try:
+                await self.poll()
+            except RedisError as e:
+                print(f"Profiling poll failed: {e!r}")
+
+    def start(self, redis: Redis) -> None:
+        self.redis = redis
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self.active:
+            self._finish()
+        try:
+            await self._publish()
+        except RedisError as e:
+            print(f"Profiling results lost: {e!r}")
+
+
+def merge_results(results: dict[str, str]) -> str:
+    """Sum collapsed stacks over workers; concatenate text reports."""
+    outputs = {pid: json.loads(value) for pid, value in results.items()}
+    if all(result["format"] == "collapsed" for result in outputs.values()):
+        counts: Counter[str] = Counter()
+        for result in outputs.values():
+            for line in result["output"].splitlines():
+                stack, _, count = line.rpartition(" ")
+                counts[stack] += int(count)
+        return "\n".join(f"{stack} {count}" for stack, count in counts.most_common()) + "\n"
+
+    return "\n".join(
+        f"# worker {pid}\n{result['output']}" for pid, result in sorted(outputs.items())
+    )
+
+
+async def require_admin(x_admin_token: str = Header("")) -> None:
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404)
+    if not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403)
+
+
+def router(profiler: Profiler) -> APIRouter:
+    routes = APIRouter(prefix="/profile", dependencies=[Depends(require_admin)])
+
+    @routes.post("/start")
+    async def start(
+        mode: str = "sample",
+        seconds: float = 30.0,
+        requests: int | None = None,
+        interval: float = DEFAULT_SAMPLE_INTERVAL,
+    ) -> dict[str, str | float | int | None]:
+        if mode not in profiler.modes:
+            raise HTTPException(status_code=400, detail=f"Unknown mode, one of {sorted(profiler.modes)}")
+        if seconds <= 0 or interval <= 0 or (requests is not None and requests <= 0):
+            raise HTTPException(status_code=400, detail="seconds, requests and interval must be positive")
+
+        session = Session(uuid.uuid4().hex[:12], mode, min(seconds, MAX_SECONDS), requests, interval)
+        # Expires on its own, in case nobody stops it
+        await profiler.redis.set(
+            profiler.key, json.dumps(asdict(session)), ex=math.ceil(session.seconds + POLL_INTERVAL)
+        )
+        return asdict(session)
+
+    @routes.post("/stop")
+    async def stop() -> dict[str, bool]:
+        return {"stopped": bool(await profiler.redis.delete(profiler.key))}
+
+    @routes.get("/result", response_class=PlainTextResponse)
+    async def result(session: str) -> str:
+        results = await profiler.redis.hgetall(f"{profiler.key}:{session}")
+        if not results:
+            raise HTTPException(status_code=404, detail="No results yet")
+        return merge_results(results)
+
+    return routes
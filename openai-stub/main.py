@@ -0,0 +1,369 @@
+"""
+OpenAI-compatible stand-in for the guardrail's responses.create calls.
+
+Answers in the DETECTED/THREAT/PAYLOAD format the guardrail parses. Verdicts
+come from a labeled lookup table (payload,label CSV such as
+attack/payloads.csv or corpus.py output) for the parameters of the inspected
+request, and from a rule-based oracle for anything not in the table. Latency,
+server errors, rate limiting and hangs are drawn from a seeded random
+generator, so load tests are reproducible and cost nothing.
+
+Point the guardrail at it with OPENAI_BASE_URL=http://openai-stub:5003/v1.
+"""
+
+import asyncio
+import csv
+import json
+import os
+import random
+import re
+import time
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass, fields
+from typing import AsyncIterator, Final
+from urllib.parse import parse_qsl, urlsplit
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+LABELS_PATH: Final[str] = os.getenv("STUB_LABELS", "")
+INPUT_PATTERN: Final[re.Pattern[str]] = re.compile(r"URL: (.*)\nBody: (.*)", re.DOTALL)
+
+# (threat type, pattern), first match wins
+RULES: Final[list[tuple[str, re.Pattern[str]]]] = [
+    (threat, re.compile(pattern, re.IGNORECASE))
+    for threat, pattern in [
+        ("UNION-based SQL injection", r"\bunion\b[\s\S]*?\bselect\b"),
+        ("Time-based blind SQL injection", r"\b(?:sleep|pg_sleep|benchmark)\s*\(|\bwaitfor\s+delay\b"),
+        ("Stacked queries", r";\s*(?:drop|delete|insert|update|create|alter|shutdown|exec)\b"),
+        ("Boolean-based SQL injection", r"\b(?:or|and|where|having)\s+(?:not\s+)?(?:\w+\(?\)?\s*(?:=|<|>|\bin\b)|true\b|false\b)"),
+        ("Boolean-based SQL injection", r"^\s*\d+\s*=\s*\d+\s*$"),
+        ("Quote breakout", r"['\"]\s*\)?\s*(?:--|#|/\*|\b(?:or|and|where|having|group|order|exec|union)\b)|\d'\d"),
+        ("Comment injection", r"(?:--|/\*|#)\s*$"),
+        ("SQL keyword injection", r"\bselect\b[\s\S]*?\bfrom\b|\binsert\s+into\b|\bdelete\s+from\b|\bdrop\s+table\b"),
+    ]
+]
+
+
+class Latency:
+    """Seconds to wait before answering, drawn from a named distribution."""
+
+    def __init__(self, spec: str):
+        self.spec = spec
+        kind, *args = spec.split(":")
+        self.kind = kind
+        self.args = [float(arg) for arg in args]
+        expected = {"constant": 1, "uniform": 2, "lognormal": 2}
+        if expected.get(kind) != len(self.args):
+            raise ValueError(
+                f"Bad latency {spec!r}: use constant:S, uniform:LOW:HIGH or lognormal:MEDIAN:SIGMA"
+            )
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "constant":
+            return self.args[0]
+        if self.kind == "uniform":
+            return rng.uniform(*self.args)
+        median, sigma = self.args
+        return rng.lognormvariate(0.0, sigma) * median
+
+
+# Rough shapes, not measurements; "spiky" adds a slow tail to "nano"
+PROFILES: Final[dict[str, list[tuple[float, str]]]] = {
+    "instant": [(1.0, "constant:0")],
+    "fast": [(1.0, "lognormal:0.08:0.3")],
+    "nano": [(1.0, "lognormal:0.45:0.35")],
+    "slow": [(1.0, "lognormal:1.5:0.5")],
+    "spiky": [(0.95, "lognormal:0.45:0.35"), (0.05, "lognormal:4.0:0.3")],
+}
+
+
+@dataclass
+class StubConfig:
+    # A PROFILES name or a single distribution like lognormal:0.3:0.4
+    latency: str = os.getenv("STUB_LATENCY", "nano")
+    # Fractions of requests answered with a 500, a 429, or not at all
+    error_rate: float = float(os.getenv("STUB_ERROR_RATE", "0"))
+    rate_limit_rate: float = float(os.getenv("STUB_RATE_LIMIT_RATE", "0"))
+    hang_rate: float = float(os.getenv("STUB_HANG_RATE", "0"))
+    hang_seconds: float = float(os.getenv("STUB_HANG_SECONDS", "30"))
+    # Requests per second before every further one gets a 429; 0 is unlimited
+    rate_limit_rps: float = float(os.getenv("STUB_RATE_LIMIT_RPS", "0"))
+    # Pause between streamed deltas
+    token_interval: float = float(os.getenv("STUB_TOKEN_INTERVAL", "0.01"))
+    seed: int = int(os.getenv("STUB_SEED", "0"))
+
+
+class Stub:
+    def __init__(self, config: StubConfig, labels: dict[str, bool]):
+        self.labels = labels
+        self.stats: dict[str, int] = {}
+        self.configure(config)
+
+    def configure(self, config: StubConfig) -> None:
+        if config.latency in PROFILES:
+            mixture = PROFILES[config.latency]
+        else:
+            mixture = [(1.0, config.latency)]
+        self.latencies = [(weight, Latency(spec)) for weight, spec in mixture]
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.tokens = config.rate_limit_rps
+        self.refilled = time.monotonic()
+
+    def count(self, outcome: str) -> None:
+        self.stats[outcome] = self.stats.get(outcome, 0) + 1
+
+    def latency(self) -> float:
+        pick = self.rng.random()
+        for weight, latency in self.latencies:
+            pick -= weight
+            if pick < 0:
+                break
+        return latency.sample(self.rng)
+
+    def over_rate_limit(self) -> bool:
+        rps = self.config.rate_limit_rps
+        if rps <= 0:
+            return False
+        now = time.monotonic()
+        self.tokens = min(rps, self.tokens + (now - self.refilled) * rps)
+        self.refilled = now
+        if self.tokens < 1:
+            return True
+        self.tokens -= 1
+        return False
+
+    def outcome(self) -> str:
+        """ok, error, rate_limited or hang for the next request."""
+        if self.over_rate_limit():
+            return "rate_limited"
+        pick = self.rng.random()
+        for outcome, rate in (
+            ("error", self.config.error_rate),
+            ("rate_limited", self.config.rate_limit_rate),
+            ("hang", self.config.hang_rate),
+        ):
+            if pick < rate:
+                return outcome
+            pick -= rate
+        return "ok"
+
+
+def label_key(payload: str) -> str:
+    # The guardrail sends canonical input, with keywords lower-cased and
+    # whitespace collapsed; the table holds payloads as written
+    return " ".join(payload.split()).lower()
+
+
+def load_labels(path: str) -> dict[str, bool]:
+    """label_key(payload) -> malicious from a payload,label CSV."""
+    labels: dict[str, bool] = {}
+    if not path:
+        return labels
+    with open(path, encoding="utf-8", newline="") as f:
+        for row in csv.reader(f):
+            if len(row) >= 2:
+                labels[label_key(row[0])] = row[1].strip().lower() == "malicious"
+    print(f"Loaded {len(labels)} labeled payloads from {path}")
+    return labels
+
+
+def candidates(text: str) -> list[str]:
+    """User-controlled values in the guardrail's "URL: ...\\nBody: ..." input."""
+    match = INPUT_PATTERN.match(text)
+    if not match:
+        return [text]
+    url, body = match.groups()
+    values = [value for _, value in parse_qsl(urlsplit(url).query, keep_blank_values=True)]
+    if body:
+        values.extend(value for _, value in parse_qsl(body, keep_blank_values=True))
+        values.append(body)
+    return values or [url]
+
+
+def verdict(text: str, labels: dict[str, bool]) -> tuple[bool, str, str]:
+    """(detected, threat type, payload): the labeled table first, then the rules."""
+    values = candidates(text)
+    known = [value for value in values if label_key(value) in labels]
+    if known:
+        for value in known:
+            if labels[label_key(value)]:
+                return True, "SQL Injection (labeled)", value
+        if len(known) == len(values):
+            return False, "none", "none"
+
+    for value in values:
+        for threat, pattern in RULES:
+            if pattern.search(value):
+                return True, threat, value
+    return False, "none", "none"
+
+
+def reply_text(detected: bool, threat: str, payload: str) -> str:
+    return f"DETECTED: {'true' if detected else 'false'}\nTHREAT: {threat}\nPAYLOAD: {payload}"
+
+
+def response_object(response_id: str, model: str, text: str, status: str, prompt: str) -> dict:
+    output = []
+    if status == "completed":
+        output.append({
+            "type": "message",
+            "id": f"msg_{response_id}",
+            "status": "completed",
+            "role": "assistant",
+            "content": [{"type": "output_text", "text": text, "annotations": []}],
+        })
+    # About four characters per token
+    input_tokens = len(prompt) // 4 + 1
+    output_tokens = len(text) // 4 + 1
+    return {
+        "id": f"resp_{response_id}",
+        "object": "response",
+        "created_at": int(time.time()),
+        "status": status,
+        "model": model,
+        "output": output,
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": [],
+        "usage": {
+            "input_tokens": input_tokens,
+            "input_tokens_details": {"cached_tokens": 0},
+            "output_tokens": output_tokens,
+            "output_tokens_details": {"reasoning_tokens": 0},
+            "total_tokens": input_tokens + output_tokens,
+        },
+    }
+
+
+def error_response(status: int, message: str, error_type: str, headers: dict[str, str] | None = None) -> JSONResponse:
+    return JSONResponse(
+        status_code=status,
+        content={"error": {"message": message, "type": error_type, "param": None, "code": None}},
+        headers=headers,
+    )
+
+
+stub: Stub | None = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global stub
+    stub = Stub(StubConfig(), load_labels(LABELS_PATH))
+    print(f"OpenAI stub config: {asdict(stub.config)}")
+    yield
+
+
+app = FastAPI(lifespan=lifespan, docs_url=None, redoc_url=None)
+
+
+def sse(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+async def stream_events(response: dict, text: str) -> AsyncIterator[str]:
+    item_id = response["output"][0]["id"]
+    in_progress = {**response, "status": "in_progress", "output": []}
+    message = {**response["output"][0], "status": "in_progress", "content": []}
+    part = {"type": "output_text", "text": "", "annotations": []}
+    position = {"item_id": item_id, "output_index": 0, "content_index": 0}
+
+    events = [
+        {"type": "response.created", "response": in_progress},
+        {"type": "response.in_progress", "response": in_progress},
+        {"type": "response.output_item.added", "output_index": 0, "item": message},
+        {"type": "response.content_part.added", **position, "part": part},
+    ]
+    deltas = [{"type": "response.output_text.delta", **position, "delta": word, "logprobs": []}
+              for word in re.findall(r"\S+\s*", text)]
+    events_after = [
+        {"type": "response.output_text.done", **position, "text": text, "logprobs": []},
+        {"type": "response.content_part.done", **position, "part": {**part, "text": text}},
+        {"type": "response.output_item.done", "output_index": 0, "item": response["output"][0]},
+        {"type": "response.completed", "response": response},
+    ]
+
+    sequence = 0
+    for event in events:
+        yield sse({**event, "sequence_number": sequence})
+        sequence += 1
+    for event in deltas:
+        await asyncio.sleep(stub.config.token_interval)
+        yield sse({**event, "sequence_number": sequence})
+        sequence += 1
+    for event in events_after:
+        yield sse({**event, "sequence_number": sequence})
+        sequence += 1
+
+
+@app.post("/v1/responses", response_model=None)
+async def create_response(request: Request) -> JSONResponse | StreamingResponse:
+    body = await request.json()
+    prompt = body.get("input", "")
+    if not isinstance(prompt, str):
+        return error_response(400, "The stub only accepts a string input", "invalid_request_error")
+
+    outcome = stub.outcome()
+    # Drawn for every request, so outcomes don't shift the latency sequence
+    latency = stub.latency()
+    stub.count(outcome)
+
+    if outcome == "rate_limited":
+        return error_response(
+            429,
+            "Rate limit reached for requests (stub)",
+            "requests",
+            headers={"retry-after": "1", "x-ratelimit-remaining-requests": "0"},
+        )
+    if outcome == "hang":
+        await asyncio.sleep(stub.config.hang_seconds)
+    else:
+        await asyncio.sleep(latency)
+    if outcome == "error":
+        return error_response(500, "The server had an error processing your request (stub)", "server_error")
+
+    detected, threat, payload = verdict(prompt, stub.labels)
+    stub.count("detected" if detected else "not_detected")
+    text = reply_text(detected, threat, payload)
+    response = response_object(uuid.uuid4().hex[:24], body.get("model", "gpt-4.1-nano"), text, "completed", prompt)
+
+    if body.get("stream"):
+        return StreamingResponse(stream_events(response, text), media_type="text/event-stream")
+    return JSONResponse(response)
+
+
+@app.get("/_stub/config")
+async def get_config() -> dict:
+    return asdict(stub.config)
+
+
+@app.post("/_stub/config")
+async def set_config(request: Request) -> dict:
+    """Change settings at runtime; also resets the random generator."""
+    changes = await request.json()
+    names = {field.name: field.type for field in fields(StubConfig)}
+    unknown = set(changes) - set(names)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown settings: {sorted(unknown)}")
+
+    config = asdict(stub.config)
+    config.update(changes)
+    try:
+        stub.configure(StubConfig(**config))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+    return asdict(stub.config)
+
+
+@app.get("/_stub/stats")
+async def get_stats() -> dict[str, int]:
+    return stub.stats
+
+
+@app.post("/_stub/stats/reset")
+async def reset_stats() -> dict[str, bool]:
+    stub.stats.clear()
+    return {"reset": True}
@@ -0,0 +1,89 @@
+"""
+Compare SQL_ERROR_REGEX against the two-phase matcher on large pages.
+
+Usage:
+    uv run python benchmark.py [--sizes 10000 100000 1000000] [--repeat 5]
+"""
+
+import argparse
+import time
+
+from main import SQL_ERROR_MATCHER, SQL_ERROR_REGEX
+
+BOOK_CARD = """<div class="col-md-4"><div class="card h-100 shadow-sm">
+<img src="https://covers.example/{i}.jpg" class="card-img-top" alt="Book {i}">
+<div class="card-body"><h5 class="card-title">Book title {i}</h5>
+<p class="card-text">A description of book {i}, its relation to other books and why it matters.</p>
+<a href="/book/{i}/" class="btn btn-gold">Details</a></div></div></div>
+"""
+
+SQL_ERROR = "<pre>Exception Value: relation &quot;core_books&quot; does not exist</pre>"
+
+
+def build_page(size: int, kind: str) -> str:
+    if kind == "adversarial":
+        # Many gap-pattern prefixes on one line, never followed by a suffix
+        unit = "relation column table near \" "
+        return (unit * (size // len(unit) + 1))[:size]
+
+    parts: list[str] = ["<html><body><div class=\"row\">"]
+    length = len(parts[0])
+    i = 0
+    while length < size:
+        card = BOOK_CARD.format(i=i)
+        parts.append(card)
+        length += len(card)
+        i += 1
+    if kind == "error":
+        parts.append(SQL_ERROR)
+    parts.append("</div></body></html>")
+    return "".join(parts)
+
+
+def best_of(func, content: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(content)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--adversarial-limit",
+        type=int,
+        default=100_000,
+        help="Largest adversarial page to run the quadratic baseline regex on",
+    )
+    args = parser.parse_args()
+
+    print(f"{'page':<12}{'size':>10}{'regex ms':>12}{'matcher ms':>12}{'speedup':>10}")
+    for kind in ("clean", "error", "adversarial"):
+        for size in args.sizes:
+            content = build_page(size, kind)
+            matcher_time = best_of(SQL_ERROR_MATCHER.search, content, args.repeat)
+
+            if kind == "adversarial" and size > args.adversarial_limit:
+                print(f"{kind:<12}{size:>10}{'skipped':>12}{matcher_time * 1000:>12.2f}")
+                continue
+
+            regex_found = SQL_ERROR_REGEX.search(content) is not None
+            matcher_found = SQL_ERROR_MATCHER.search(content) is not None
+            if regex_found != matcher_found:
+                print(f"[!] verdict mismatch on {kind}/{size}")
+
+            regex_time = best_of(SQL_ERROR_REGEX.search, content, args.repeat)
+            print(
+                f"{kind:<12}{size:>10}{regex_time * 1000:>12.2f}"
+                f"{matcher_time * 1000:>12.2f}{regex_time / matcher_time:>9.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,30 @@
+import codecs
+import hashlib
 import re
+import time
+from collections import OrderedDict
 from contextlib import asynccontextmanager
 from typing import Final
+from urllib.parse import urlsplit
 
 from fastapi import FastAPI, Request
 from fastapi.responses import HTMLResponse, Response
 from redis.asyncio import ConnectionPool, Redis
 
+import metrics
+import profiling
+from sql_error_matcher import SQLErrorMatcher
+
 SQL_ERROR_FILTER_KEY: Final[str] = "sql_error_filter_status"
 
+# Routes that render without user-controlled SQL (mirrors gateway/response_policy.lua)
+UNSCANNED_PATHS: Final[frozenset[str]] = frozenset({"/security/", "/logout/"})
+UNSCANNED_NO_ARGS_PATHS: Final[frozenset[str]] = frozenset({"/"})
+
+VERDICT_CACHE_SIZE: Final[int] = 4096
+# Larger bodies are scanned as they stream in instead of being hashed first
+CACHEABLE_MAX_BYTES: Final[int] = 1024 * 1024
+
 SQL_ERROR_PATTERNS: Final[list[str]] = [
     # PostgreSQL
     r"ProgrammingError",
@@ -41,6 +58,8 @@ SQL_ERROR_REGEX: Final[re.Pattern] = re.compile(
     "|".join(SQL_ERROR_PATTERNS), re.IGNORECASE
 )
 
+SQL_ERROR_MATCHER: Final[SQLErrorMatcher] = SQLErrorMatcher(SQL_ERROR_PATTERNS)
+
 ALLOWED_RESPONSE: Final[Response] = Response(
     content=b'{"allowed":true}',
     media_type="application/json",
@@ -100,6 +119,35 @@ ERROR_PAGE: Final[str] = """<!DOCTYPE html>
 </body>
 </html>"""
 
+registry = metrics.Registry("response-filter")
+REQUESTS = metrics.Counter(registry, "response_filter_requests_total", "Responses checked")
+IN_FLIGHT = metrics.Gauge(
+    registry, "response_filter_in_flight_requests", "Responses being checked"
+)
+REQUEST_SECONDS = metrics.Histogram(
+    registry, "response_filter_request_seconds", "Time to answer a check"
+)
+VERDICTS = metrics.Counter(
+    registry,
+    "response_filter_verdicts_total",
+    "Verdicts; skipped covers inactive filtering, non-HTML and unscanned routes",
+    label=("verdict", ("clean", "sql_error", "skipped")),
+)
+SCAN_SECONDS = metrics.Histogram(
+    registry,
+    "response_filter_scan_seconds",
+    "Time spent scanning a body, cached by hash or streamed",
+    label=("mode", ("cached", "stream")),
+)
+CACHE_LOOKUPS = metrics.Counter(
+    registry,
+    "response_filter_cache_lookups_total",
+    "Verdict cache lookups by ETag or body hash",
+    label=("result", ("hit", "miss")),
+)
+
+profiler = profiling.Profiler("response-filter")
+
 redis_pool: ConnectionPool | None = None
 redis_client: Redis | None = None
 
@@ -110,14 +158,19 @@ async def lifespan(app: FastAPI):
 
     redis_pool = ConnectionPool(host="cache", port=6379, db=0, decode_responses=True)
     redis_client = Redis(connection_pool=redis_pool)
+    registry.open()
+    profiler.start(redis_client)
 
     yield
 
+    await profiler.stop()
+    registry.close()
     await redis_client.aclose()
     await redis_pool.disconnect()
 
 
 app = FastAPI(lifespan=lifespan, docs_url=None, redoc_url=None)
+app.include_router(profiling.router(profiler))
 
 
 async def get_filter_status() -> bool:
@@ -128,26 +181,126 @@ async def get_filter_status() -> bool:
     return value == "1"
 
 
+class VerdictCache:
+    """LRU of scan verdicts keyed by content hash or strong ETag."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[str, bool] = OrderedDict()
+
+    def get(self, key: str) -> bool | None:
+        verdict = self._entries.get(key)
+        if verdict is not None:
+            self._entries.move_to_end(key)
+        return verdict
+
+    def set(self, key: str, verdict: bool) -> None:
+        self._entries[key] = verdict
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+verdict_cache = VerdictCache(VERDICT_CACHE_SIZE)
+
+
 def contains_sql_error(content: str) -> bool:
-    return bool(SQL_ERROR_REGEX.search(content))
+    return SQL_ERROR_MATCHER.search(content) is not None
+
+
+def is_unscanned_route(url: str) -> bool:
+    parts = urlsplit(url)
+    if parts.path in UNSCANNED_PATHS:
+        return True
+    return parts.path in UNSCANNED_NO_ARGS_PATHS and not parts.query
+
+
+def etag_cache_key(etag: str) -> str | None:
+    # Weak ETags don't promise identical bytes
+    if not etag or etag.startswith("W/"):
+        return None
+    return f"etag:{etag}"
+
+
+def content_length(value: str | None) -> int:
+    # A malformed header just means the body size is unknown; stream it
+    try:
+        return max(int(value or 0), 0)
+    except ValueError:
+        return 0
+
+
+async def scan_stream(request: Request) -> bool:
+    matcher = SQL_ERROR_MATCHER.stream()
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    async for chunk in request.stream():
+        if matcher.feed(decoder.decode(chunk)):
+            return True
+
+    return matcher.feed(decoder.decode(b"", final=True)) is not None
+
+
+async def scan_cached(request: Request) -> bool:
+    body = await request.body()
+    key = hashlib.blake2b(body, digest_size=16).hexdigest()
+
+    verdict = verdict_cache.get(key)
+    CACHE_LOOKUPS.inc(label="miss" if verdict is None else "hit")
+    if verdict is None:
+        verdict = contains_sql_error(body.decode("utf-8", errors="replace"))
+        verdict_cache.set(key, verdict)
+    return verdict
+
+
+def verdict_response(has_sql_error: bool) -> Response:
+    VERDICTS.inc(label="sql_error" if has_sql_error else "clean")
+    if has_sql_error:
+        return HTMLResponse(content=ERROR_PAGE, status_code=200)
+    return ALLOWED_RESPONSE
 
 
 @app.post("/", response_model=None)
+@metrics.tracked(REQUESTS, IN_FLIGHT, REQUEST_SECONDS)
+@profiler.counted
 async def check_response(request: Request) -> Response:
     if not await get_filter_status():
+        VERDICTS.inc(label="skipped")
         return ALLOWED_RESPONSE
 
-    body = await request.body()
-    content = body.decode("utf-8", errors="replace") if body else ""
-
     content_type = request.headers.get("X-Original-Content-Type", "")
     if "text/html" not in content_type:
+        VERDICTS.inc(label="skipped")
         return ALLOWED_RESPONSE
 
-    if not contains_sql_error(content):
+    if is_unscanned_route(request.headers.get("X-Original-URI", "")):
+        VERDICTS.inc(label="skipped")
         return ALLOWED_RESPONSE
 
-    return HTMLResponse(content=ERROR_PAGE, status_code=200)
+    etag_key = etag_cache_key(request.headers.get("X-Original-ETag", ""))
+    if etag_key:
+        verdict = verdict_cache.get(etag_key)
+        CACHE_LOOKUPS.inc(label="miss" if verdict is None else "hit")
+        if verdict is not None:
+            return verdict_response(verdict)
+
+    started = time.perf_counter()
+    body_length = content_length(request.headers.get("Content-Length"))
+    if 0 < body_length <= CACHEABLE_MAX_BYTES:
+        verdict = await scan_cached(request)
+        SCAN_SECONDS.observe(time.perf_counter() - started, "cached")
+    else:
+        verdict = await scan_stream(request)
+        SCAN_SECONDS.observe(time.perf_counter() - started, "stream")
+
+    if etag_key:
+        verdict_cache.set(etag_key, verdict)
+    return verdict_response(verdict)
+
+
+@app.get("/metrics")
+async def get_metrics() -> Response:
+    return Response(registry.render(), media_type=metrics.CONTENT_TYPE)
 
 
 @app.get("/status")
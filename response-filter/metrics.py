@@ -0,0 +1,263 @@
+"""
+Prometheus metrics shared by all worker processes of a service.
+
+Every process keeps its values in its own mmap-backed slot file under
+METRICS_DIR/<service>/, so updates need no locks or IPC: an increment is one
+float addition in memory, made from the event loop thread. /metrics sums the
+files of all processes; gauges only count processes that are still alive.
+Metrics are declared at import time, so every process of a service lays out
+its slots the same way; a checksum of the layout guards against files left
+by another version.
+"""
+
+import mmap
+import os
+import time
+import zlib
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from typing import Final
+
+METRICS_DIR: Final[str] = os.getenv("METRICS_DIR", "/tmp/metrics")
+CONTENT_TYPE: Final[str] = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS: Final[tuple[float, ...]] = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+# Slot 0 of every file holds the layout checksum
+HEADER_SLOTS: Final[int] = 1
+
+
+def _format(value: float) -> str:
+    if value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class Registry:
+    def __init__(self, service: str):
+        self.directory = os.path.join(METRICS_DIR, service)
+        self.metrics: list["Metric"] = []
+        self.size = HEADER_SLOTS
+        self.values = memoryview(bytearray(8 * self.size)).cast("d")
+        self._mmap: mmap.mmap | None = None
+
+    def allocate(self, metric: "Metric", slots: int) -> int:
+        if self._mmap is not None:
+            raise RuntimeError("Metrics must be declared before the registry is opened")
+        offset = self.size
+        self.size += slots
+        values = memoryview(bytearray(8 * self.size)).cast("d")
+        values[:offset] = self.values
+        self.values = values
+        self.metrics.append(metric)
+        return offset
+
+    def layout(self) -> float:
+        description = ";".join(f"{m.name}:{m.kind}:{m.offset}:{m.slots}" for m in self.metrics)
+        return float(zlib.crc32(description.encode()))
+
+    def open(self) -> None:
+        """Move this process's values into its slot file; call once per worker."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{os.getpid()}.db")
+        with open(path, "w+b") as f:
+            f.truncate(8 * self.size)
+            self._mmap = mmap.mmap(f.fileno(), 8 * self.size)
+        values = memoryview(self._mmap).cast("d")
+        values[:] = self.values
+        values[0] = self.layout()
+        self.values = values
+
+    def close(self) -> None:
+        for metric in self.metrics:
+            if metric.kind == "gauge":
+                metric.reset()
+
+    def _collect(self) -> list[float]:
+        """Sum of every slot over all processes."""
+        totals = [0.0] * self.size
+        gauges = [False] * self.size
+        for metric in self.metrics:
+            if metric.kind == "gauge":
+                gauges[metric.offset : metric.offset + metric.slots] = [True] * metric.slots
+
+        layout = self.layout()
+        sources: list[tuple[memoryview, bool]] = []
+        if self._mmap is None:
+            sources.append((self.values, True))
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                pid, _, extension = name.partition(".")
+                if extension != "db" or not pid.isdigit():
+                    continue
+                try:
+                    with open(os.path.join(self.directory, name), "rb") as f:
+                        data = f.read()
+                except OSError:
+                    continue
+                if len(data) != 8 * self.size:
+                    continue
+                values = memoryview(data).cast("d")
+                if values[0] != layout:
+                    continue
+                sources.append((values, _pid_alive(int(pid))))
+
+        for values, alive in sources:
+            for slot in range(HEADER_SLOTS, self.size):
+                if alive or not gauges[slot]:
+                    totals[slot] += values[slot]
+        return totals
+
+    def render(self) -> str:
+        totals = self._collect()
+        lines: list[str] = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render(totals))
+        return "\n".join(lines) + "\n"
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(
+        self,
+        registry: Registry,
+        name: str,
+        help: str,
+        label: tuple[str, tuple[str, ...]] | None = None,
+        slots_per_value: int = 1,
+    ):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.label_name, label_values = label or ("", ("",))
+        self.label_values = label_values
+        self._index = {value: i * slots_per_value for i, value in enumerate(label_values)}
+        self.slots = slots_per_value * len(label_values)
+        self.offset = registry.allocate(self, self.slots)
+
+    def slot(self, label: str | None) -> int:
+        return self.offset + self._index[label or ""]
+
+    def labels(self, value: str, extra: str = "") -> str:
+        pairs = [f'{self.label_name}="{value}"'] if self.label_name else []
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def reset(self) -> None:
+        values = self.registry.values
+        for slot in range(self.offset, self.offset + self.slots):
+            values[slot] = 0.0
+
+    def render(self, totals: list[float]) -> list[str]:
+        return [
+            f"{self.name}{self.labels(value)} {_format(totals[self.slot(value)])}"
+            for value in self.label_values
+        ]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, label: str | None = None) -> None:
+        self.registry.values[self.slot(label)] += amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1.0, label: str | None = None) -> None:
+        self.registry.values[self.slot(label)] += amount
+
+    def dec(self, amount: float = 1.0, label: str | None = None) -> None:
+        self.registry.values[self.slot(label)] -= amount
+
+    def set(self, value: float, label: str | None = None) -> None:
+        self.registry.values[self.slot(label)] = value
+
+    @contextmanager
+    def track(self):
+        self.inc()
+        try:
+            yield
+        finally:
+            self.dec()
+
+
+class Histogram(Metric):
+    """Fixed buckets; each label value has a count per bucket, +Inf and a sum."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        registry: Registry,
+        name: str,
+        help: str,
+        label: tuple[str, tuple[str, ...]] | None = None,
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.buckets = buckets
+        super().__init__(registry, name, help, label, slots_per_value=len(buckets) + 2)
+
+    def observe(self, value: float, label: str | None = None) -> None:
+        base = self.slot(label)
+        values = self.registry.values
+        values[base + bisect_left(self.buckets, value)] += 1
+        values[base + len(self.buckets) + 1] += value
+
+    def observe_all(self, durations: dict[str, float]) -> None:
+        """Observe {label value: seconds}, e.g. the stages of one request."""
+        for label, seconds in durations.items():
+            if label in self._index:
+                self.observe(seconds, label)
+
+    def render(self, totals: list[float]) -> list[str]:
+        lines = []
+        bounds = [*map(_format, self.buckets), "+Inf"]
+        for value in self.label_values:
+            base = self.slot(value)
+            cumulative = 0.0
+            for i, bound in enumerate(bounds):
+                cumulative += totals[base + i]
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{self.labels(value, le)} {_format(cumulative)}")
+            lines.append(f"{self.name}_sum{self.labels(value)} {_format(totals[base + len(bounds)])}")
+            lines.append(f"{self.name}_count{self.labels(value)} {_format(cumulative)}")
+        return lines
+
+
+def tracked(requests: Counter, in_flight: Gauge, seconds: Histogram | None = None):
+    """Count calls of an async handler, how many are running and how long they take."""
+
+    def decorate(handler):
+        @wraps(handler)
+        async def wrapper(*args, **kwargs):
+            requests.inc()
+            in_flight.inc()
+            started = time.perf_counter()
+            try:
+                return await handler(*args, **kwargs)
+            finally:
+                in_flight.dec()
+                if seconds is not None:
+                    seconds.observe(time.perf_counter() - started)
+
+        return wrapper
+
+    return decorate
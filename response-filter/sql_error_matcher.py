@@ -0,0 +1,94 @@
+import re
+from collections.abc import Iterable
+from typing import Final
+
+import ahocorasick
+
+# Longest gap ".*" may span; keeps every match inside a bounded window
+MAX_GAP: Final[int] = 128
+
+GAP_TOKEN: Final[str] = ".*"
+ESCAPE_PATTERN: Final[re.Pattern[str]] = re.compile(r"\\(.)")
+
+
+def _literal_pieces(pattern: str) -> list[str]:
+    """Split a pattern into the literal runs between its ".*" gaps."""
+    return [ESCAPE_PATTERN.sub(r"\1", piece) for piece in pattern.split(GAP_TOKEN)]
+
+
+class SQLErrorMatcher:
+    """
+    Two-phase matcher for SQL error patterns.
+
+    An Aho-Corasick automaton finds the longest literal of every pattern in a
+    single pass over the lowercased text. Only around those hits is the full
+    pattern confirmed, with ".*" bounded to MAX_GAP characters, so cost stays
+    linear in page size.
+    """
+
+    def __init__(self, patterns: Iterable[str], max_gap: int = MAX_GAP):
+        self.patterns: list[str] = list(patterns)
+        self.automaton = ahocorasick.Automaton()
+        self.confirmers: list[re.Pattern[str] | None] = []
+        self.max_span = 0
+
+        anchors: dict[str, list[int]] = {}
+        for index, pattern in enumerate(self.patterns):
+            pieces = _literal_pieces(pattern)
+            anchor = max(pieces, key=len).lower()
+            anchors.setdefault(anchor, []).append(index)
+
+            if len(pieces) == 1:
+                # Pure literal, the automaton hit is the match
+                self.confirmers.append(None)
+            else:
+                bounded = pattern.replace(GAP_TOKEN, f".{{0,{max_gap}}}")
+                self.confirmers.append(re.compile(bounded, re.IGNORECASE))
+
+            span = sum(len(piece) for piece in pieces) + (len(pieces) - 1) * max_gap
+            self.max_span = max(self.max_span, span)
+
+        for anchor, indexes in anchors.items():
+            self.automaton.add_word(anchor, (len(anchor), tuple(indexes)))
+        self.automaton.make_automaton()
+
+    def search_lower(self, text: str) -> str | None:
+        """Return the first matching pattern in already-lowercased text."""
+        for end, (length, indexes) in self.automaton.iter(text):
+            hit_start = end + 1 - length
+            for index in indexes:
+                confirmer = self.confirmers[index]
+                if confirmer is None:
+                    return self.patterns[index]
+                window_start = max(0, end + 1 - self.max_span)
+                window_end = hit_start + self.max_span
+                if confirmer.search(text, window_start, window_end):
+                    return self.patterns[index]
+        return None
+
+    def search(self, content: str) -> str | None:
+        if not content:
+            return None
+        return self.search_lower(content.lower())
+
+    def stream(self) -> "StreamingSQLErrorMatcher":
+        return StreamingSQLErrorMatcher(self)
+
+
+class StreamingSQLErrorMatcher:
+    """Incremental matcher for bodies that arrive in chunks."""
+
+    def __init__(self, matcher: SQLErrorMatcher):
+        self.matcher = matcher
+        self.tail = ""
+        self.matched: str | None = None
+
+    def feed(self, chunk: str) -> str | None:
+        if self.matched is not None or not chunk:
+            return self.matched
+
+        # The tail is rescanned so patterns split across chunks still confirm
+        text = self.tail + chunk.lower()
+        self.matched = self.matcher.search_lower(text)
+        self.tail = text[-self.matcher.max_span :]
+        return self.matched
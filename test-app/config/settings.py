@@ -32,7 +32,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "django_guardrail.middleware.GuardrailTimingMiddleware",
+    "django_guardrail.middleware.GuardrailMemoMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    # Strong ETags let the gateway skip rescanning identical pages
+    "django.middleware.http.ConditionalGetMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -119,3 +123,5 @@ GUARDRAIL_SERVICE_URL = "http://guardrailv2:5001"
 GUARDRAIL_TIMEOUT = 5.0
 GUARDRAIL_ENABLED = True
 GUARDRAIL_FAIL_OPEN = True
+GUARDRAIL_OVERLAP_CHECKOUT = False
+GUARDRAIL_SERVER_TIMING = True
@@ -8,6 +8,7 @@ from django.db import connection
 from django.http import HttpRequest, HttpResponse, JsonResponse
 from django.shortcuts import redirect, render
 from django.views.decorators.http import require_POST
+from django_guardrail.client import guardrail_client
 from django_guardrail.exceptions import SQLInjectionDetected
 from redis import Redis
 
@@ -41,6 +42,7 @@ def row_to_book(row: tuple | None) -> dict | None:
 
 
 def execute_query(query: str) -> list[tuple]:
+    guardrail_client.prefetch(query)
     with connection.cursor() as cursor:
         cursor.execute(query)
         return cursor.fetchall()
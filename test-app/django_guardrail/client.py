@@ -1,14 +1,26 @@
+import asyncio
 import logging
 import os
+import threading
+import weakref
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from typing import Any
 
 import httpx
 from django.conf import settings
 
+from django_guardrail import canonical, memo, timing
 from django_guardrail.exceptions import GuardrailServiceError, SQLInjectionDetected
 
 logger = logging.getLogger(__name__)
 
+REQUEST_HEADERS: dict[str, str] = {
+    "Content-Type": "text/plain",
+    "X-Original-URI": "/sql-query",
+    "X-Original-Method": "POST",
+}
+
 
 class GuardrailClient:
     """Client for communicating with guardrailv2 ML service."""
@@ -20,15 +32,147 @@ class GuardrailClient:
         self.timeout = getattr(settings, "GUARDRAIL_TIMEOUT", 5.0)
         self.enabled = getattr(settings, "GUARDRAIL_ENABLED", True)
         self.fail_open = getattr(settings, "GUARDRAIL_FAIL_OPEN", False)
+        self.overlap_checkout = getattr(settings, "GUARDRAIL_OVERLAP_CHECKOUT", False)
+
+        self._lock = threading.Lock()
+        self._client: httpx.Client | None = None
+        # An AsyncClient is bound to the loop it was first used on, so each
+        # loop gets its own; it goes away with the loop instead of being
+        # replaced (and its pool leaked) when another loop calls in.
+        self._async_clients: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, httpx.AsyncClient
+        ] = weakref.WeakKeyDictionary()
+        self._executor: ThreadPoolExecutor | None = None
+        self._tasks: set[asyncio.Task] = set()
 
     def _is_skip_guardrail(self) -> bool:
         """Check if guardrail should be skipped (e.g., during migrations)."""
         return os.environ.get("SKIP_GUARDRAIL", "").lower() in ("1", "true", "yes")
 
+    def _is_bypassed(self) -> bool:
+        return not self.enabled or self._is_skip_guardrail()
+
+    def _get_client(self) -> httpx.Client:
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(timeout=self.timeout)
+            return self._client
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = httpx.AsyncClient(timeout=self.timeout)
+                self._async_clients[loop] = client
+            return client
+
+    async def aclose(self) -> None:
+        """Close the running loop's async client, e.g. on ASGI shutdown."""
+        with self._lock:
+            client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=4, thread_name_prefix="guardrail-prefetch"
+                )
+            return self._executor
+
+    @staticmethod
+    def _build_query_text(sql: str, params=None) -> str:
+        if params:
+            return f"{sql} {params}"
+        return sql
+
+    def _build_request(self, sql: str, params=None) -> tuple[bytes, dict[str, str]]:
+        """
+        Body and headers for guardrailv2: the query's canonical form, which
+        the service then takes as it is. SQL from the ORM was never URL or
+        HTML encoded, so only NFKC, comments, whitespace and keywords apply.
+        """
+        query = canonical.canonical_text(
+            self._build_query_text(sql, params), decode_input=False
+        )
+        headers = {**REQUEST_HEADERS, canonical.HASH_HEADER: query.hash}
+        return query.text.encode("utf-8"), headers
+
+    def _handle_response(self, sql: str, response: httpx.Response) -> dict[str, Any]:
+        if response.status_code == 200:
+            return {"allowed": True}
+
+        if response.status_code == 403:
+            data = response.json()
+            raise SQLInjectionDetected(
+                message=f"SQL Injection detected: {data.get('threat_type', 'Unknown')}",
+                query=sql[:500],
+                confidence=data.get("confidence"),
+                threat_type=data.get("threat_type"),
+            )
+
+        logger.warning(
+            f"Guardrailv2 returned unexpected status: {response.status_code}"
+        )
+        if self.fail_open:
+            return {"allowed": True}
+        raise GuardrailServiceError(
+            f"Unexpected response from guardrailv2: {response.status_code}"
+        )
+
+    def _handle_request_error(self, e: httpx.RequestError) -> dict[str, Any]:
+        logger.error(f"Failed to connect to guardrailv2: {e}")
+        if self.fail_open:
+            return {"allowed": True}
+        raise GuardrailServiceError(f"Cannot connect to guardrailv2: {e}") from e
+
+    def _send(self, sql: str, params=None) -> dict[str, Any]:
+        content, headers = self._build_request(sql, params)
+        try:
+            response = self._get_client().post(
+                self.service_url,
+                content=content,
+                headers=headers,
+            )
+        except httpx.RequestError as e:
+            return self._handle_request_error(e)
+        return self._handle_response(sql, response)
+
+    async def _asend(self, sql: str, params=None) -> dict[str, Any]:
+        content, headers = self._build_request(sql, params)
+        try:
+            response = await self._get_async_client().post(
+                self.service_url,
+                content=content,
+                headers=headers,
+            )
+        except httpx.RequestError as e:
+            return self._handle_request_error(e)
+        return self._handle_response(sql, response)
+
+    def _resolve(self, future: Future, sql: str, params=None) -> None:
+        try:
+            future.set_result(self._send(sql, params))
+        except Exception as e:
+            future.set_exception(e)
+
+    async def _aresolve(self, future: Future, sql: str, params=None) -> None:
+        try:
+            future.set_result(await self._asend(sql, params))
+        except Exception as e:
+            future.set_exception(e)
+
     def check_query(self, sql: str, params: tuple | None = None) -> dict[str, Any]:
         """
         Send SQL query to guardrailv2 for validation.
 
+        Verdicts are memoized per request when GuardrailMemoMiddleware is
+        installed, so identical (sql, params) pairs are only sent once.
+        With GuardrailTimingMiddleware, the time spent here is summed per
+        request and reported in Server-Timing.
+
         Args:
             sql: The SQL query string
             params: Query parameters (optional)
@@ -40,51 +184,72 @@ class GuardrailClient:
             SQLInjectionDetected: If injection is detected
             GuardrailServiceError: If service is unavailable and fail_open is False
         """
-        if not self.enabled or self._is_skip_guardrail():
+        if self._is_bypassed():
             return {"allowed": True}
 
-        query_text = sql
-        if params:
-            query_text = f"{sql} {params}"
+        with timing.measure():
+            future, owner = memo.claim(memo.make_key(sql, params))
+            if future is None:
+                return self._send(sql, params)
 
-        try:
-            with httpx.Client(timeout=self.timeout) as client:
-                response = client.post(
-                    self.service_url,
-                    content=query_text.encode("utf-8"),
-                    headers={
-                        "Content-Type": "text/plain",
-                        "X-Original-URI": "/sql-query",
-                        "X-Original-Method": "POST",
-                    },
-                )
+            if owner:
+                self._resolve(future, sql, params)
+                return future.result()
 
-                if response.status_code == 200:
-                    return {"allowed": True}
+            try:
+                # A pending prefetch resolves on another thread or the event loop.
+                return future.result(timeout=self.timeout * 2)
+            except (CancelledError, FutureTimeoutError):
+                return self._send(sql, params)
 
-                if response.status_code == 403:
-                    data = response.json()
-                    raise SQLInjectionDetected(
-                        message=f"SQL Injection detected: {data.get('threat_type', 'Unknown')}",
-                        query=sql[:500],
-                        confidence=data.get("confidence"),
-                        threat_type=data.get("threat_type"),
-                    )
+    async def acheck_query(
+        self, sql: str, params: tuple | None = None
+    ) -> dict[str, Any]:
+        """
+        Async variant of `check_query`, the public entry point for async
+        views and other code running under an event loop. The ORM's own
+        queries still go through `check_query` from the patched cursor.
 
-                logger.warning(
-                    f"Guardrailv2 returned unexpected status: {response.status_code}"
-                )
-                if self.fail_open:
-                    return {"allowed": True}
-                raise GuardrailServiceError(
-                    f"Unexpected response from guardrailv2: {response.status_code}"
-                )
+        Shares the request memo with `check_query`, so a query checked here
+        is not re-sent when the ORM later executes it in a worker thread.
+        """
+        if self._is_bypassed():
+            return {"allowed": True}
 
-        except httpx.RequestError as e:
-            logger.error(f"Failed to connect to guardrailv2: {e}")
-            if self.fail_open:
-                return {"allowed": True}
-            raise GuardrailServiceError(f"Cannot connect to guardrailv2: {e}") from e
+        with timing.measure():
+            future, owner = memo.claim(memo.make_key(sql, params))
+            if future is None:
+                return await self._asend(sql, params)
+
+            if owner:
+                await self._aresolve(future, sql, params)
+                return future.result()
+
+            return await asyncio.wrap_future(future)
+
+    def prefetch(self, sql: str, params: tuple | None = None) -> None:
+        """
+        Start validating a query before its connection is checked out.
+
+        The verdict lands in the request memo, where the patched cursor picks
+        it up once the connection is ready. No-op unless
+        GUARDRAIL_OVERLAP_CHECKOUT is set and the memo middleware is active.
+        """
+        if not self.overlap_checkout or self._is_bypassed():
+            return
+
+        future, owner = memo.claim(memo.make_key(sql, params))
+        if not owner:
+            return
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._get_executor().submit(self._resolve, future, sql, params)
+        else:
+            task = loop.create_task(self._aresolve(future, sql, params))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
 
 
 guardrail_client = GuardrailClient()
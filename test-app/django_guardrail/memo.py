@@ -0,0 +1,44 @@
+import contextvars
+from concurrent.futures import Future
+
+MemoKey = tuple[str, str]
+
+_verdicts: contextvars.ContextVar[dict[MemoKey, Future] | None] = (
+    contextvars.ContextVar("guardrail_verdicts", default=None)
+)
+
+
+def make_key(sql: str, params=None) -> MemoKey:
+    """Build the memo key for a query and its parameters."""
+    return sql, repr(params)
+
+
+def begin() -> contextvars.Token:
+    """Start a fresh verdict memo for the current request."""
+    return _verdicts.set({})
+
+
+def end(token: contextvars.Token) -> None:
+    """Drop the verdict memo started by `begin`."""
+    _verdicts.reset(token)
+
+
+def is_active() -> bool:
+    return _verdicts.get() is not None
+
+
+def claim(key: MemoKey) -> tuple[Future | None, bool]:
+    """
+    Look up or reserve the verdict slot for a query.
+
+    Returns:
+        (future, owner) where owner is True if the caller created the slot
+        and must resolve it. future is None when no memo is active.
+    """
+    verdicts = _verdicts.get()
+    if verdicts is None:
+        return None, False
+
+    future = Future()
+    existing = verdicts.setdefault(key, future)
+    return existing, existing is future
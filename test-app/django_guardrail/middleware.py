@@ -0,0 +1,83 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from django_guardrail import memo, timing
+
+
+class GuardrailMemoMiddleware:
+    """Scope guardrail verdicts to a single request (WSGI and ASGI)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        token = memo.begin()
+        try:
+            return self.get_response(request)
+        finally:
+            memo.end(token)
+
+    async def __acall__(self, request):
+        token = memo.begin()
+        try:
+            return await self.get_response(request)
+        finally:
+            memo.end(token)
+
+
+class GuardrailTimingMiddleware:
+    """Report time spent in guardrail checks in the Server-Timing header."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, "GUARDRAIL_SERVER_TIMING", True)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        if not self.enabled:
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        token = timing.begin()
+        try:
+            response = self.get_response(request)
+        finally:
+            timer = timing.end(token)
+        return self._add_header(response, timer, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+
+        started = time.perf_counter()
+        token = timing.begin()
+        try:
+            response = await self.get_response(request)
+        finally:
+            timer = timing.end(token)
+        return self._add_header(response, timer, time.perf_counter() - started)
+
+    @staticmethod
+    def _add_header(response, timer, total):
+        value = timing.server_timing(timer, total)
+        if response.has_header("Server-Timing"):
+            value = f"{response['Server-Timing']}, {value}"
+        response["Server-Timing"] = value
+        return response
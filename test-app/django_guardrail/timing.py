@@ -0,0 +1,59 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+
+class CheckTimer:
+    """Total time a request spent waiting on guardrail checks."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.seconds = 0.0
+
+    def add(self, seconds: float) -> None:
+        # Checks may finish on worker threads sharing this timer
+        with self._lock:
+            self.count += 1
+            self.seconds += seconds
+
+
+_timer: contextvars.ContextVar[CheckTimer | None] = contextvars.ContextVar(
+    "guardrail_check_timer", default=None
+)
+
+
+def begin() -> contextvars.Token:
+    """Start timing guardrail checks for the current request."""
+    return _timer.set(CheckTimer())
+
+
+def end(token: contextvars.Token) -> CheckTimer | None:
+    """Stop timing and return the totals collected since `begin`."""
+    timer = _timer.get()
+    _timer.reset(token)
+    return timer
+
+
+@contextmanager
+def measure():
+    """Add the duration of the enclosed check to the current request."""
+    timer = _timer.get()
+    if timer is None:
+        yield
+        return
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(time.perf_counter() - started)
+
+
+def server_timing(timer: CheckTimer, total: float) -> str:
+    """Server-Timing value for a request's guardrail checks and its total time."""
+    return (
+        f'app_guardrail;dur={timer.seconds * 1000:.2f};desc="{timer.count} checks", '
+        f"app_total;dur={total * 1000:.2f}"
+    )
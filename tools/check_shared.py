@@ -0,0 +1,146 @@
+"""
+Keep the modules every service carries its own copy of in sync.
+
+Each Docker image is built from its service directory alone, so shared
+helpers are copied into every service that needs them. The first path of
+each group in SHARED is the one to edit; the check fails when any other
+copy differs, and --write copies the reference over them.
+
+canonical.py has a Lua twin (gateway/canonical.lua) whose hash the
+detectors trust, so the check also runs CANONICAL_CASES through both and
+compares the results. That part needs resty (OpenResty's CLI) on PATH and
+is skipped without it.
+
+Usage:
+    python tools/check_shared.py            # exit 1 if anything drifted
+    python tools/check_shared.py --write    # update the copies from the reference
+"""
+
+import argparse
+import filecmp
+import importlib.util
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LUA_CANONICAL = os.path.join(ROOT, "tools", "lua", "canonical.lua")
+
+# Reference first, then its copies
+SHARED = {
+    "canonical": [
+        "guardrail/canonical.py",
+        "guardrailv2/canonical.py",
+        "test-app/django_guardrail/canonical.py",
+    ],
+    "decision_log": [
+        "guardrail/decision_log.py",
+        "guardrailv2/decision_log.py",
+    ],
+    "metrics": [
+        "guardrail/metrics.py",
+        "guardrailv2/metrics.py",
+        "response-filter/metrics.py",
+    ],
+    "profiling": [
+        "guardrail/profiling.py",
+        "guardrailv2/profiling.py",
+        "response-filter/profiling.py",
+    ],
+}
+
+# (url, body) pairs; the Lua side only handles ASCII and gives up otherwise
+CANONICAL_CASES = [
+    ("/", ""),
+    ("/?q=harry+potter", ""),
+    ("/book/?id=1%27%20OR%201%3D1--", ""),
+    ("/book/?id=1||1=1", ""),
+    ("/?q=1%2527%2520UNION%2520SELECT%2520NULL--", ""),
+    ("/?q=&#39; oR &#x31;=&#49;", ""),
+    ("/?q=&amp;lt;script&amp;gt;", ""),
+    ("/?q=&bogus; &#xZZ; &#12a;", ""),
+    ("/?q=1/**/UnIoN/**/SeLeCt/**/password/**/FrOm/**/auth_user", ""),
+    ("/?q=1 /*!50000union*/ /*!select*/ 1", ""),
+    ("/?q=a\tb\r\nc\x00d\x7fe", ""),
+    ("/?q=   padded   ", ""),
+    ("/?q=sleep(5) WAITFOR DELAY '0:0:5'", ""),
+    ("/?q=selected unionized from_x _or or_", ""),
+    ("/?q=%E2%80%99", ""),
+    ("/?q=&#8217;", ""),
+    ("/login/", "username=admin%27--&password=x"),
+    ("/login/", "username=admin&password=%27+or+%271%27%3D%271"),
+    ("/register/", '{"user": "a\' AND 1=CAST((SELECT version()) AS int)--"}'),
+]
+
+
+def check_copies(write: bool) -> list[str]:
+    problems = []
+    for group, paths in SHARED.items():
+        reference = os.path.join(ROOT, paths[0])
+        for path in paths[1:]:
+            copy = os.path.join(ROOT, path)
+            if os.path.exists(copy) and filecmp.cmp(reference, copy, shallow=False):
+                continue
+            if write:
+                shutil.copyfile(reference, copy)
+                print(f"[+] {path} updated from {paths[0]}")
+            else:
+                problems.append(f"{path} differs from {paths[0]}")
+    return problems
+
+
+def load_canonical():
+    path = os.path.join(ROOT, SHARED["canonical"][0])
+    spec = importlib.util.spec_from_file_location("shared_canonical", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def check_lua_canonical() -> list[str]:
+    resty = shutil.which("resty")
+    if resty is None:
+        print("[-] resty not found on PATH; canonical.lua not compared")
+        return []
+
+    cases = "".join(json.dumps({"url": url, "body": body}) + "\n" for url, body in CANONICAL_CASES)
+    process = subprocess.run(
+        [resty, "-I", os.path.join(ROOT, "gateway"), LUA_CANONICAL],
+        input=cases,
+        capture_output=True,
+        text=True,
+    )
+    if process.returncode != 0:
+        return [f"canonical.lua failed: {process.stderr.strip()}"]
+
+    canonical = load_canonical()
+    problems = []
+    for (url, body), line in zip(CANONICAL_CASES, process.stdout.splitlines(), strict=True):
+        lua = json.loads(line)
+        if lua["text"] is None:
+            # Gave up on non-ASCII; the detectors canonicalize the raw request
+            continue
+        expected = canonical.canonical_request(url, body)
+        if (lua["text"], lua["hash"]) != (expected.text, expected.hash):
+            problems.append(f"canonical.lua disagrees on {url!r} {body!r}: {lua['text']!r} != {expected.text!r}")
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--write", action="store_true", help="Copy each reference over its copies")
+    args = parser.parse_args()
+
+    problems = check_copies(args.write) + check_lua_canonical()
+    for problem in problems:
+        print(f"[!] {problem}")
+    if problems:
+        return 1
+    print("[+] Shared modules are in sync")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
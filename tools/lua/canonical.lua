@@ -0,0 +1,13 @@
+-- Runs gateway/canonical.lua over cases from tools/check_shared.py through
+--   resty -I gateway tools/lua/canonical.lua
+-- Reads one {"url", "body"} JSON object per line on stdin and prints one
+-- {"text", "hash"} per line; both are null when the input isn't ASCII.
+
+local cjson = require "cjson"
+local canonical = require "canonical"
+
+for line in io.lines() do
+    local case = cjson.decode(line)
+    local text, hash = canonical.request(case.url, case.body)
+    io.write(cjson.encode({ text = text or cjson.null, hash = hash or cjson.null }), "\n")
+end